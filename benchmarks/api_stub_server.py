@@ -0,0 +1,396 @@
+"""
+This module replays recorded Power BI, Azure OpenAI and Bing responses from a local HTTP server.
+
+Each fixture file under fixtures/, next to this module, lists routes: a method, a path regex, the recorded
+response bodies and a latency distribution given as p50/p99 in milliseconds. Response latencies
+are drawn from the log-normal distribution with those percentiles, and routes marked "throttle"
+answer 429 with Retry-After at the configured rate, so clients exercise their real retry paths.
+
+Routes with "variants" pick their response by the request: the first variant whose "match" regex
+is found in the DAX query of an executeQueries body (or in the raw body) answers, with its own
+recorded rows and latencies. A variant's first request, and its first after a request to a
+"clear_cache" action route, is served with its cold latency, later ones with its warm latency, and
+every variant response carries a Server-Timing header with the simulated duration.
+
+Usage:
+    python benchmarks/api_stub_server.py [--port 8400] [--latency-scale 1.0] [--throttle-rate 0.02]
+"""
+
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from PIL import Image, ImageDraw
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# z-score of the 99th percentile of the standard normal distribution.
+Z_99 = 2.3263
+
+logger = logging.getLogger(__name__)
+
+
+class StubRoute:
+    """
+    One recorded endpoint.
+
+    Attributes:
+        name (str): Route name used in statistics.
+        method (str): HTTP method.
+        pattern (Pattern): Compiled path regex; named groups are substituted into "{name}" placeholders.
+        status (int): Status code of successful responses.
+        responses (list): Recorded JSON bodies. With `sequence`, each key (the "key" group of the path)
+            advances through them and then repeats the last; otherwise they are served in rotation.
+        p50 (float): Median latency in seconds.
+        p99 (float): 99th percentile latency in seconds.
+        throttle (bool): Whether 429 injection applies to this route.
+        image (dict): Width and height of a synthetic report page served as PNG instead of JSON.
+        variants (list): StubVariant entries selected by the request body; see StubVariant.
+        action (str): "clear_cache" to make every variant answer its next request cold.
+    """
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.method = spec.get("method", "GET").upper()
+        self.pattern = re.compile(spec["path"])
+        self.status = spec.get("status", 200)
+        self.responses = spec.get("responses", [])
+        self.p50, self.p99 = _percentiles(spec.get("latency_ms", {}))
+        self.throttle = spec.get("throttle", False)
+        self.sequence = spec.get("sequence", False)
+        self.image = spec.get("image")
+        self.variants = [StubVariant(variant) for variant in spec.get("variants", [])]
+        self.action = spec.get("action")
+
+    def sample_latency(self, rng, scale=1.0):
+        """Draw one latency in seconds from the log-normal distribution matching p50 and p99."""
+        return _lognormal(rng, self.p50, self.p99) * scale
+
+    def variant_for(self, body):
+        """Return the first variant matching the request body, or None."""
+        text = _query_text(body)
+        for variant in self.variants:
+            if variant.pattern.search(text):
+                return variant
+        return None
+
+
+class StubVariant:
+    """
+    One recorded query of a route with variants.
+
+    Attributes:
+        name (str): Variant name used in statistics.
+        pattern (Pattern): Regex searched for in the request's DAX query, with whitespace collapsed.
+        responses (list): Recorded JSON bodies, served in rotation.
+        p50, p99 (float): Warm latency percentiles in seconds.
+        cold_p50, cold_p99 (float): Latency percentiles in seconds of the first request after a cache clear.
+        storage_engine_share (float): Share of the duration reported as storage engine time in Server-Timing.
+    """
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.pattern = re.compile(spec.get("match", ""))
+        self.responses = spec["responses"]
+        self.p50, self.p99 = _percentiles(spec.get("latency_ms", {}))
+        self.cold_p50, self.cold_p99 = _percentiles(spec.get("cold_latency_ms", spec.get("latency_ms", {})))
+        self.storage_engine_share = spec.get("storage_engine_share", 0.5)
+
+    def sample_latency(self, rng, cold, scale=1.0):
+        """Draw one cold or warm latency in seconds."""
+        if cold:
+            return _lognormal(rng, self.cold_p50, self.cold_p99) * scale
+        return _lognormal(rng, self.p50, self.p99) * scale
+
+    def server_timing(self, seconds):
+        """Server-Timing header value splitting `seconds` into storage and formula engine time."""
+        total = seconds * 1000
+        storage = total * self.storage_engine_share
+        return f"total;dur={total:.1f}, se;dur={storage:.1f}, fe;dur={total - storage:.1f}"
+
+
+class StubServer:
+    """
+    Serves the routes of every fixture file from a background thread.
+
+    Attributes:
+        fixtures_dir (str): Directory of fixture JSON files.
+        latency_scale (float): Multiplier applied to every sampled latency; 0 disables latency.
+        throttle_rate (float): Probability that a request to a throttled route is answered with 429.
+        retry_after (int): Retry-After seconds sent with injected 429 responses.
+        seed (int): Seed of the random generator driving latency and throttling.
+        host (str): Interface to bind.
+        port (int): Port to bind; 0 picks a free port.
+    """
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency_scale=1.0, throttle_rate=0.0, retry_after=1,
+                 seed=0, host="127.0.0.1", port=0):
+        self.fixtures_dir = fixtures_dir
+        self.latency_scale = latency_scale
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.routes = load_routes(fixtures_dir)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._positions = {}
+        self._images = {}
+        self._warm = set()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        """Base URL of the running server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in a daemon thread and return self."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def do_POST(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                logger.debug("stub: " + format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="api-stub", daemon=True).start()
+        logger.info("Stub server with %d routes listening on %s", len(self.routes), self.url)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        """Return route name -> {requests, throttled}."""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _handle(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        path = urlsplit(handler.path).path
+        for route in self.routes:
+            match = route.pattern.match(path) if route.method == handler.command else None
+            if match is not None:
+                break
+        else:
+            self._send(handler, 404, {"error": {"code": "NotFound", "message": f"No fixture for {handler.command} {path}"}})
+            return
+
+        if route.action == "clear_cache":
+            with self._lock:
+                self._warm.clear()
+            self._count(route.name, False)
+            self._send(handler, route.status, {})
+            return
+        if route.variants:
+            self._handle_variant(handler, route, body)
+            return
+
+        with self._rng_lock:
+            delay = route.sample_latency(self._rng, self.latency_scale)
+            throttled = route.throttle and self._rng.random() < self.throttle_rate
+        self._count(route.name, throttled)
+        if throttled:
+            # Throttled requests are rejected quickly, before the service does any work.
+            time.sleep(min(delay, 0.05))
+            self._send(handler, 429, {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                       {"Retry-After": str(self.retry_after)})
+            return
+        time.sleep(delay)
+        if route.image is not None:
+            self._send_bytes(handler, 200, self._image(route.image["width"], route.image["height"]), "image/png")
+            return
+        values = {name: value for name, value in match.groupdict().items() if value is not None}
+        values["uuid"] = str(uuid.uuid4())
+        self._send(handler, route.status, _substitute(self._next_response(route, values.get("key")), values))
+
+    def _handle_variant(self, handler, route, body):
+        variant = route.variant_for(body)
+        if variant is None:
+            self._count(route.name, False)
+            self._send(handler, 400, {"error": {"code": "DatasetExecuteQueriesError",
+                                                "message": f"No recorded result for this query on route {route.name}"}})
+            return
+        name = f"{route.name}:{variant.name}"
+        with self._lock:
+            cold = name not in self._warm
+            self._warm.add(name)
+            position = self._positions.get(name, 0)
+            self._positions[name] = position + 1
+        with self._rng_lock:
+            delay = variant.sample_latency(self._rng, cold, self.latency_scale)
+        self._count(name, False)
+        time.sleep(delay)
+        self._send(handler, route.status, variant.responses[position % len(variant.responses)],
+                   {"Server-Timing": variant.server_timing(delay)})
+
+    def _next_response(self, route, key):
+        with self._lock:
+            position_key = (route.name, key if route.sequence else None)
+            position = self._positions.get(position_key, 0)
+            self._positions[position_key] = position + 1
+        if route.sequence:
+            return route.responses[min(position, len(route.responses) - 1)]
+        return route.responses[position % len(route.responses)]
+
+    def _count(self, name, throttled):
+        with self._lock:
+            counts = self._stats.setdefault(name, {"requests": 0, "throttled": 0})
+            counts["requests"] += 1
+            counts["throttled"] += int(throttled)
+
+    def _image(self, width, height):
+        with self._lock:
+            if (width, height) not in self._images:
+                self._images[(width, height)] = render_report_page(width, height)
+            return self._images[(width, height)]
+
+    def _send(self, handler, status, body, headers=None):
+        self._send_bytes(handler, status, json.dumps(body).encode("utf-8"), "application/json", headers)
+
+    def _send_bytes(self, handler, status, data, content_type, headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def load_routes(fixtures_dir=FIXTURES_DIR):
+    """Load the routes of every *.json fixture file in `fixtures_dir`, in file name order."""
+    routes = []
+    for file_name in sorted(os.listdir(fixtures_dir)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(fixtures_dir, file_name)) as f:
+                routes.extend(StubRoute(spec) for spec in json.load(f)["routes"])
+    return routes
+
+
+def render_report_page(width, height, seed=0):
+    """Render a synthetic report page (title bar, KPI cards, bar and line charts) as PNG bytes."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    margin = width // 40
+    draw.rectangle((0, 0, width, height // 12), fill=(37, 55, 70))
+    card_width = (width - 5 * margin) // 4
+    for i in range(4):
+        left = margin + i * (card_width + margin)
+        draw.rectangle((left, height // 8, left + card_width, height // 4), outline=(200, 200, 200), fill=(248, 248, 248))
+        draw.text((left + 10, height // 8 + 10), f"KPI {i + 1}: {rng.randint(100, 999)}k", fill=(120, 120, 120))
+    chart_top, chart_bottom = height // 3, height - margin
+    half = width // 2
+    bars = 12
+    bar_width = (half - 2 * margin) // bars
+    for i in range(bars):
+        bar_height = rng.randint((chart_bottom - chart_top) // 5, chart_bottom - chart_top)
+        left = margin + i * bar_width
+        draw.rectangle((left + 2, chart_bottom - bar_height, left + bar_width - 2, chart_bottom), fill=(1, 184, 170))
+    points = [(half + margin + i * (half - 2 * margin) // 23, rng.randint(chart_top, chart_bottom)) for i in range(24)]
+    draw.line(points, fill=(253, 98, 94), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _percentiles(latency):
+    p50 = latency.get("p50", 0) / 1000
+    return p50, max(latency.get("p99", 0) / 1000, p50)
+
+
+def _lognormal(rng, p50, p99):
+    """Draw one value from the log-normal distribution with the given median and 99th percentile."""
+    if p50 <= 0:
+        return 0.0
+    sigma = math.log(p99 / p50) / Z_99
+    return p50 * math.exp(sigma * rng.gauss(0, 1))
+
+
+def _query_text(body):
+    """The DAX queries of an executeQueries body with whitespace collapsed, or the raw body."""
+    text = body.decode("utf-8", errors="replace")
+    try:
+        queries = json.loads(text)["queries"]
+        text = "\n".join(query["query"] for query in queries)
+    except (ValueError, KeyError, TypeError):
+        pass
+    return " ".join(text.split())
+
+
+def _substitute(value, values):
+    if isinstance(value, str):
+        for name, replacement in values.items():
+            value = value.replace(f"{{{name}}}", replacement)
+        return value
+    if isinstance(value, list):
+        return [_substitute(v, values) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, values) for k, v in value.items()}
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded API responses from a local stub server.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of fixture JSON files.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds of injected 429s.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = StubServer(args.fixtures, args.latency_scale, args.throttle_rate, args.retry_after, args.seed,
+                        args.host, args.port).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats(), indent=2))
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+This module benchmarks the export -> encode -> analyze -> recommend chain offline against the API stub server.
+
+Every page count runs in a fresh process, so peak RSS is measured per size. The stages use the
+engines behind the skills (PowerBIExportEngine, ImageHandle, VisionBatchAnalyzer and the
+completions request of GenerateDesignRecommendations), so the suite runs without the AutoGen
+runtime and without credentials. Results are saved as JSON; with --baseline, a previous result
+file is compared and regressions beyond --tolerance fail the run.
+
+Usage:
+    python benchmarks/chain_benchmark.py [--sizes 1 10 100 1000] [--latency-scale 1.0] [--throttle-rate 0.02]
+                                         [--output results.json] [--baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from api_stub_server import FIXTURES_DIR, StubServer
+
+# The skills import each other as top-level modules; spawned size runs inherit this path.
+SKILLS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "skills"))
+if SKILLS_DIR not in sys.path:
+    sys.path.insert(0, SKILLS_DIR)
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+DEFAULT_QUESTIONS = (
+    "Summarize what this report page shows.",
+    "Which visuals are hard to read, and why?",
+    "How consistent are the layout, alignment and spacing?"
+)
+STAGES = ("export", "encode", "analyze", "recommend")
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of `values` by linear interpolation, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    """Return count, p50, p99 and max of a list of durations in seconds, rounded to milliseconds."""
+    return {
+        "count": len(values),
+        "p50": _round(percentile(values, 50)),
+        "p99": _round(percentile(values, 99)),
+        "max": _round(max(values) if values else None)
+    }
+
+
+def build_targets(pages, pages_per_report=10, reports_per_workspace=5, capacities=4):
+    """Lay `pages` pages out over reports, workspaces and capacities the way a tenant would."""
+    from powerbi_export_engine import ExportTarget
+    targets = []
+    for n in range(pages):
+        report = n // pages_per_report
+        workspace = report // reports_per_workspace
+        targets.append(ExportTarget(f"report-{report:04d}", f"ReportSection{n % pages_per_report}",
+                                    workspace_id=f"workspace-{workspace:03d}",
+                                    capacity_id=f"capacity-{workspace % capacities}"))
+    return targets
+
+
+class ChainBenchmark:
+    """
+    Runs the chain for many pages against a stub base URL and times every page and stage.
+
+    Attributes:
+        base_url (str): Stub server URL standing in for the Power BI, Azure AD, Azure OpenAI and Bing hosts.
+        concurrency (int): Pages in flight at once.
+        questions (tuple): Questions asked about every page, packed into one vision request.
+        deployment (str): Deployment name used in Azure OpenAI requests.
+        rpm (int): Requests per minute granted to the vision rate limiter.
+        tpm (int): Tokens per minute granted to the vision rate limiter.
+        poll_interval (float): Initial export status poll interval.
+        search (bool): Whether to add a Bing lookup per page after the recommendations.
+    """
+
+    def __init__(self, base_url, concurrency=32, questions=DEFAULT_QUESTIONS, deployment="gpt-4-vision",
+                 rpm=6000, tpm=10000000, poll_interval=1.0, search=False):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.questions = tuple(questions)
+        self.deployment = deployment
+        self.rpm = rpm
+        self.tpm = tpm
+        self.poll_interval = poll_interval
+        self.search = search
+
+    async def run(self, targets):
+        """Run the chain for every target and return per-page timings."""
+        from openai import AsyncAzureOpenAI, AzureOpenAI
+        from powerbi_export_engine import PowerBIExportEngine
+        from powerbi_token_provider import PowerBITokenProvider
+        from vision_batch import VisionBatchAnalyzer
+
+        provider = PowerBITokenProvider(authority=self.base_url, background_refresh=False)
+
+        async def token_getter():
+            return await asyncio.to_thread(provider.get_token, "benchmark-tenant", "benchmark-client", "secret")
+
+        engine = PowerBIExportEngine(token_getter, output_dir="./sandbox/exports", base_url=f"{self.base_url}/v1.0/myorg",
+                                     poll_interval=self.poll_interval)
+        analyzer = VisionBatchAnalyzer(
+            client=AsyncAzureOpenAI(api_version="2024-02-01", azure_endpoint=self.base_url, api_key="benchmark"),
+            deployment=self.deployment, rpm=self.rpm, tpm=self.tpm, max_concurrency=self.concurrency)
+        completions = AzureOpenAI(api_version="2024-02-01", azure_endpoint=self.base_url, api_key="benchmark")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def page(target):
+            async with semaphore:
+                return await self._run_page(target, engine, analyzer, completions)
+
+        try:
+            return await asyncio.gather(*(page(target) for target in targets))
+        finally:
+            provider.close()
+
+    async def _run_page(self, target, engine, analyzer, completions):
+        started = time.perf_counter()
+        stages = {}
+        try:
+            exported = await engine.export_page(target)
+            stages["export"] = time.perf_counter() - started
+
+            mark = time.perf_counter()
+            await asyncio.to_thread(_encode, exported["file_path"])
+            stages["encode"] = time.perf_counter() - mark
+
+            mark = time.perf_counter()
+            answers = await analyzer.analyze([(exported["file_path"], q) for q in self.questions])
+            failed = [a["error"] for a in answers if "error" in a]
+            if failed:
+                raise RuntimeError(failed[0])
+            stages["analyze"] = time.perf_counter() - mark
+
+            mark = time.perf_counter()
+            insights = " ".join(a["answer"] for a in answers)
+            await asyncio.to_thread(self._recommend, completions, insights)
+            stages["recommend"] = time.perf_counter() - mark
+
+            if self.search:
+                mark = time.perf_counter()
+                await asyncio.to_thread(self._search, "power bi report design best practices")
+                stages["search"] = time.perf_counter() - mark
+        except Exception as e:
+            logger.warning("Page %r failed: %s", target, e)
+            return {"latency": time.perf_counter() - started, "stages": stages, "error": f"{type(e).__name__}: {e}"}
+        return {"latency": time.perf_counter() - started, "stages": stages, "error": None}
+
+    def _recommend(self, client, insights):
+        from telemetry import span
+        # Same request as GenerateDesignRecommendations._request_recommendations.
+        prompt_text = f"Based on the following insights: {insights}, provide design recommendations."
+        with span("recommendations.call") as call_span:
+            response = client.completions.create(model=self.deployment, prompt=prompt_text, max_tokens=250)
+            usage = getattr(response, "usage", None)
+            call_span.record_tokens(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+        return response.choices[0].text.strip().split("\n")
+
+    def _search(self, query):
+        from http_transport import get_session
+        from telemetry import span
+        with span("bing.search"):
+            response = get_session().get(f"{self.base_url}/bing/v7.0/search", params={"q": query},
+                                         headers={"Ocp-Apim-Subscription-Key": "benchmark"}, timeout=10)
+            response.raise_for_status()
+            return response.json()
+
+
+def _encode(file_path):
+    from image_handle import ImageHandle
+    return len(ImageHandle.for_path(file_path).base64())
+
+
+def run_size(base_url, pages, options):
+    """Run the chain for `pages` pages in the current process and return its measurements.
+
+    Meant to run in a fresh process: outputs go to a temporary working directory, removed
+    afterwards, and the peak RSS reported is that of the whole process.
+    """
+    from telemetry import get_telemetry
+    logging.basicConfig(level=options.get("log_level", logging.WARNING))
+    work_dir = tempfile.mkdtemp(prefix="chain-benchmark-")
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        benchmark = ChainBenchmark(base_url, **options.get("chain", {}))
+        targets = build_targets(pages, **options.get("layout", {}))
+        started = time.perf_counter()
+        pages_done = asyncio.run(benchmark.run(targets))
+        elapsed = time.perf_counter() - started
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    succeeded = [p for p in pages_done if p["error"] is None]
+    stage_names = STAGES + (("search",) if benchmark.search else ())
+    tokens = {}
+    for labels, _, total, _ in get_telemetry().tokens.snapshot():
+        tokens[labels["kind"]] = tokens.get(labels["kind"], 0) + int(total)
+    spans = {}
+    for labels, _, total, count in get_telemetry().latency.snapshot():
+        entry = spans.setdefault(labels["span"], {"count": 0, "seconds": 0.0})
+        entry["count"] += count
+        entry["seconds"] = round(entry["seconds"] + total, 3)
+    return {
+        "pages": pages,
+        "succeeded": len(succeeded),
+        "failed": len(pages_done) - len(succeeded),
+        "errors": sorted({p["error"] for p in pages_done if p["error"]})[:5],
+        "elapsed_s": _round(elapsed),
+        "throughput_pages_per_s": _round(len(succeeded) / elapsed if elapsed else None),
+        "latency_s": summarize([p["latency"] for p in succeeded]),
+        "stages_s": {name: summarize([p["stages"][name] for p in succeeded if name in p["stages"]])
+                     for name in stage_names},
+        "tokens": tokens,
+        "spans": spans,
+        "peak_rss_mb": _round(peak_rss_mb(), 1)
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, fixtures_dir=FIXTURES_DIR, latency_scale=1.0, throttle_rate=0.0,
+                  retry_after=1, seed=0, **options):
+    """Start the stub server and run every size in its own process.
+
+    Returns:
+        dict: Environment, settings and one result per size, each with the stub's request and
+            429 counts per route.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with StubServer(fixtures_dir, latency_scale, throttle_rate, retry_after, seed) as server:
+        for pages in sizes:
+            server.reset_stats()
+            logger.info("Running the chain for %d page(s)", pages)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_size, server.url, pages, options).result()
+            result["stub_requests"] = server.stats()
+            logger.info("%d page(s): %.2f pages/s, p50 %.2fs, p99 %.2fs, peak RSS %.0f MiB", pages,
+                        result["throughput_pages_per_s"] or 0, result["latency_s"]["p50"] or 0,
+                        result["latency_s"]["p99"] or 0, result["peak_rss_mb"])
+            results.append(result)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"latency_scale": latency_scale, "throttle_rate": throttle_rate, "retry_after": retry_after,
+                     "seed": seed, **options},
+        "results": results
+    }
+
+
+def compare(current, baseline, tolerance=0.1):
+    """List regressions of `current` against `baseline` beyond the relative `tolerance`.
+
+    Throughput may not drop, and p50/p99 latency and peak RSS may not grow, by more than
+    `tolerance` for any page count present in both runs.
+
+    Returns:
+        list: Human-readable regression descriptions; empty if there are none.
+    """
+    previous = {r["pages"]: r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(result["pages"])
+        if before is None:
+            continue
+        checks = [
+            ("throughput", before["throughput_pages_per_s"], result["throughput_pages_per_s"], -1),
+            ("p50 latency", before["latency_s"]["p50"], result["latency_s"]["p50"], 1),
+            ("p99 latency", before["latency_s"]["p99"], result["latency_s"]["p99"], 1),
+            ("peak RSS", before["peak_rss_mb"], result["peak_rss_mb"], 1)
+        ]
+        for name, old, new, direction in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction > tolerance:
+                regressions.append(f"{result['pages']} page(s): {name} {old} -> {new} ({change:+.0%})")
+        if result["failed"] > before["failed"]:
+            regressions.append(f"{result['pages']} page(s): failed pages {before['failed']} -> {result['failed']}")
+    return regressions
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the export -> encode -> analyze -> recommend chain offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Page counts to run.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of recorded API fixtures.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies.")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds of injected 429s.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=32, help="Pages in flight at once.")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Initial export status poll interval.")
+    parser.add_argument("--capacities", type=int, default=4, help="Capacities the pages are spread over.")
+    parser.add_argument("--search", action="store_true", help="Add a Bing lookup per page.")
+    parser.add_argument("--output", help="Result file (default: ./sandbox/benchmarks/chain-<timestamp>.json).")
+    parser.add_argument("--baseline", help="Previous result file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression, e.g. 0.1 for 10%%.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_benchmark(
+        args.sizes, args.fixtures, args.latency_scale, args.throttle_rate, args.retry_after, args.seed,
+        chain={"concurrency": args.concurrency, "poll_interval": args.poll_interval, "search": args.search},
+        layout={"capacities": args.capacities}
+    )
+    output = args.output or os.path.join("./sandbox/benchmarks", f"chain-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as out:
+        json.dump(results, out, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""
+This module benchmarks rewritten DAX queries against their originals through the executeQueries endpoint.
+
+Each case pairs an original query (or measure) with its rewrite. Both are run cold, each run after
+a cache clear, and then warm, alternating between the two so drift affects them alike. Durations
+are taken from the Server-Timing header when the service sends one, otherwise from the client
+clock, and are reported as distributions. The result rows of the rewrite are compared with those
+of the original, ignoring row order and float noise, and a rewrite that is slower or returns
+different rows is reported as a regression. With --baseline, a previous report is compared too.
+
+The executeQueries endpoint cannot clear the dataset's cache, so without a cache clear URL only the
+first run of each query counts as cold. The API stub server replays recorded timings from
+fixtures/dax_queries.json and exposes a clear-cache route, so --stub runs offline.
+
+Usage:
+    python benchmarks/dax_query_benchmark.py benchmarks/dax_cases.json [--dataset ID] [--cold-runs 3]
+                                             [--warm-runs 10] [--stub] [--latency-scale 1.0]
+                                             [--output report.json] [--baseline previous.json]
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+# Imported first: chain_benchmark puts the skills directory on sys.path.
+from chain_benchmark import percentile, summarize
+from http_transport import get_session
+from telemetry import span
+
+POWERBI_API_URL = "https://api.powerbi.com/v1.0/myorg"
+VERSIONS = ("original", "rewritten")
+
+logger = logging.getLogger(__name__)
+
+
+def measure_query(expression, name="Value", group_by=()):
+    """Build a DAX query evaluating a measure expression, grouped by the given columns if any."""
+    if not group_by:
+        return f'EVALUATE ROW("{name}", {expression})'
+    return f'EVALUATE SUMMARIZECOLUMNS({", ".join(group_by)}, "{name}", {expression})'
+
+
+def load_cases(path):
+    """Load benchmark cases from a JSON file.
+
+    The file holds {"dataset_id": ..., "cases": [...]} or just the list of cases. A case has a name
+    and either "original"/"rewritten" DAX queries or "original_measure"/"rewritten_measure"
+    expressions, evaluated by measure_query with the case's "measure_name" and "group_by".
+
+    Returns:
+        tuple: The dataset ID given in the file (or None) and the list of {name, original, rewritten}.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"cases": data}
+    cases = []
+    for case in data["cases"]:
+        queries = {}
+        for version in VERSIONS:
+            if version in case:
+                queries[version] = case[version]
+            elif f"{version}_measure" in case:
+                queries[version] = measure_query(case[f"{version}_measure"], case.get("measure_name", "Value"),
+                                                 case.get("group_by", ()))
+            else:
+                raise ValueError(f"Case {case.get('name')!r} has no {version} query or measure")
+        cases.append({"name": case["name"], **queries})
+    return data.get("dataset_id"), cases
+
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header into metric -> duration in seconds; metrics without dur are skipped."""
+    timings = {}
+    for metric in (header or "").split(","):
+        name, *parameters = [part.strip() for part in metric.split(";")]
+        for parameter in parameters:
+            key, _, value = parameter.partition("=")
+            if key.strip() == "dur":
+                try:
+                    timings[name] = float(value) / 1000
+                except ValueError:
+                    pass
+    return timings
+
+
+def compare_results(expected, actual, rel_tol=1e-6, ordered=False):
+    """Compare the rows of two query results.
+
+    Values are compared by column position, since a rewrite may name its columns differently;
+    numbers match within `rel_tol` and missing values equal null (BLANK). Row order is ignored
+    unless `ordered`, e.g. for queries with ORDER BY.
+
+    Returns:
+        dict: equivalent (bool), rows [expected, actual] and difference (str or None).
+    """
+    left, right = [_row_values(row) for row in expected], [_row_values(row) for row in actual]
+    result = {"equivalent": False, "rows": [len(left), len(right)], "difference": None}
+    if len(left) != len(right):
+        result["difference"] = f"{len(left)} row(s) expected, {len(right)} returned"
+        return result
+    if not ordered:
+        left, right = sorted(left, key=_sort_key), sorted(right, key=_sort_key)
+    for index, (a, b) in enumerate(zip(left, right)):
+        if len(a) != len(b) or not all(_same_value(x, y, rel_tol) for x, y in zip(a, b)):
+            result["difference"] = f"row {index + 1}: expected {list(a)}, got {list(b)}"
+            return result
+    result["equivalent"] = True
+    return result
+
+
+def _row_values(row):
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _sort_key(values):
+    # Numbers are rounded for sorting, so rows differing only by float noise sort alike; None sorts first.
+    return tuple((0, "") if v is None else (1, f"{float(v):.9g}") if isinstance(v, (int, float)) else (2, str(v))
+                 for v in values)
+
+
+def _same_value(a, b, rel_tol):
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=rel_tol)
+    return a == b
+
+
+class DaxQueryBenchmark:
+    """
+    Runs original and rewritten DAX queries against a dataset and measures their durations.
+
+    Runs are sequential, so queries never compete with each other for the capacity.
+
+    Attributes:
+        token_getter (callable): Zero-argument function returning a Power BI access token.
+        base_url (str): Power BI REST API base URL, overridable for local stubs.
+        cold_runs (int): Cold runs per query; each is preceded by a cache clear.
+        warm_runs (int): Warm runs per query, after one untimed warm-up run.
+        clear_cache_url (str): URL POSTed to before every cold run. Without it only the first run of
+            each query is cold, since executeQueries cannot clear the cache.
+        rel_tol (float): Relative tolerance of numeric values when comparing results.
+        tolerance (float): Relative p50 difference a rewrite needs to count as faster or slower.
+        timeout (int): Timeout in seconds for each HTTP request.
+    """
+
+    def __init__(self, token_getter, base_url=POWERBI_API_URL, cold_runs=3, warm_runs=10, clear_cache_url=None,
+                 rel_tol=1e-6, tolerance=0.1, timeout=120):
+        self.token_getter = token_getter
+        self.base_url = base_url.rstrip("/")
+        self.cold_runs = cold_runs if clear_cache_url else min(cold_runs, 1)
+        self.warm_runs = warm_runs
+        self.clear_cache_url = clear_cache_url
+        self.rel_tol = rel_tol
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self._session = get_session()
+
+    def run(self, dataset_id, cases):
+        """Benchmark every case.
+
+        Args:
+            dataset_id (str): The Power BI dataset ID.
+            cases (list): {name, original, rewritten} dicts, as returned by load_cases.
+
+        Returns:
+            dict: cases, with per-case timings, equivalence and verdict, and settings.
+        """
+        started = time.perf_counter()
+        results = [self.run_case(dataset_id, case) for case in cases]
+        return {
+            "dataset_id": dataset_id,
+            "timing_source": sorted({r["timing_source"] for r in results}),
+            "settings": {"cold_runs": self.cold_runs, "warm_runs": self.warm_runs,
+                         "cache_clear": bool(self.clear_cache_url), "rel_tol": self.rel_tol,
+                         "tolerance": self.tolerance},
+            "elapsed_s": round(time.perf_counter() - started, 3),
+            "cases": results
+        }
+
+    def run_case(self, dataset_id, case):
+        """Run one case cold and warm and compare its results."""
+        runs = {version: {"cold": [], "warm": []} for version in VERSIONS}
+        rows = {}
+        with span("dax_benchmark.case", case=case["name"]):
+            for version in VERSIONS:
+                for _ in range(self.cold_runs):
+                    self._clear_cache()
+                    timing, rows[version] = self._execute(dataset_id, case[version])
+                    runs[version]["cold"].append(timing)
+            for version in VERSIONS:
+                # Another query's cache clear may have evicted this one, so warm it up untimed.
+                self._execute(dataset_id, case[version])
+            for _ in range(self.warm_runs):
+                for version in VERSIONS:
+                    timing, _ = self._execute(dataset_id, case[version])
+                    runs[version]["warm"].append(timing)
+
+        server = all(t["server_s"] is not None for r in runs.values() for phase in r.values() for t in phase)
+        source = "server" if server else "client"
+        durations = {version: {phase: [t[f"{source}_s"] for t in phase_runs] for phase, phase_runs in phase_map.items()}
+                     for version, phase_map in runs.items()}
+        timings = {version: {phase: _distribution(values) for phase, values in phase_map.items()}
+                   for version, phase_map in durations.items()}
+        if server:
+            for version, phase_map in runs.items():
+                for phase, phase_runs in phase_map.items():
+                    timings[version][phase]["client_p50"] = _round(percentile([t["client_s"] for t in phase_runs], 50))
+                    breakdown = [t["breakdown"] for t in phase_runs]
+                    timings[version][phase]["breakdown_p50"] = {
+                        metric: _round(percentile([b[metric] for b in breakdown if metric in b], 50))
+                        for metric in sorted({m for b in breakdown for m in b}) if metric != "total"}
+        equivalence = compare_results(rows["original"], rows["rewritten"], self.rel_tol,
+                                      ordered="ORDER BY" in case["original"].upper())
+        result = {"name": case["name"], "timing_source": source, "timings": timings, "equivalence": equivalence}
+        # Speedups come from the unrounded p50s: the reported ones are rounded to milliseconds, which
+        # flattens the ratio of fast queries and zeroes sub-millisecond ones.
+        p50s = {version: {phase: percentile(values, 50) for phase, values in phase_map.items()}
+                for version, phase_map in durations.items()}
+        result.update(_verdict(p50s, equivalence, self.tolerance))
+        logger.info("Case %s: %s (warm speedup %s, cold speedup %s)", case["name"], result["verdict"],
+                    result["speedup"]["warm"], result["speedup"]["cold"])
+        return result
+
+    def _execute(self, dataset_id, query):
+        body = {"queries": [{"query": query}], "serializerSettings": {"includeNulls": True}}
+        with span("dax_benchmark.query", dataset_id=dataset_id) as query_span:
+            started = time.perf_counter()
+            response = self._session.post(f"{self.base_url}/datasets/{dataset_id}/executeQueries",
+                                          json=body, headers=self._headers(), timeout=self.timeout)
+            elapsed = time.perf_counter() - started
+            query_span.record_bytes(len(response.content), "in")
+        response.raise_for_status()
+        breakdown = parse_server_timing(response.headers.get("Server-Timing"))
+        timing = {"client_s": elapsed, "server_s": breakdown.get("total"), "breakdown": breakdown}
+        return timing, response.json()["results"][0]["tables"][0]["rows"]
+
+    def _clear_cache(self):
+        if not self.clear_cache_url:
+            return
+        response = self._session.post(self.clear_cache_url, headers=self._headers(), timeout=self.timeout)
+        response.raise_for_status()
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token_getter()}", "Content-Type": "application/json"}
+
+
+def _distribution(values):
+    result = summarize(values)
+    result["min"] = _round(min(values) if values else None)
+    result["mean"] = _round(sum(values) / len(values) if values else None)
+    return result
+
+
+def _verdict(p50s, equivalence, tolerance=0.1):
+    """Speedup (original / rewritten p50) per phase and the case verdict.
+
+    `p50s` maps each version and phase to its unrounded p50 duration; only the speedup is rounded.
+    The verdict is "not_equivalent" if the results differ, "regressed" if the rewrite is slower
+    than the original by more than `tolerance` in either phase, "improved" if it is faster by more
+    than `tolerance` when warm, and "unchanged" otherwise.
+    """
+    speedup = {}
+    for phase in ("cold", "warm"):
+        before, after = p50s["original"][phase], p50s["rewritten"][phase]
+        speedup[phase] = round(before / after, 2) if before and after else None
+    if not equivalence["equivalent"]:
+        verdict = "not_equivalent"
+    elif any(s is not None and s < 1 / (1 + tolerance) for s in speedup.values()):
+        verdict = "regressed"
+    elif speedup["warm"] is not None and speedup["warm"] > 1 + tolerance:
+        verdict = "improved"
+    else:
+        verdict = "unchanged"
+    return {"speedup": speedup, "verdict": verdict}
+
+
+def regressions(report, baseline=None, tolerance=0.1):
+    """List the regressions of a report: rewrites that lose against their original and, given a
+    baseline report, rewrites whose p50 grew by more than `tolerance` since the baseline.
+
+    Returns:
+        list: Human-readable regression descriptions; empty if there are none.
+    """
+    found = []
+    for case in report["cases"]:
+        if case["verdict"] == "not_equivalent":
+            found.append(f"{case['name']}: rewritten results differ ({case['equivalence']['difference']})")
+        elif case["verdict"] == "regressed":
+            found.append(f"{case['name']}: rewrite is slower than the original "
+                         f"(speedup cold {case['speedup']['cold']}, warm {case['speedup']['warm']})")
+    if baseline is not None:
+        previous = {case["name"]: case for case in baseline["cases"]}
+        for case in report["cases"]:
+            before = previous.get(case["name"])
+            if before is None:
+                continue
+            for phase in ("cold", "warm"):
+                old, new = before["timings"]["rewritten"][phase]["p50"], case["timings"]["rewritten"][phase]["p50"]
+                if old and new is not None and (new - old) / old > tolerance:
+                    found.append(f"{case['name']}: rewritten {phase} p50 {old} -> {new} ({(new - old) / old:+.0%})")
+    return found
+
+
+def format_report(report):
+    """Render a benchmark report as a plain-text table."""
+    lines = [f"{'case':<24} {'verdict':<15} {'cold p50 orig/new':>19} {'warm p50 orig/new':>19} {'speedup':>8}"]
+    for case in report["cases"]:
+        timings = case["timings"]
+        cold = f"{timings['original']['cold']['p50']}/{timings['rewritten']['cold']['p50']}"
+        warm = f"{timings['original']['warm']['p50']}/{timings['rewritten']['warm']['p50']}"
+        lines.append(f"{case['name']:<24} {case['verdict']:<15} {cold:>19} {warm:>19} {case['speedup']['warm'] or '-':>8}")
+    lines.append(f"Durations in seconds from the {', '.join(report['timing_source'])} clock.")
+    return "\n".join(lines)
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rewritten DAX queries against their originals.")
+    parser.add_argument("cases", help="JSON file of benchmark cases.")
+    parser.add_argument("--dataset", help="Dataset ID; defaults to the one in the cases file.")
+    parser.add_argument("--cold-runs", type=int, default=3, help="Cold runs per query.")
+    parser.add_argument("--warm-runs", type=int, default=10, help="Warm runs per query.")
+    parser.add_argument("--clear-cache-url", help="URL POSTed to before every cold run.")
+    parser.add_argument("--rel-tol", type=float, default=1e-6, help="Relative tolerance when comparing numbers.")
+    parser.add_argument("--stub", action="store_true", help="Run against the API stub server replaying recorded timings.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded latencies with --stub.")
+    parser.add_argument("--output", help="Report file (default: ./sandbox/benchmarks/dax-<timestamp>.json).")
+    parser.add_argument("--baseline", help="Previous report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression, e.g. 0.1 for 10%%.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    file_dataset, cases = load_cases(args.cases)
+    dataset_id = args.dataset or file_dataset
+    if not dataset_id:
+        parser.error("no dataset ID in the cases file; pass --dataset")
+
+    from powerbi_token_provider import POWERBI_SCOPE, PowerBITokenProvider, get_token_provider
+    stub = None
+    if args.stub:
+        from api_stub_server import StubServer
+        stub = StubServer(latency_scale=args.latency_scale).start()
+        provider = PowerBITokenProvider(authority=stub.url, background_refresh=False)
+        credentials = ("benchmark-tenant", "benchmark-client", "secret")
+        base_url, clear_cache_url = f"{stub.url}/v1.0/myorg", args.clear_cache_url or f"{stub.url}/stub/clearCache"
+    else:
+        from settings_store import get_settings
+        settings = get_settings()
+        provider = get_token_provider()
+        credentials = (settings.get_str("TENANT_ID"), settings.get_str("CLIENT_ID"), settings.get_str("CLIENT_SECRET"))
+        base_url, clear_cache_url = POWERBI_API_URL, args.clear_cache_url
+
+    try:
+        benchmark = DaxQueryBenchmark(lambda: provider.get_token(*credentials, POWERBI_SCOPE), base_url,
+                                      args.cold_runs, args.warm_runs, clear_cache_url, args.rel_tol, args.tolerance)
+        report = benchmark.run(dataset_id, cases)
+    finally:
+        if stub is not None:
+            provider.close()
+            stub.stop()
+
+    output = args.output or os.path.join("./sandbox/benchmarks", f"dax-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as out:
+        json.dump(report, out, indent=2)
+    print(format_report(report))
+    print(f"Report written to {output}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    found = regressions(report, baseline, args.tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if found:
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,38 +2,52 @@
 Module-level docstring describing the purpose of the code.
 """
 
-import os
-from dotenv import load_dotenv
+try:
+    from settings_store import get_settings
+except ImportError:
+    from skills.settings_store import get_settings
+
+# Values are looked up on attribute access (PEP 562) so importing this module never raises; a missing
+# required setting only fails the code that actually uses it. Read them as `config.API_URL` to see
+# .env edits: `from config import API_URL` still copies the value once, at import time.
+_REQUIRED = ("API_URL", "CONFIG_ENCRYPTION_KEY")
+
+_OPTIONAL = (
+    "TENANT_ID",
+    "CLIENT_ID",
+    "CLIENT_SECRET",
+    # Additional Azure OpenAI settings
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_API_KEY",
+    "AZURE_OPENAI_EMBEDDING_NAME",
+    "AZURE_OPENAI_KEY",
+    "AZURE_OPENAI_MODEL",
+    "AZURE_OPENAI_MODEL_NAME",
+    "AZURE_OPENAI_RESOURCE",
+    "API_VERSION",
+    "ANTHROPIC_API_KEY",
+)
 
-load_dotenv()
-
-# Configuration for API connectivity
-API_URL = os.getenv("API_URL")
-if API_URL is None:
-    raise ValueError("API_URL is not set in the environment variables.")
-
-CONFIG_ENCRYPTION_KEY = os.getenv("CONFIG_ENCRYPTION_KEY")
-if CONFIG_ENCRYPTION_KEY is None:
-    raise ValueError("CONFIG_ENCRYPTION_KEY is not set in the environment variables.")
-
-TENANT_ID = os.getenv("TENANT_ID")
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
+# Optional variables with default values
+_DEFAULTS = {
+    "DATASET_ID": "default_dataset_id",
+}
 
 # Resource URLs for Azure services
 RESOURCE_URL = "https://analysis.windows.net/powerbi/api"
 SCOPE_URL = "https://analysis.windows.net/powerbi/api/.default"
 
-# Additional Azure OpenAI settings
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_EMBEDDING_NAME = os.getenv("AZURE_OPENAI_EMBEDDING_NAME")
-AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
-AZURE_OPENAI_MODEL = os.getenv("AZURE_OPENAI_MODEL")
-AZURE_OPENAI_MODEL_NAME = os.getenv("AZURE_OPENAI_MODEL_NAME")
-AZURE_OPENAI_RESOURCE = os.getenv("AZURE_OPENAI_RESOURCE")
-API_VERSION = os.getenv("API_VERSION")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
-# Optional variables with default values
-DATASET_ID = os.getenv("DATASET_ID", "default_dataset_id")
+def __getattr__(name):
+    # The shared settings store parses .env once per process and re-reads it only when it changes.
+    if name in _REQUIRED:
+        return get_settings().require(name)
+    if name in _OPTIONAL:
+        return get_settings().get_str(name)
+    if name in _DEFAULTS:
+        return get_settings().get_str(name, _DEFAULTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_REQUIRED) | set(_OPTIONAL) | set(_DEFAULTS))
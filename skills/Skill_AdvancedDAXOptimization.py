@@ -1,10 +1,14 @@
+import os
 import autogen
+from dax_analyzer import DaxAnalyzer, RULES, format_findings
+from telemetry import span
 
 # Define the advanced DAX optimization skill
 advanced_dax_skill = autogen.Skill(
     name="AdvancedDAXOptimization",
     description="Optimizes DAX expressions to enhance visual quality and performance in Power BI reports, focusing on advanced techniques, machine learning insights, and seamless API integration.",
     tasks=[
+        "Find performance anti-patterns offline with the DAX static analyzer, and use the model only to explain them",
         "Utilize variables and advanced functions for dynamic DAX expressions",
         "Develop and optimize DAX for enhanced visual quality",
         "Adaptively refine DAX expressions based on visual feedback",
@@ -19,17 +23,65 @@ advanced_dax_skill = autogen.Skill(
     ]
 )
 
-# Attach the skill to a Visualization Expert agent
-visualization_expert = autogen.AssistantAgent(
-    name="VisualizationExpert",
-    system_message="Enhances the visual quality of Power BI reports through advanced DAX optimizations.",
-    skills=[advanced_dax_skill]
-)
 
-# Setup the workflow
-workflow_integration = autogen.GroupChat(agents=[visualization_expert], max_round=10)
-workflow_manager = autogen.GroupChatManager(group_chat=workflow_integration)
+def analyze_dax_measures(dax_formulas, model=None, explain=False, client=None):
+    """
+    Finds performance anti-patterns in DAX measures with the offline static analyzer.
+
+    :param dax_formulas: str, "Name = expression" definitions, or a dict of name -> expression.
+    :param model: DaxModel, optional table sizes, bidirectional relationships and measure names.
+    :param explain: bool, also ask the model to explain the findings and how to rewrite the measures.
+    :param client: AzureOpenAI, client used for the explanation; created from the environment if omitted.
+    :return: dict, the analyzer report, with "explanation" when explain is set and there are findings.
+    """
+    report = DaxAnalyzer(model).analyze_measures(dax_formulas)
+    if explain and report["findings"]:
+        report["explanation"] = explain_findings(report["findings"], client)
+    return report
+
+
+def explain_findings(findings, client=None, max_findings=20):
+    """
+    Asks the model to explain analyzer findings; the model is not asked to find anything itself.
+    """
+    if client is None:
+        from openai import AzureOpenAI
+        client = AzureOpenAI(api_key=os.getenv("AZURE_OPENAI_API_KEY"), azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                             api_version="2024-02-01")
+    rules = sorted({finding["rule"] for finding in findings[:max_findings]})
+    prompt = ("A DAX static analyzer reported the findings below. For each one, explain in one or two sentences "
+              "why it is slow and show the rewritten expression. Do not add findings of your own.\n\n"
+              + "\n".join(f"{rule}: {RULES[rule][1]}" for rule in rules) + "\n\n"
+              + format_findings(findings[:max_findings]))
+    with span("dax.explain", findings=len(findings)) as call_span:
+        response = client.chat.completions.create(
+            model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=150 * min(len(findings), max_findings)
+        )
+        usage = getattr(response, "usage", None)
+        call_span.record_tokens(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+    return (response.choices[0].message.content or "").strip() if response.choices else ""
+
+
+def build_workflow_interface():
+    """Build the Visualization Expert group chat; agents are only created when a session is wanted."""
+    # Attach the skill to a Visualization Expert agent
+    visualization_expert = autogen.AssistantAgent(
+        name="VisualizationExpert",
+        system_message=("Enhances the visual quality of Power BI reports through advanced DAX optimizations. "
+                        "Base every suggestion on the findings of analyze_dax_measures rather than on "
+                        "reading the measures yourself."),
+        skills=[advanced_dax_skill]
+    )
+
+    # Setup the workflow
+    workflow_integration = autogen.GroupChat(agents=[visualization_expert], max_round=10)
+    workflow_manager = autogen.GroupChatManager(group_chat=workflow_integration)
+    return autogen.GroupChatInterface(workflow_manager)
+
 
 # Launch the optimized workflow
-workflow_interface = autogen.GroupChatInterface(workflow_manager)
-workflow_interface.start_session()
+if __name__ == "__main__":
+    workflow_interface = build_workflow_interface()
+    workflow_interface.start_session()
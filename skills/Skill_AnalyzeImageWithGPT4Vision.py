@@ -1,20 +1,38 @@
 import os
-import base64
 import mimetypes
 import imghdr
 import logging
+import threading
 from openai import AzureOpenAI
 from openai.error import APIError, APIConnectionError, RateLimitError, AuthenticationError
 from jsonschema import validate, ValidationError
 from autogen.skill_base import Skill, SkillExecutionError
+from image_handle import ImageHandle
+from image_dedup import PageDedupIndex, perceptual_hash
+from response_cache import ResponseCache, AzureOpenAIEmbedder, content_key
+from vision_batch import VisionBatchAnalyzer, parse_packed_answers
+from visual_segmentation import VisualIndex, compose_grid, write_image
+from PIL import Image
+from image_preprocess import prepare_for_vision, stitch_answers
+from telemetry import span
 
 # Make sure to configure your Python path or environment correctly to find custom modules
 # Assume that necessary configurations and API keys are correctly set in the environment variables
-client = AzureOpenAI(
-    api_version="2024-02-01",
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY")
-)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the module's AzureOpenAI client, creating it on first use rather than at import."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AzureOpenAI(
+                api_version="2024-02-01",
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_API_KEY")
+            )
+        return _client
 
 class AnalyzeImageWithGPT4Vision(Skill):
     """
@@ -35,6 +53,19 @@ class AnalyzeImageWithGPT4Vision(Skill):
             "question": {
                 "type": "string",
                 "description": "Question to pose regarding the image."
+            },
+            "visual_id": {
+                "type": "integer",
+                "description": "Ask about this visual of the page only, by its id in the page's visual index."
+            },
+            "regions": {
+                "type": "array",
+                "items": {"type": "array", "items": {"type": "integer"}, "minItems": 4, "maxItems": 4},
+                "description": "Ask about these [left, top, right, bottom] regions of the page only."
+            },
+            "per_visual": {
+                "type": "boolean",
+                "description": "Answer the question for every visual on the page, sent together as one numbered grid."
             }
         },
         "required": ["image_file", "question"]
@@ -46,11 +77,35 @@ class AnalyzeImageWithGPT4Vision(Skill):
             "answer": {
                 "type": "string",
                 "description": "Answer generated by GPT-4 Vision based on the image and question."
+            },
+            "deduplicated": {
+                "type": "boolean",
+                "description": "True if the answer was reused from a perceptually identical page."
+            },
+            "estimated_tokens": {
+                "type": "integer",
+                "description": "Estimated prompt tokens charged for the image(s) sent."
+            },
+            "visual_answers": {
+                "type": "array",
+                "items": {"type": "object"},
+                "description": "With per_visual, one {id, box, answer} per visual of the page."
             }
         },
         "required": ["answer"]
     }
 
+    # Pages whose perceptual hashes differ in at most `dedup_threshold` of 64 bits share answers.
+    dedup_dir = "./sandbox/page_dedup"
+    dedup_threshold = 4
+    _dedup_index = None
+
+    response_cache_path = "./sandbox/response_cache.sqlite"
+    _response_cache = None
+
+    visuals_dir = "./sandbox/visuals"
+    _visual_index = None
+
     def execute(self, input_data):
         """
         Execute the skill with the given input data.
@@ -71,31 +126,201 @@ class AnalyzeImageWithGPT4Vision(Skill):
         if detected_format not in ["png", "jpeg"]:
             raise SkillExecutionError("Image content does not match the expected format.")
 
-        image_data = self.encode_image(image_file)
-        answer = self.ask_gpt4_vision(image_data, question)
-        output_data = {"answer": answer}
+        if "visual_id" in input_data:
+            output_data = self.analyze_visual(image_file, input_data["visual_id"], question)
+            self.validate_output(output_data)
+            return output_data
+        if input_data.get("regions"):
+            output_data = self.analyze_regions(image_file, input_data["regions"], question)
+            self.validate_output(output_data)
+            return output_data
+        if input_data.get("per_visual"):
+            output_data = self.analyze_visuals(image_file, question)
+            self.validate_output(output_data)
+            return output_data
+
+        dedup_index = self.get_dedup_index()
+        image_hash = perceptual_hash(image_file)
+        reused = dedup_index.lookup(image_file, question, image_hash)
+        if reused is not None:
+            output_data = {"answer": reused["answer"], "deduplicated": True}
+            self.validate_output(output_data)
+            return output_data
+
+        # Send the page at the resolution the model analyses; very wide pages go as overlapping tiles.
+        prepared = prepare_for_vision(image_file)
+        parts = prepared["parts"]
+        answers = []
+        for index, part in enumerate(parts, 1):
+            part_question = question if len(parts) == 1 else (
+                f"This image is part {index} of {len(parts)} of a larger report page, in reading order. {question}")
+            answers.append(self.ask_about_image(part["path"], part_question))
+        answer = stitch_answers(prepared, answers)
+        dedup_index.record(image_file, question, answer, image_hash)
+        output_data = {"answer": answer, "deduplicated": False, "estimated_tokens": prepared["estimated_tokens"]}
         self.validate_output(output_data)
         return output_data
 
+    def execute_batch(self, pairs, **options):
+        """
+        Analyze many (image_file, question) pairs concurrently.
+
+        Questions about the same image are packed into one request, requests are paced to the
+        deployment's RPM/TPM quotas, and throttled calls are retried after Retry-After instead of
+        failing the batch. Options are passed to VisionBatchAnalyzer.
+        """
+        options.setdefault("response_cache", self.get_response_cache())
+        return VisionBatchAnalyzer(**options).run(pairs)
+
+    def analyze_visual(self, image_file, visual_id, question):
+        """
+        Answer a question about one visual of a page, sending only its crop.
+        """
+        try:
+            crops = self.get_visual_index().crop(image_file, [visual_id])
+        except (OSError, ValueError) as e:
+            raise SkillExecutionError(f"Failed to segment image: {e}") from e
+        if not crops:
+            raise SkillExecutionError(f"Image has no visual {visual_id}: {image_file}")
+        crop = crops[0]
+        answer = self.ask_about_image(crop["path"], question)
+        return {"answer": answer, "deduplicated": False, "estimated_tokens": crop["estimated_tokens"]}
+
+    def analyze_regions(self, image_file, regions, question):
+        """
+        Answer a question about some regions of a page, such as the parts that changed since the
+        page was last analysed. Several regions are sent together as one numbered grid.
+        """
+        stat = os.stat(image_file)
+        name = content_key(os.path.abspath(image_file), stat.st_size, stat.st_mtime_ns, regions)[:24]
+        try:
+            with Image.open(image_file) as img:
+                if len(regions) == 1:
+                    width, height = img.size
+                    left, top, right, bottom = regions[0]
+                    box = (max(0, left), max(0, top), min(width, right), min(height, bottom))
+                    region_img = img.convert("RGB").crop(box)
+                    prompt = f"The image is a region cropped from a report page. {question}"
+                else:
+                    region_img, _ = compose_grid(img, regions)
+                    prompt = (f"The image shows {len(regions)} regions cropped from one report page, each below a "
+                              f"black label with its number. {question}")
+        except (OSError, ValueError) as e:
+            raise SkillExecutionError(f"Failed to crop image: {e}") from e
+        written = write_image(region_img, self.visuals_dir, f"regions_{name}")
+        answer = self.ask_about_image(written["path"], prompt)
+        return {"answer": answer, "deduplicated": False, "estimated_tokens": written["estimated_tokens"]}
+
+    def analyze_visuals(self, image_file, question):
+        """
+        Answer a question about every visual of a page in one request.
+
+        The visuals are cropped and packed into a numbered grid, and the model answers per number.
+        If the reply cannot be split into per-visual answers, each crop is asked about on its own
+        through `execute_batch`.
+        """
+        index = self.get_visual_index()
+        try:
+            visuals = index.get(image_file)["visuals"]
+            grid = index.grid(image_file) if visuals else None
+        except (OSError, ValueError) as e:
+            raise SkillExecutionError(f"Failed to segment image: {e}") from e
+        if grid is None:
+            return {"answer": "No visuals were found on the page.", "deduplicated": False,
+                    "estimated_tokens": 0, "visual_answers": []}
+
+        cells = grid["cells"]
+        prompt = (f"The image shows {len(cells)} visuals cropped from one report page, each below a black label "
+                  f"with its number. Answer the following question for each numbered visual: {question}\n"
+                  f"Respond only with a JSON object mapping each visual number (as a string) to its answer.")
+        reply = self.ask_about_image(grid["path"], prompt, max_tokens=250 * len(cells))
+        answers = parse_packed_answers(reply, len(cells))
+        estimated_tokens = grid["estimated_tokens"]
+        if answers is None:
+            logging.warning("Per-visual answer could not be parsed; asking about each visual separately")
+            crops = index.crop(image_file)
+            results = self.execute_batch([(crop["path"], question) for crop in crops])
+            answers = [result.get("answer") or f"(analysis failed: {result.get('error')})" for result in results]
+            estimated_tokens = sum(crop["estimated_tokens"] for crop in crops)
+
+        by_id = {visual["id"]: visual for visual in visuals}
+        visual_answers = [{"id": cell["id"], "box": by_id[cell["id"]]["box"], "answer": answer}
+                          for cell, answer in zip(cells, answers)]
+        answer = "\n\n".join(
+            f"Visual {item['id']} (left {item['box'][0]}, top {item['box'][1]}): {item['answer']}"
+            for item in visual_answers)
+        return {"answer": answer, "deduplicated": False, "estimated_tokens": estimated_tokens,
+                "visual_answers": visual_answers}
+
+    def get_visual_index(self):
+        """
+        Return the index of page visuals shared by all instances.
+        """
+        if AnalyzeImageWithGPT4Vision._visual_index is None:
+            AnalyzeImageWithGPT4Vision._visual_index = VisualIndex(output_dir=self.visuals_dir)
+        return AnalyzeImageWithGPT4Vision._visual_index
+
+    def get_dedup_index(self):
+        """
+        Return the perceptual-hash index shared by all instances, used to reuse answers for near-identical pages.
+        """
+        if AnalyzeImageWithGPT4Vision._dedup_index is None:
+            AnalyzeImageWithGPT4Vision._dedup_index = PageDedupIndex(self.dedup_dir, self.dedup_threshold)
+        return AnalyzeImageWithGPT4Vision._dedup_index
+
     def encode_image(self, image_path):
         """
         Encode the image file in base64 format to prepare it for analysis.
+        The encoding is shared with other skills through the process-wide image handle.
+        """
+        return ImageHandle.for_path(image_path).base64()
+
+    def ask_about_image(self, image_path, question, max_tokens=250):
+        """
+        Ask a question about an image file, sent with the MIME type of its actual encoding.
         """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        handle = ImageHandle.for_path(image_path)
+        return self.ask_gpt4_vision(handle.base64(), question, max_tokens, mime_type=handle.mime_type)
 
-    def ask_gpt4_vision(self, image_data, question, max_tokens=250, temperature=0.5):
+    def ask_gpt4_vision(self, image_data, question, max_tokens=250, temperature=0.5, mime_type="image/png"):
         """
         Interact with GPT-4 Vision API to analyze the encoded image and provide answers to the given question.
+        Identical (image, question) calls, and near-identical questions about the same image, are served
+        from the response cache.
         """
+        image_key = content_key(image_data)
+        return self.get_response_cache().get_or_compute(
+            self.name,
+            (image_key, question, max_tokens, temperature),
+            lambda: self._call_gpt4_vision(image_data, question, max_tokens, temperature, mime_type),
+            prompt_text=question,
+            scope=image_key
+        )
+
+    def get_response_cache(self):
+        """
+        Return the response cache shared by all instances of this skill.
+        """
+        if AnalyzeImageWithGPT4Vision._response_cache is None:
+            embedding_deployment = os.getenv("AZURE_OPENAI_EMBEDDING_NAME")
+            embedder = AzureOpenAIEmbedder(get_client(), embedding_deployment) if embedding_deployment else None
+            AnalyzeImageWithGPT4Vision._response_cache = ResponseCache(self.response_cache_path, embedder=embedder)
+        return AnalyzeImageWithGPT4Vision._response_cache
+
+    def _call_gpt4_vision(self, image_data, question, max_tokens, temperature, mime_type="image/png"):
         try:
-            response = client.Completion.create(
-                model="gpt-4-vision",
-                prompt=question,
-                attachments=[{"data": f"data:image/png;base64,{image_data}", "type": "image/png"}],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            with span("vision.call", model="gpt-4-vision") as call_span:
+                call_span.record_bytes(len(image_data))
+                response = get_client().Completion.create(
+                    model="gpt-4-vision",
+                    prompt=question,
+                    attachments=[{"data": f"data:{mime_type};base64,{image_data}", "type": mime_type}],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+                usage = getattr(response, "usage", None)
+                call_span.record_tokens(getattr(usage, "prompt_tokens", None),
+                                        getattr(usage, "completion_tokens", None))
             if response.choices and response.choices[0].text:
                 return response.choices[0].text.strip()
             else:
@@ -1,7 +1,11 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from config import TENANT_ID, CLIENT_ID, CLIENT_SECRET, RESOURCE_URL, SCOPE_URL, DATASET_ID
 import powerbi_client
+from powerbi_token_provider import get_token_provider, AUTHORITY_HOST, TOKEN_ENDPOINT_TEMPLATE
+from dataset_freshness import DatasetFreshnessChecker
+from freshness_watermarks import WatermarkStore, refresh_id
 
 class PowerBIAuthenticator:
     """
@@ -14,6 +18,8 @@ class PowerBIAuthenticator:
         resource (str): The resource URL for Power BI.
         scope (str): The scope of the OAuth2 request.
         token_endpoint (str): Endpoint for retrieving OAuth2 tokens.
+        max_concurrency (int): Maximum schema and DAX queries run in parallel.
+        watermark_db (str): Path of the persisted freshness watermark store.
     """
 
     def __init__(self):
@@ -23,70 +29,119 @@ class PowerBIAuthenticator:
         self.client_secret = CLIENT_SECRET
         self.resource = RESOURCE_URL
         self.scope = SCOPE_URL
-        self.token_endpoint = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/token"
+        self.max_concurrency = 8
+        self.watermark_db = "./sandbox/freshness_watermarks.sqlite"
+        self.token_endpoint = TOKEN_ENDPOINT_TEMPLATE.format(authority=AUTHORITY_HOST, tenant_id=self.tenant_id)
 
     def get_powerbi_access_token(self):
         """Retrieve the Power BI API access token using client credentials.
 
+        Tokens come from the process-wide token provider, so repeated calls reuse a cached token
+        until shortly before it expires.
+
         Returns:
             str: Access token if successful, None otherwise.
         """
-        payload = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "resource": self.resource,
-            "scope": self.scope
-        }
         try:
-            response = requests.post(self.token_endpoint, data=payload, timeout=10)
-            response.raise_for_status()
-            token_data = response.json()
-            return token_data.get("access_token")
+            return get_token_provider().get_token(self.tenant_id, self.client_id, self.client_secret, self.scope)
         except requests.exceptions.RequestException as e:
             logging.error("HTTP Error obtaining access token: %s", e)
         return None
 
-    def last_data_update_checker(self, dataset_id):
+    def last_data_update_checker(self, dataset_id, previous_refresh=None):
         """Check the latest update timestamp for all tables in a given dataset.
 
+        The dataset refresh history is consulted first: if the latest refresh is the one seen on
+        the previous check, the table scan is skipped entirely.
+
         Args:
             dataset_id (str): The Power BI dataset ID to check.
+            previous_refresh (str): End time of the latest refresh seen by the previous check, if any.
 
         Returns:
-            dict: Dictionary with table names and their latest update timestamps if successful, error message otherwise.
+            dict: Dictionary with table names and their latest update timestamps if successful,
+                {"unchanged": True, "last_refresh": ...} if nothing was refreshed since
+                `previous_refresh`, error message otherwise.
         """
         access_token = self.get_powerbi_access_token()
         if not access_token:
             return {"error": "Failed to authenticate with Power BI API."}
-        
+
+        checker = DatasetFreshnessChecker(self.get_powerbi_access_token, max_concurrency=self.max_concurrency)
         try:
+            if previous_refresh is not None:
+                last_refresh = checker.last_refresh(dataset_id)
+                if last_refresh is not None and last_refresh.get("endTime") == previous_refresh:
+                    return {"unchanged": True, "last_refresh": previous_refresh}
+
             client = powerbi_client.connect(dataset_id, access_token)
             tables = client.get_tables(dataset_id)
-            return self._get_last_updates(client, tables)
+            return self._get_last_updates(client, tables, checker, dataset_id)
         except Exception as e:
             logging.error("Error checking last data update: %s", e)
             return {"error": "Failed to check last data update."}
 
-    def _get_last_updates(self, client, tables):
+    def check_for_changes(self, dataset_ids, store=None):
+        """Report which tables moved since the previous check, using the persisted watermark store.
+
+        Datasets whose latest refresh id matches the one recorded last time are skipped without
+        scanning any table, so the cost grows with the number of refreshed datasets only.
+
+        Args:
+            dataset_ids (list): Power BI dataset IDs to check.
+            store (WatermarkStore): Watermark store; defaults to the one at `self.watermark_db`.
+
+        Returns:
+            dict: Dataset ID -> {"changed": bool, "refresh_id": str, "tables": diff} where the diff
+                maps table -> column -> {"previous", "current"} (plus "removed" for columns and tables
+                that no longer exist), or {"error": message}.
+        """
+        access_token = self.get_powerbi_access_token()
+        if not access_token:
+            return {"error": "Failed to authenticate with Power BI API."}
+
+        store = store or WatermarkStore(self.watermark_db)
+        checker = DatasetFreshnessChecker(self.get_powerbi_access_token, max_concurrency=self.max_concurrency)
+        changes = {}
+        for dataset_id in dataset_ids:
+            try:
+                current_refresh = refresh_id(checker.last_refresh(dataset_id))
+                if current_refresh is not None and current_refresh == store.last_refresh_id(dataset_id):
+                    changes[dataset_id] = {"changed": False, "refresh_id": current_refresh, "tables": {}}
+                    continue
+                client = powerbi_client.connect(dataset_id, access_token)
+                tables = client.get_tables(dataset_id)
+                latest = self._get_last_updates(client, tables, checker, dataset_id)
+                diff = store.record(dataset_id, current_refresh, latest)
+                changes[dataset_id] = {"changed": bool(diff), "refresh_id": current_refresh, "tables": diff}
+            except Exception as e:
+                logging.error("Error checking dataset %s for changes: %s", dataset_id, e)
+                changes[dataset_id] = {"error": "Failed to check last data update."}
+        return changes
+
+    def _get_last_updates(self, client, tables, checker, dataset_id):
         """Retrieve the latest update date for each table in the dataset.
 
+        Table schemas are fetched concurrently, then all max-date lookups are combined into as few
+        DAX executeQueries calls as possible.
+
         Args:
             client (powerbi_client): Authenticated Power BI client.
             tables (list): List of tables in the dataset.
+            checker (DatasetFreshnessChecker): Batched max-date query runner.
+            dataset_id (str): The Power BI dataset ID.
 
         Returns:
             dict: Dictionary with table names and their latest update dates.
         """
-        last_updates = {}
-        for table in tables:
-            date_fields = [field for field in client.get_table_schema(table['name']) if field['type'] in ['date', 'datetime']]
-            last_updates[table['name']] = {}
-            for field in date_fields:
-                query = f"SELECT TOP 1 {field['name']} FROM {table['name']} ORDER BY {field['name']} DESC"
-                last_date = client.execute_query(query)
-                last_updates[table['name']][field['name']] = last_date
-        return last_updates
+        names = [table['name'] for table in tables]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            schemas = list(executor.map(client.get_table_schema, names))
+        date_columns = {
+            name: [field['name'] for field in schema if field['type'] in ['date', 'datetime']]
+            for name, schema in zip(names, schemas)
+        }
+        return checker.latest_dates(dataset_id, date_columns)
 
 # Usage
 if __name__ == "__main__":
@@ -2,9 +2,10 @@
 This module provides the EncodeImageForAnalysis skill for encoding images.
 """
 
-import base64
 import os
 from autogen import Skill, SkillExecutionError, logger
+from image_handle import ImageHandle
+from image_preprocess import prepare_for_vision
 
 
 class EncodeImageForAnalysis(Skill):
@@ -62,9 +63,16 @@ class EncodeImageForAnalysis(Skill):
         if not os.path.exists(image_path):
             raise SkillExecutionError(f"Image file not found: {image_path}")
 
-        # Check file size (example limit: 5 MB)
+        # Downscale to the resolution the model analyses and re-encode, instead of rejecting
+        # large exports outright; the 5 MB limit then applies to the prepared image.
         MAX_IMAGE_SIZE_MB = 5
-        file_size_mb = os.path.getsize(image_path) / (1024 * 1024)
+        try:
+            prepared = prepare_for_vision(image_path, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024, tile=False)
+        except Exception as e:
+            logger.error(f"Failed to prepare image: {e}")
+            raise SkillExecutionError(f"Failed to prepare image: {str(e)}") from e
+        part = prepared["parts"][0]
+        file_size_mb = part["bytes"] / (1024 * 1024)
         if file_size_mb > MAX_IMAGE_SIZE_MB:
             raise SkillExecutionError(
                 f"Image file exceeds the maximum size of {MAX_IMAGE_SIZE_MB} MB: "
@@ -72,12 +80,14 @@ class EncodeImageForAnalysis(Skill):
             )
 
         # Log the encoding process
-        logger.info(f"Encoding image: {image_path}, size: {file_size_mb:.2f} MB")
+        logger.info(
+            f"Encoding image: {image_path}, size: {file_size_mb:.2f} MB, "
+            f"estimated tokens: {part['estimated_tokens']}"
+        )
 
         try:
-            with open(image_path, "rb") as image_file:
-                encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
-                return encoded_image
+            # Shared handle: the file is memory-mapped and encoded at most once per process.
+            return ImageHandle.for_path(part["path"]).base64()
         except Exception as e:
             logger.error(f"Failed to encode image: {e}")
             raise SkillExecutionError(f"Failed to encode image: {str(e)}") from e
\ No newline at end of file
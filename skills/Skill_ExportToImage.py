@@ -1,8 +1,11 @@
-import os
-import base64
 import requests
-from dotenv import load_dotenv
 from autogen.skill_base import Skill, SkillExecutionError
+from powerbi_token_provider import get_token_provider, POWERBI_SCOPE
+from powerbi_export_engine import PowerBIExportEngine, ExportTarget, ExportJobError
+from export_cache import ExportCache
+from image_handle import ImageHandle
+from settings_store import get_settings
+from page_changes import change_key, get_change_detector
 
 
 class ExportPowerBIReportAsImage(Skill):
@@ -14,7 +17,8 @@ class ExportPowerBIReportAsImage(Skill):
         "properties": {
             "report_id": {"type": "string", "description": "ID of the Power BI report."},
             "page_name": {"type": "string", "description": "Name of the report page to export."},
-            "export_format": {"type": "string", "description": "Export format (PNG or PDF).", "enum": ["PNG", "PDF"]}
+            "export_format": {"type": "string", "description": "Export format (PNG or PDF).", "enum": ["PNG", "PDF"]},
+            "workspace_id": {"type": "string", "description": "ID of the workspace holding the report (optional)."}
         },
         "required": ["report_id", "page_name", "export_format"]
     }
@@ -27,12 +31,18 @@ class ExportPowerBIReportAsImage(Skill):
         "required": ["image_data"]
     }
 
+    output_dir = "./sandbox/exports"
+    cache_dir = "./sandbox/export_cache"
+    cache_max_bytes = 2 * 1024 ** 3
+    _export_cache = None
+
     def execute(self, input_data):
         self.validate_input(input_data)
         report_id = input_data["report_id"]
         page_name = input_data["page_name"]
         # Ensure format is in the correct case
         export_format = input_data["export_format"].upper()
+        workspace_id = input_data.get("workspace_id")
 
         try:
             access_token = self.get_powerbi_access_token()
@@ -41,63 +51,85 @@ class ExportPowerBIReportAsImage(Skill):
                     "Failed to obtain Power BI access token.")
 
             image_data = self.export_report_as_image(
-                report_id, page_name, export_format, access_token)
+                report_id, page_name, export_format, access_token, workspace_id)
             output_data = {"image_data": image_data}
             self.validate_output(output_data)
             return output_data
         except requests.exceptions.HTTPError as http_err:
             if http_err.response.status_code == 429:
                 raise SkillExecutionError(
-                    "API request rate limit exceeded, please try again later.")
+                    "API request rate limit exceeded, please try again later.") from http_err
             raise SkillExecutionError(
-                f"HTTP Error during API call: {str(http_err)}")
+                f"HTTP Error during API call: {str(http_err)}") from http_err
         except Exception as e:
-            raise SkillExecutionError(f"Error exporting report page: {str(e)}")
+            raise SkillExecutionError(f"Error exporting report page: {str(e)}") from e
 
     def get_powerbi_access_token(self):
-        load_dotenv()  # Load environment variables from .env file
-        tenant_id = os.getenv("TENANT_ID")
-        client_id = os.getenv("CLIENT_ID")
-        client_secret = os.getenv("CLIENT_SECRET")
-        scope = "https://analysis.windows.net/powerbi/api/.default"
-        token_endpoint = f"https://login.microsoftonline.com/{
-            tenant_id}/oauth2/v2.0/token"
-
-        payload = {
-            "grant_type": "client_credentials",
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "scope": scope
-        }
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        settings = get_settings()  # .env is parsed once and re-read only when it changes
+        tenant_id = settings.get_str("TENANT_ID")
+        client_id = settings.get_str("CLIENT_ID")
+        client_secret = settings.get_str("CLIENT_SECRET")
 
         try:
-            response = requests.post(
-                token_endpoint, headers=headers, data=payload)
-            response.raise_for_status()
-            token_data = response.json()
-            return token_data["access_token"]
+            return get_token_provider().get_token(
+                tenant_id, client_id, client_secret, POWERBI_SCOPE)
         except requests.exceptions.RequestException as e:
             raise SkillExecutionError(
-                f"Error obtaining Power BI access token: {str(e)}")
+                f"Error obtaining Power BI access token: {str(e)}") from e
 
-    def export_report_as_image(self, report_id, page_name, format, access_token):
+    def export_report_as_image(self, report_id, page_name, format, access_token, workspace_id=None):
         """
         Exports a Power BI report page as an image using the specified format and access token.
         """
-        url = f"https://api.powerbi.com/v1.0/myorg/reports/{
-            report_id}/pages/{page_name}/ExportTo"
-        headers = {'Authorization': f'Bearer {access_token}'}
-        params = {'format': format}
+        async def token_getter():
+            return access_token
 
+        engine = PowerBIExportEngine(token_getter, output_dir=self.output_dir, cache=self.get_export_cache())
         try:
-            response = requests.get(url, headers=headers, params=params)
-            # This will throw an error if the request was unsuccessful
-            response.raise_for_status()
-            return base64.b64encode(response.content).decode('utf-8')
-        except requests.exceptions.RequestException as e:
+            result = engine.run([ExportTarget(report_id, page_name, format, workspace_id)],
+                                return_exceptions=False)[0]
+            return ImageHandle.for_path(result["file_path"]).base64()
+        except (requests.exceptions.RequestException, ExportJobError) as e:
             raise SkillExecutionError(
-                f"Error exporting report page as image: {str(e)}")
+                f"Error exporting report page as image: {str(e)}") from e
+
+    def get_export_cache(self):
+        """
+        Returns the export cache shared by all instances of this skill, keyed on report and dataset versions.
+        """
+        if ExportPowerBIReportAsImage._export_cache is None:
+            ExportPowerBIReportAsImage._export_cache = ExportCache(self.cache_dir, self.cache_max_bytes)
+        return ExportPowerBIReportAsImage._export_cache
+
+    def export_report_pages(self, targets, detect_changes=False, change_question="", **engine_options):
+        """
+        Exports many report pages concurrently and writes them to disk.
+
+        `targets` is a list of ExportTarget instances or (report_id, page_name) tuples; a failed
+        page yields its exception in the returned list instead of aborting the other exports.
+        With `detect_changes`, each exported page is also compared with the export its last full
+        analysis of `change_question` was made from, and the result carries change_key and the
+        change fields of PageChangeDetector.compare.
+        """
+        settings = get_settings()
+        tenant_id = settings.get_str("TENANT_ID")
+        client_id = settings.get_str("CLIENT_ID")
+        client_secret = settings.get_str("CLIENT_SECRET")
+
+        async def token_getter():
+            return await get_token_provider().get_token_async(
+                tenant_id, client_id, client_secret, POWERBI_SCOPE)
+
+        engine_options.setdefault("output_dir", self.output_dir)
+        engine_options.setdefault("cache", self.get_export_cache())
+        results = PowerBIExportEngine(token_getter, **engine_options).run(targets)
+        if detect_changes:
+            detector = get_change_detector()
+            for result in results:
+                if isinstance(result, dict) and result["file_path"].lower().endswith(".png"):
+                    result["change_key"] = change_key(result["report_id"], result["page_name"], change_question)
+                    result.update(detector.compare(result["change_key"], result["file_path"]))
+        return results
 
 
 # Example usage
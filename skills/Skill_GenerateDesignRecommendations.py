@@ -3,11 +3,10 @@ import logging
 from azure.identity import DefaultAzureCredential
 from openai.azure_openai import AzureOpenAI  # Ensure this import matches the actual library structure
 import autogen
-from config import AZURE_OPENAI_ENDPOINT
+from config import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_EMBEDDING_NAME
 from autogen.exceptions import SkillExecutionError
-
-# Configure logging at the script level to avoid reconfiguration inside classes
-logging.basicConfig(level=logging.INFO)
+from response_cache import ResponseCache, AzureOpenAIEmbedder
+from telemetry import span
 
 class GenerateDesignRecommendations(autogen.Skill):
     name = "GenerateDesignRecommendations"
@@ -33,10 +32,16 @@ class GenerateDesignRecommendations(autogen.Skill):
         "required": ["recommendations"]
     }
 
-    def __init__(self):
+    response_cache_path = "./sandbox/response_cache.sqlite"
+
+    def __init__(self, response_cache=None):
         super().__init__()
         self.azure_credential = DefaultAzureCredential()
         self.client = AzureOpenAI(api_key=os.getenv("AZURE_OPENAI_API_KEY"), azure_endpoint=AZURE_OPENAI_ENDPOINT, api_version="2024-02-01")
+        if response_cache is None:
+            embedder = AzureOpenAIEmbedder(self.client, AZURE_OPENAI_EMBEDDING_NAME) if AZURE_OPENAI_EMBEDDING_NAME else None
+            response_cache = ResponseCache(self.response_cache_path, embedder=embedder)
+        self.response_cache = response_cache
 
     def execute(self, input_data):
         self.validate_input(input_data)
@@ -48,8 +53,17 @@ class GenerateDesignRecommendations(autogen.Skill):
 
     def get_design_recommendations(self, insights):
         prompt_text = f"Based on the following insights: {insights}, provide design recommendations."
+        # Identical or near-identical insights reuse the cached recommendations instead of calling the API.
+        return self.response_cache.get_or_compute(
+            self.name, (prompt_text,), lambda: self._request_recommendations(prompt_text), prompt_text=prompt_text)
+
+    def _request_recommendations(self, prompt_text):
         try:
-            response = self.client.completions.create(model="your-deployment-name", prompt=prompt_text, max_tokens=250)
+            with span("recommendations.call") as call_span:
+                response = self.client.completions.create(model="your-deployment-name", prompt=prompt_text, max_tokens=250)
+                usage = getattr(response, "usage", None)
+                call_span.record_tokens(getattr(usage, "prompt_tokens", None),
+                                        getattr(usage, "completion_tokens", None))
             if response.choices and response.choices[0].text:
                 return response.choices[0].text.strip().split("\n")
             else:
@@ -63,6 +77,8 @@ class GenerateDesignRecommendations(autogen.Skill):
 
 # Example usage
 if __name__ == "__main__":
+    # Logging is configured by the entry point only, so importing the skill adds no handlers.
+    logging.basicConfig(level=logging.INFO)
     skill_instance = GenerateDesignRecommendations()
     input_example = {"insights": "Here are detailed insights about your Power BI report's design."}
     try:
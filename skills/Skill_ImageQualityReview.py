@@ -0,0 +1,123 @@
+"""
+This module provides the ImageQualityReview skill for scoring exported report pages locally.
+"""
+
+import os
+from autogen import Skill, SkillExecutionError, logger
+from image_quality import ImageQualityScorer
+
+
+class ImageQualityReview(Skill):
+    """
+    Scores an exported report page for contrast, whitespace, balance, palette, alignment and
+    text resolution without calling a model, and lists the vision questions worth asking about
+    the criteria it fails. Pages that pass every criterion need no GPT-4 Vision review.
+    """
+
+    name = "ImageQualityReview"
+    description = "Scores the visual quality and clarity of an exported report page against design criteria."
+
+    input_schema = {
+        "type": "object",
+        "properties": {
+            "image_file": {
+                "type": "string",
+                "description": "The path of the exported page image to review."
+            },
+            "pass_score": {
+                "type": "integer",
+                "description": "Criteria scoring below this (0-100) are reported as issues."
+            }
+        },
+        "required": ["image_file"]
+    }
+
+    output_schema = {
+        "type": "object",
+        "properties": {
+            "quality_score": {
+                "type": "number",
+                "description": "Overall quality score from 0 to 100."
+            },
+            "quality_scores": {
+                "type": "object",
+                "description": "Score from 0 to 100 per criterion."
+            },
+            "quality_issues": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Criteria the page fails."
+            },
+            "quality_questions": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Questions for the vision model about the failed criteria; empty if the page passes."
+            },
+            "quality_summary": {
+                "type": "string",
+                "description": "One-paragraph summary of the measurements behind the failed criteria."
+            },
+            "quality_metrics": {
+                "type": "object",
+                "description": "The measurements behind each score."
+            }
+        },
+        "required": ["quality_score", "quality_scores", "quality_issues", "quality_questions"]
+    }
+
+    def execute(self, input_data):
+        self.validate_input(input_data)
+
+        image_file = input_data["image_file"]
+        if not os.path.isfile(image_file):
+            raise SkillExecutionError(f"Image file not found: {image_file}")
+
+        scorer = ImageQualityScorer(pass_score=input_data.get("pass_score", 70))
+        try:
+            result = scorer.score(image_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to score image: {e}")
+            raise SkillExecutionError(f"Failed to score image: {str(e)}") from e
+
+        logger.info(
+            f"Reviewed image: {image_file}, score: {result['score']}, "
+            f"issues: {', '.join(result['issues']) or 'none'}, {result['elapsed_ms']:.0f} ms"
+        )
+
+        output_data = {
+            "quality_score": result["score"],
+            "quality_scores": result["scores"],
+            "quality_issues": result["issues"],
+            "quality_questions": result["questions"],
+            "quality_summary": summarize_quality(result),
+            "quality_metrics": result["metrics"]
+        }
+        self.validate_output(output_data)
+        return output_data
+
+
+def summarize_quality(result):
+    """Describe the measurements behind a scorer result in plain sentences."""
+    metrics = result["metrics"]
+    sentences = [f"Local quality score {result['score']:.0f}/100."]
+    if "contrast" in result["issues"]:
+        contrast = metrics["contrast"]
+        sentences.append(f"{contrast['text_below_aa']:.0%} of text regions are below the WCAG 4.5:1 contrast ratio "
+                         f"and {contrast['graphics_below_aa']:.0%} of graphics below 3:1.")
+    if "whitespace" in result["issues"]:
+        sentences.append(f"{metrics['whitespace']['ratio']:.0%} of the page is empty space.")
+    if "balance" in result["issues"]:
+        sentences.append(f"Content is unevenly distributed (imbalance {metrics['balance']['imbalance']:.2f}).")
+    if "palette" in result["issues"]:
+        sentences.append(f"The page uses {metrics['palette']['size']} distinct colours.")
+    if "alignment" in result["issues"]:
+        alignment = metrics["alignment"]
+        misses = alignment["left"]["near_misses"] + alignment["top"]["near_misses"]
+        sentences.append(f"{misses} visual edge(s) miss a shared grid line by a few pixels.")
+    if "text_resolution" in result["issues"]:
+        text = metrics["text_resolution"]
+        sentences.append(f"{text['low_res_ratio']:.0%} of text regions are too small or blurry at the resolution "
+                         f"the vision model sees.")
+    if not result["issues"]:
+        sentences.append("No design criterion failed.")
+    return " ".join(sentences)
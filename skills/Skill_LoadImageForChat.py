@@ -1,8 +1,12 @@
 import os
 import base64
-from PIL import Image
 import io
 import logging
+from PIL import Image
+from image_handle import ImageHandle
+
+# Formats whose file bytes are sent as-is; anything else is decoded and re-saved by PIL.
+PASSTHROUGH_FORMATS = ("png", "jpeg", "gif")
 
 class LoadImageForChat:
     """
@@ -22,17 +26,27 @@ class LoadImageForChat:
     def load_image(self):
         """
         Loads the image from the specified path and encodes it to Base64.
+
+        PNG, JPEG and GIF files are sent as-is from the shared, memory-mapped image handle rather
+        than decoded and re-saved; other formats PIL can read (BMP, WEBP, TIFF, ...) go through PIL.
+        `image_data` holds the image bytes.
         
         Raises:
             FileNotFoundError: If the image file does not exist.
-            Exception: For other issues that might occur during file handling.
+            Exception: For other issues that might occur during file handling, including files
+                PIL cannot identify as an image.
         """
         try:
-            with Image.open(self.image_path) as img:
-                buffered = io.BytesIO()
-                img.save(buffered, format=img.format)
-                self.image_data = buffered.getvalue()
-                self.base64_image = base64.b64encode(self.image_data).decode('utf-8')
+            handle = ImageHandle.for_path(self.image_path)
+            if handle.format in PASSTHROUGH_FORMATS:
+                self.image_data = bytes(handle.buffer())
+                self.base64_image = handle.base64()
+            else:
+                with Image.open(self.image_path) as img:
+                    buffered = io.BytesIO()
+                    img.save(buffered, format=img.format)
+                    self.image_data = buffered.getvalue()
+                    self.base64_image = base64.b64encode(self.image_data).decode('utf-8')
         except FileNotFoundError as e:
             logging.error(f"The image file was not found: {e}")
             raise
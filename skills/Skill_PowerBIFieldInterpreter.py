@@ -1,58 +1,94 @@
 import requests
+from dataset_profiler import DatasetProfiler
 
-def authenticate_and_interpret_powerbi_fields(datasetId, tableName, authenticationToken):
+def authenticate_and_interpret_powerbi_fields(datasetId, tableName, authenticationToken, sampleRows=1000):
     """
     Authenticates to the Power BI dataset and interprets the fields within a specified table by analyzing their data type and sample data.
-    
+
     Inputs:
     - datasetId: str, the unique identifier of the Power BI dataset.
-    - tableName: str, the name of the table within the dataset to interpret.
+    - tableName: str, the name of the table within the dataset to interpret, or None for every table.
     - authenticationToken: str, a valid authentication token for accessing the Power BI API.
-    
+    - sampleRows: int, the number of rows sampled per table for profiling.
+
     Outputs:
     - fieldInsights: dict, insights for each field in the table, including data type, sample data observations, and recommendations.
+      When tableName is None, insights are keyed by table and then by field.
     """
-    # Base URL for Power BI API
-    base_url = "https://api.powerbi.com/v1.0/myorg/datasets"
-    
-    # Headers for authentication
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {authenticationToken}"
-    }
-    
-    # Initialize insights dictionary
-    fieldInsights = {}
-    
+    # The whole dataset is profiled in one batched pass and cached until the dataset refreshes,
+    # so interpreting further tables of the same dataset costs no API calls.
+    profiler = DatasetProfiler(lambda: authenticationToken, sample_rows=sampleRows)
+
     try:
-        # Step 1: Authenticate to Power BI API and retrieve table schema
-        schema_response = requests.get(f"{base_url}/{datasetId}/tables/{tableName}/columns", headers=headers)
-        schema_response.raise_for_status()
-        columns_info = schema_response.json()['value']
-        
-        # Step 2: Analyze each field in the schema
-        for column in columns_info:
-            column_name = column['name']
-            column_type = column['dataType']
-            # Placeholder for sample data interpretation logic
-            sample_data_insight = "Sample data analysis not implemented."
-            
-            # Add insights for the current field to the dictionary
-            fieldInsights[column_name] = {
-                "DataType": column_type,
-                "SampleDataInsight": sample_data_insight
+        # Step 1: Retrieve the schema and a bounded sample of every table
+        profiles = profiler.profile(datasetId)
+        tables = profiles["tables"]
+        if tableName is not None and tableName not in tables:
+            return {
+                "Error": f"Table {tableName} not found in dataset {datasetId}."
             }
-        
-        # Step 3: Generate overall insights (This step is simplified and would need actual implementation)
-        overall_insight = "Overall insights generation not implemented."
-        
+
+        # Step 2: Analyze each field from its profile
+        fieldInsights = {}
+        for table, columns in tables.items():
+            fieldInsights[table] = {
+                column_name: {
+                    "DataType": profile["data_type"],
+                    "SampleDataInsight": describe_profile(profile),
+                    "Recommendations": recommend_for_profile(column_name, profile),
+                    "Profile": profile
+                }
+                for column_name, profile in columns.items()
+            }
+
+        # Step 3: Generate overall insights
+        selected = {tableName: fieldInsights[tableName]} if tableName is not None else fieldInsights
+        field_count = sum(len(fields) for fields in selected.values())
+        flagged = sum(1 for fields in selected.values() for insight in fields.values() if insight["Recommendations"])
+        overall_insight = (f"Profiled {field_count} fields in {len(selected)} table(s) from samples of up to "
+                           f"{sampleRows} rows; {flagged} field(s) have recommendations.")
+
         return {
-            "fieldInsights": fieldInsights,
-            "OverallInsight": overall_insight
+            "fieldInsights": fieldInsights[tableName] if tableName is not None else fieldInsights,
+            "OverallInsight": overall_insight,
+            "Cached": profiles["cached"]
         }
-    
+
     except requests.RequestException as e:
         # Handle exceptions and errors
         return {
             "Error": str(e)
         }
+
+def describe_profile(profile):
+    """
+    Summarizes a column profile in one sentence.
+    """
+    parts = [f"{profile['null_rate']:.1%} null", f"{profile['cardinality']} distinct of {profile['sampled']} sampled"]
+    if profile["min"] is not None:
+        parts.append(f"range {profile['min']} to {profile['max']}")
+    if profile["top_values"] and profile["sampled"]:
+        top = profile["top_values"][0]
+        parts.append(f"most frequent {top['value']!r} ({top['count'] / profile['sampled']:.0%})")
+    return ", ".join(parts) + "."
+
+def recommend_for_profile(column_name, profile):
+    """
+    Suggests modelling improvements from a column profile.
+    """
+    recommendations = []
+    sampled = profile["sampled"]
+    if not sampled:
+        return recommendations
+    if profile["null_rate"] >= 0.5:
+        recommendations.append("Mostly blank in the sample; consider removing the column or handling blanks in measures.")
+    if profile["cardinality"] == 1 and profile["null_rate"] == 0:
+        recommendations.append("Constant in the sample; it adds no information to visuals or slicers.")
+    data_type = (profile["data_type"] or "").lower()
+    if data_type == "string" and profile["cardinality"] >= 0.9 * sampled and sampled >= 100:
+        recommendations.append("Near-unique text; avoid it in slicers and axes, and remove it if unused, to reduce model size.")
+    if data_type == "string" and profile["min"] is None and profile["top_values"]:
+        values = [str(v["value"]) for v in profile["top_values"]]
+        if all(v.replace(".", "", 1).lstrip("-").isdigit() for v in values):
+            recommendations.append("Numeric values stored as text; change the data type so it sorts and aggregates correctly.")
+    return recommendations
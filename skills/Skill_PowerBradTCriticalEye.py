@@ -1,3 +1,6 @@
+from dax_analyzer import DaxAnalyzer, format_findings
+
+
 def power_bradt_critical_eye(power_query_solution, dax_formulas, power_bi_report):
     """
     Provides critical analysis of Power Query, DAX, and Power BI solutions, ensuring alignment with best practices.
@@ -42,8 +45,14 @@ def evaluate_data_transformation(solution):
 
 
 def review_dax_formulas(formulas):
-    # Review DAX formulas for performance
-    return "DAX formula performance review."
+    # Review DAX formulas for performance with the offline static analyzer
+    if not formulas or not formulas.strip():
+        return "No DAX formulas to review."
+    report = DaxAnalyzer().analyze_measures(formulas)
+    if not report["findings"]:
+        return f"DAX formula performance review: no anti-patterns found in {report['measures']} measure(s)."
+    return (f"DAX formula performance review: {len(report['findings'])} finding(s) in "
+            f"{report['measures']} measure(s).\n{format_findings(report['findings'])}")
 
 
 def assess_power_bi_report(report):
@@ -52,10 +61,10 @@ def assess_power_bi_report(report):
 
 
 def identify_improvement_areas(pq_analysis, dax_review, bi_report_assessment):
-    # Identify areas for improvement based on analysis
-    return "Strengths identified.", "Weaknesses identified.", "Improvement areas identified."
+    # Identify areas for improvement based on analysis; the DAX review lists concrete findings
+    return "Strengths identified.", "Weaknesses identified.", ["Improvement areas identified.", dax_review]
 
 
 def generate_feedback(strengths, weaknesses, improvements):
-    # Generate feedback based on the analysis
-    return f"Feedback: {strengths}, {weaknesses}, {improvements}."
+    # Generate feedback based on the analysis, one improvement area per paragraph
+    return f"Feedback: {strengths}, {weaknesses}\n\n" + "\n\n".join(improvements)
@@ -0,0 +1,125 @@
+"""
+This module finds the latest date in every date column of a Power BI dataset with batched DAX queries.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http_transport import get_session
+
+POWERBI_API_URL = "https://api.powerbi.com/v1.0/myorg"
+
+# Refresh history status of a refresh that finished loading data.
+COMPLETED = "Completed"
+
+logger = logging.getLogger(__name__)
+
+
+def dax_table(name):
+    """Quote a table name for DAX."""
+    return "'" + name.replace("'", "''") + "'"
+
+
+def dax_column(table, column):
+    """Fully qualify a column reference for DAX."""
+    return f"{dax_table(table)}[{column.replace(']', ']]')}]"
+
+
+def build_max_date_query(columns):
+    """Build one DAX query returning MAX() of every (table, column) pair as a single row.
+
+    Args:
+        columns (list): (table, column) pairs.
+
+    Returns:
+        tuple: The DAX query and the result column names in the same order as `columns`.
+    """
+    names = [f"c{i}" for i in range(len(columns))]
+    expressions = ", ".join(f'"{name}", MAX({dax_column(t, c)})' for name, (t, c) in zip(names, columns))
+    return f"EVALUATE ROW({expressions})", names
+
+
+class DatasetFreshnessChecker:
+    """
+    Computes per-column latest dates for a dataset through the executeQueries endpoint.
+
+    Instead of one query per column, max-date lookups are combined into a single DAX ROW() query
+    per table or per dataset (chunked to `max_columns_per_query`), and the queries run
+    concurrently up to `max_concurrency`.
+
+    Attributes:
+        token_getter (callable): Zero-argument function returning a Power BI access token.
+        base_url (str): Power BI REST API base URL, overridable for local stubs.
+        max_concurrency (int): Maximum executeQueries calls in flight.
+        max_columns_per_query (int): Maximum MAX() expressions in one DAX query.
+        timeout (int): Timeout in seconds for each HTTP request.
+    """
+
+    def __init__(self, token_getter, base_url=POWERBI_API_URL, max_concurrency=8,
+                 max_columns_per_query=100, timeout=60):
+        self.token_getter = token_getter
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_columns_per_query = max_columns_per_query
+        self.timeout = timeout
+        self._session = get_session()
+
+    def last_refresh(self, dataset_id, history=10):
+        """Return the most recent completed refresh of the dataset, or None if none of the last `history` completed.
+
+        In-progress ("Unknown") and failed refreshes are skipped: their data is not loaded yet, and
+        watermarking their id would hide the data once the same refresh completes.
+        """
+        response = self._session.get(
+            f"{self.base_url}/datasets/{dataset_id}/refreshes",
+            params={"$top": history}, headers=self._headers(), timeout=self.timeout
+        )
+        response.raise_for_status()
+        for refresh in response.json().get("value", []):
+            if refresh.get("status") == COMPLETED:
+                return refresh
+        return None
+
+    def latest_dates(self, dataset_id, date_columns, per="dataset"):
+        """Return the latest value of every date column.
+
+        Args:
+            dataset_id (str): The Power BI dataset ID.
+            date_columns (dict): Table name -> list of date/datetime column names.
+            per (str): "dataset" to pack columns of many tables into each query, "table" for one
+                query per table.
+
+        Returns:
+            dict: Table name -> {column name: latest value}.
+        """
+        pairs = [(table, column) for table, columns in date_columns.items() for column in columns]
+        if per == "table":
+            batches = [[(table, column) for column in columns]
+                       for table, columns in date_columns.items() if columns]
+            batches = [b[i:i + self.max_columns_per_query]
+                       for b in batches for i in range(0, len(b), self.max_columns_per_query)]
+        else:
+            batches = [pairs[i:i + self.max_columns_per_query]
+                       for i in range(0, len(pairs), self.max_columns_per_query)]
+
+        last_updates = {table: {} for table in date_columns}
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for batch, values in zip(batches, executor.map(lambda b: self._query_batch(dataset_id, b), batches)):
+                for (table, column), value in zip(batch, values):
+                    last_updates[table][column] = value
+        return last_updates
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token_getter()}", "Content-Type": "application/json"}
+
+    def _query_batch(self, dataset_id, columns):
+        query, names = build_max_date_query(columns)
+        body = {"queries": [{"query": query}], "serializerSettings": {"includeNulls": True}}
+        response = self._session.post(
+            f"{self.base_url}/datasets/{dataset_id}/executeQueries",
+            json=body, headers=self._headers(), timeout=self.timeout
+        )
+        response.raise_for_status()
+        rows = response.json()["results"][0]["tables"][0]["rows"]
+        row = rows[0] if rows else {}
+        logger.debug("Fetched %d max dates for dataset %s in one query", len(columns), dataset_id)
+        return [row.get(f"[{name}]") for name in names]
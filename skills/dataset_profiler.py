@@ -0,0 +1,223 @@
+"""
+This module extracts the schema of a whole Power BI dataset and profiles a bounded sample of every column.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from dataset_freshness import DatasetFreshnessChecker, dax_column, dax_table
+from freshness_watermarks import refresh_id
+from http_transport import get_session
+
+POWERBI_API_URL = "https://api.powerbi.com/v1.0/myorg"
+
+SCHEMA_QUERY = "EVALUATE INFO.VIEW.COLUMNS()"
+NUMERIC_TYPES = {"int64", "double", "decimal", "currency"}
+DATETIME_TYPES = {"datetime", "date"}
+
+logger = logging.getLogger(__name__)
+
+
+def build_sample_query(table, columns, rows):
+    """Build one DAX query returning the first `rows` rows of the given columns of a table.
+
+    Returns:
+        tuple: The DAX query and the result column names in the same order as `columns`.
+    """
+    names = [f"c{i}" for i in range(len(columns))]
+    selected = ", ".join(f'"{name}", {dax_column(table, column)}' for name, column in zip(names, columns))
+    return f"EVALUATE SELECTCOLUMNS(TOPN({int(rows)}, {dax_table(table)}), {selected})", names
+
+
+def profile_frame(frame, data_types=None, top_values=5):
+    """Profile every column of a sample.
+
+    Null rates, cardinalities and min/max are computed column-wise over the whole frame at once;
+    only the top-value counts are per column.
+
+    Args:
+        frame (DataFrame): Sampled rows, one column per field.
+        data_types (dict): Column -> Power BI data type, used to parse numbers and dates.
+        top_values (int): Number of most frequent values to report.
+
+    Returns:
+        dict: Column -> {sampled, null_rate, cardinality, min, max, top_values}.
+    """
+    data_types = {k: (v or "").lower() for k, v in (data_types or {}).items()}
+    frame = frame.copy()
+    for column in frame.columns:
+        data_type = data_types.get(column, "")
+        if data_type in NUMERIC_TYPES:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+        elif data_type in DATETIME_TYPES:
+            frame[column] = pd.to_datetime(frame[column], errors="coerce", utc=True)
+
+    sampled = len(frame)
+    null_rates = frame.isna().mean() if sampled else pd.Series(0.0, index=frame.columns)
+    cardinality = frame.nunique(dropna=True)
+    ordered = frame.select_dtypes(include=["number", "datetime", "datetimetz"])
+    minimums = ordered.min()
+    maximums = ordered.max()
+
+    profiles = {}
+    for column in frame.columns:
+        counts = frame[column].value_counts(dropna=True).head(top_values)
+        profiles[column] = {
+            "sampled": sampled,
+            "null_rate": round(float(null_rates[column]), 4),
+            "cardinality": int(cardinality[column]),
+            "min": _json_value(minimums.get(column)),
+            "max": _json_value(maximums.get(column)),
+            "top_values": [{"value": _json_value(value), "count": int(count)} for value, count in counts.items()]
+        }
+    return profiles
+
+
+def _json_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class DatasetProfiler:
+    """
+    Profiles all tables of a dataset in one batched pass.
+
+    The schema of every table comes from a single INFO.VIEW.COLUMNS() DAX query (falling back to
+    the REST tables/columns endpoints, which only push datasets expose), then each table is
+    sampled with one bounded TOPN query, the tables running concurrently up to
+    `max_concurrency`. Profiles are stored per dataset and reused until the dataset refreshes.
+
+    Attributes:
+        token_getter (callable): Zero-argument function returning a Power BI access token.
+        base_url (str): Power BI REST API base URL, overridable for local stubs.
+        max_concurrency (int): Maximum API calls in flight.
+        sample_rows (int): Rows sampled per table.
+        top_values (int): Most frequent values reported per column.
+        cache_dir (str): Directory of cached profiles, None to disable caching.
+        timeout (int): Timeout in seconds for each HTTP request.
+    """
+
+    def __init__(self, token_getter, base_url=POWERBI_API_URL, max_concurrency=8, sample_rows=1000,
+                 top_values=5, cache_dir="./sandbox/field_profiles", timeout=60):
+        self.token_getter = token_getter
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.sample_rows = sample_rows
+        self.top_values = top_values
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._session = get_session()
+
+    def profile(self, dataset_id, tables=None):
+        """Return the schema and column profiles of a dataset.
+
+        Args:
+            dataset_id (str): The Power BI dataset ID.
+            tables (list): Restrict to these tables; by default every table is profiled.
+
+        Returns:
+            dict: refresh_id, cached (bool) and tables: table -> column -> {data_type, ...profile}.
+        """
+        current_refresh = refresh_id(
+            DatasetFreshnessChecker(self.token_getter, self.base_url, timeout=self.timeout).last_refresh(dataset_id))
+        cached = self._load_cached(dataset_id, current_refresh)
+        if cached is None:
+            schema = self.schema(dataset_id)
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                profiled = executor.map(lambda item: self._profile_table(dataset_id, *item), schema.items())
+                profiles = dict(zip(schema, profiled))
+            cached = {"refresh_id": current_refresh, "sample_rows": self.sample_rows,
+                      "top_values": self.top_values, "tables": profiles}
+            self._store_cached(dataset_id, cached)
+            result = dict(cached, cached=False)
+        else:
+            result = dict(cached, cached=True)
+        if tables is not None:
+            result["tables"] = {t: result["tables"][t] for t in tables if t in result["tables"]}
+        return result
+
+    def schema(self, dataset_id):
+        """Return table -> {column: data type} for every visible table of the dataset."""
+        try:
+            rows = self._execute(dataset_id, SCHEMA_QUERY)
+        except Exception as e:
+            logger.info("INFO.VIEW.COLUMNS() unavailable for dataset %s (%s); using the REST tables API",
+                        dataset_id, e)
+            return self._rest_schema(dataset_id)
+        schema = {}
+        for row in rows:
+            if row.get("[IsHidden]") or row.get("[Type]") == "RowNumber":
+                continue
+            schema.setdefault(row["[Table]"], {})[row["[Name]"]] = row.get("[DataType]")
+        logger.debug("Fetched schema of %d tables of dataset %s in one query", len(schema), dataset_id)
+        return schema
+
+    def _rest_schema(self, dataset_id):
+        response = self._session.get(f"{self.base_url}/datasets/{dataset_id}/tables",
+                                     headers=self._headers(), timeout=self.timeout)
+        response.raise_for_status()
+        names = [table["name"] for table in response.json().get("value", [])]
+
+        def columns(name):
+            column_response = self._session.get(f"{self.base_url}/datasets/{dataset_id}/tables/{name}/columns",
+                                                headers=self._headers(), timeout=self.timeout)
+            column_response.raise_for_status()
+            return {c["name"]: c.get("dataType") for c in column_response.json().get("value", [])}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return dict(zip(names, executor.map(columns, names)))
+
+    def _profile_table(self, dataset_id, table, columns):
+        if not columns:
+            return {}
+        names = list(columns)
+        query, aliases = build_sample_query(table, names, self.sample_rows)
+        rows = self._execute(dataset_id, query)
+        frame = pd.DataFrame.from_records(rows, columns=[f"[{alias}]" for alias in aliases])
+        frame.columns = names
+        profiles = profile_frame(frame, columns, self.top_values)
+        return {name: {"data_type": columns[name], **profiles[name]} for name in names}
+
+    def _execute(self, dataset_id, query):
+        body = {"queries": [{"query": query}], "serializerSettings": {"includeNulls": True}}
+        response = self._session.post(f"{self.base_url}/datasets/{dataset_id}/executeQueries",
+                                      json=body, headers=self._headers(), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["results"][0]["tables"][0]["rows"]
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token_getter()}", "Content-Type": "application/json"}
+
+    def _cache_path(self, dataset_id):
+        return os.path.join(self.cache_dir, f"{dataset_id}.json")
+
+    def _load_cached(self, dataset_id, current_refresh):
+        # Datasets without refresh history (e.g. push datasets) have no version to key on.
+        if self.cache_dir is None or current_refresh is None:
+            return None
+        try:
+            with open(self._cache_path(dataset_id)) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (cached.get("refresh_id"), cached.get("sample_rows"), cached.get("top_values")) != \
+                (current_refresh, self.sample_rows, self.top_values):
+            return None
+        return cached
+
+    def _store_cached(self, dataset_id, profiles):
+        if self.cache_dir is None or profiles["refresh_id"] is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(dataset_id)
+        temp_path = f"{path}.part"
+        with open(temp_path, "w") as out:
+            json.dump(profiles, out, default=str)
+        os.replace(temp_path, path)
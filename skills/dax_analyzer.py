@@ -0,0 +1,575 @@
+"""
+This module finds known performance anti-patterns in DAX measures without calling a model.
+
+Measures are tokenized with a single regular expression, parsed into a small syntax tree by a
+precedence-climbing parser, and checked by rules in one walk over the tree, so thousands of
+measures are analysed per second. A language model is only needed to explain the findings.
+
+Usage:
+    python dax_analyzer.py measures.dax [--model model.json] [--json]
+
+`measures.dax` holds "Name = expression" definitions (or a DEFINE block of MEASURE definitions);
+`model.json` optionally describes the model: {"table_rows": {"Sales": 25000000},
+"bidirectional": [["Sales", "Customer"]], "measures": ["Total Sales"]}.
+"""
+
+import argparse
+import functools
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+
+# Functions that evaluate an expression for every row of the table in their first argument.
+ITERATORS = frozenset((
+    "SUMX", "AVERAGEX", "MINX", "MAXX", "COUNTX", "COUNTAX", "PRODUCTX", "RANKX", "CONCATENATEX",
+    "MEDIANX", "PERCENTILEX.INC", "PERCENTILEX.EXC", "STDEVX.P", "STDEVX.S", "VARX.P", "VARX.S",
+    "GEOMEANX", "FILTER", "ADDCOLUMNS", "SELECTCOLUMNS", "GENERATE", "GENERATEALL"
+))
+CALCULATE_FUNCTIONS = frozenset(("CALCULATE", "CALCULATETABLE"))
+ERROR_FUNCTIONS = frozenset(("IFERROR", "ISERROR"))
+
+# Rule id -> (severity, title).
+RULES = {
+    "DAX000": ("error", "Measure could not be parsed"),
+    "DAX001": ("warning", "FILTER over a whole table inside CALCULATE"),
+    "DAX002": ("warning", "Repeated sub-expression that should be a VAR"),
+    "DAX003": ("warning", "Row-by-row iterator over a large table"),
+    "DAX004": ("warning", "Measure reference inside an iterator causes a context transition per row"),
+    "DAX005": ("warning", "Result depends on a bidirectional relationship"),
+    "DAX006": ("warning", "IFERROR/ISERROR forces cell-by-cell evaluation"),
+    "DAX007": ("info", "Division operator instead of DIVIDE"),
+    "DAX008": ("warning", "SUMMARIZE with added columns"),
+}
+
+# Whitespace and comments are consumed as the prefix of the following token.
+_TOKEN = re.compile(r"""
+    (?:\s+|//[^\n]*|--[^\n]*|/\*.*?\*/)*
+    (?: (?P<end>\Z)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<column>(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)?\[(?:[^\]]|\]\])+\])
+  | (?P<table>'(?:[^']|'')+')
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<op>&&|\|\||<=|>=|<>|==|[-+*/^&=<>])
+  | (?P<punct>[(),{}])
+  | (?P<ident>[A-Za-z_][\w.]*)
+  | (?P<error>.) )
+""", re.VERBOSE | re.DOTALL)
+
+_PRECEDENCE = {"||": 1, "&&": 2, "=": 4, "==": 4, "<>": 4, "<": 4, ">": 4, "<=": 4, ">=": 4, "IN": 4,
+               "&": 5, "+": 6, "-": 6, "*": 7, "/": 7, "^": 8}
+
+_MEASURE_HEADER = re.compile(
+    r"^(?:MEASURE\s+)?(?P<name>'[^'\n]+'\[[^\]\n]+\]|[A-Za-z_][\w ]*\[[^\]\n]+\]|[A-Za-z_][^=:\[\]()\n]*?)\s*:?=(?!=)",
+    re.MULTILINE | re.IGNORECASE)
+
+
+class DaxSyntaxError(ValueError):
+    """Raised when a DAX expression cannot be tokenized or parsed."""
+
+    def __init__(self, message, position):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+class Node:
+    """
+    One node of a parsed DAX expression.
+
+    Attributes:
+        kind (str): call, column, table, var_ref, number, string, binary, unary, var, list, empty.
+        value: Function name (upper case), operator, (table, column) of a column reference,
+            variable names of a VAR block, or the literal text.
+        args (tuple): Child nodes.
+        start (int): Offset of the node's first character in the source.
+        end (int): Offset just past the node's last character.
+    """
+
+    __slots__ = ("kind", "value", "args", "start", "end")
+
+    def __init__(self, kind, value, args, start, end):
+        self.kind = kind
+        self.value = value
+        self.args = args
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Node({self.kind!r}, {self.value!r}, {len(self.args)} args)"
+
+
+def tokenize(source):
+    """Split a DAX expression into (kind, text, position) tuples, ending with an ("end", "", len) token."""
+    tokens = []
+    for match in _TOKEN.finditer(source):
+        kind = match.lastgroup
+        if kind == "end":
+            break
+        if kind == "error":
+            raise DaxSyntaxError(f"Unexpected character {match.group(kind)!r}", match.start(kind))
+        tokens.append((kind, match.group(kind), match.start(kind)))
+    tokens.append(("end", "", len(source)))
+    return tokens
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(source):
+    """Parse a DAX expression into a Node tree; identical expressions are parsed once."""
+    return _Parser(source).parse()
+
+
+class _Parser:
+    __slots__ = ("source", "tokens", "index", "variables")
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = tokenize(source)
+        self.index = 0
+        self.variables = set()
+
+    def parse(self):
+        node = self.expression(0)
+        kind, text, position = self.tokens[self.index]
+        if kind != "end":
+            raise DaxSyntaxError(f"Unexpected {text!r}", position)
+        return node
+
+    def expression(self, min_precedence):
+        left = self.unary()
+        while True:
+            kind, text, _ = self.tokens[self.index]
+            operator = text if kind == "op" else ("IN" if kind == "ident" and text.upper() == "IN" else None)
+            precedence = _PRECEDENCE.get(operator)
+            if precedence is None or precedence <= min_precedence:
+                return left
+            self.index += 1
+            # ^ is right-associative; every other operator is left-associative.
+            right = self.expression(precedence - 1 if operator == "^" else precedence)
+            left = Node("binary", operator, (left, right), left.start, right.end)
+
+    def unary(self):
+        kind, text, position = self.tokens[self.index]
+        if kind == "op" and text in "+-":
+            self.index += 1
+            operand = self.expression(7)
+            return Node("unary", text, (operand,), position, operand.end)
+        if kind == "ident" and text.upper() == "NOT" and self.tokens[self.index + 1][1] != "(":
+            self.index += 1
+            operand = self.expression(3)
+            return Node("unary", "NOT", (operand,), position, operand.end)
+        return self.primary()
+
+    def primary(self):
+        kind, text, position = self.tokens[self.index]
+        end = position + len(text)
+        if kind in ("number", "string"):
+            self.index += 1
+            return Node(kind, text, (), position, end)
+        if kind == "column":
+            self.index += 1
+            table, _, column = text.partition("[")
+            table = table[1:-1].replace("''", "'") if table.startswith("'") else table
+            return Node("column", (table or None, column[:-1].replace("]]", "]")), (), position, end)
+        if kind == "table":
+            self.index += 1
+            return Node("table", text[1:-1].replace("''", "'"), (), position, end)
+        if kind == "ident":
+            upper = text.upper()
+            if upper == "VAR":
+                return self.var_block()
+            if self.tokens[self.index + 1][1] == "(":
+                return self.call(upper, position)
+            self.index += 1
+            return Node("var_ref" if text in self.variables else "table", text, (), position, end)
+        if text == "(":
+            self.index += 1
+            items = self.items(")")
+            node = items[0] if len(items) == 1 else Node("list", "()", tuple(items), position, 0)
+            # The node spans its parentheses, so snippets of the expressions around it stay balanced.
+            node.start, node.end = position, self.expect(")")
+            return node
+        if text == "{":
+            self.index += 1
+            items = self.items("}")
+            return Node("list", "{}", tuple(items), position, self.expect("}"))
+        raise DaxSyntaxError(f"Unexpected {text or 'end of expression'!r}", position)
+
+    def call(self, name, position):
+        self.index += 2
+        args = self.items(")", allow_empty=True)
+        return Node("call", name, tuple(args), position, self.expect(")"))
+
+    def items(self, closing, allow_empty=False):
+        """Parse comma-separated expressions up to (not including) `closing`."""
+        items = []
+        if self.tokens[self.index][1] == closing:
+            return items
+        while True:
+            kind, text, position = self.tokens[self.index]
+            if allow_empty and kind == "punct" and text in (",", closing):
+                # Skipped optional argument, e.g. FORMAT(x, ) or RANKX(t, e, , DESC).
+                items.append(Node("empty", None, (), position, position))
+            else:
+                items.append(self.expression(0))
+            if self.tokens[self.index][1] != ",":
+                return items
+            self.index += 1
+
+    def expect(self, text):
+        kind, found, position = self.tokens[self.index]
+        if found != text:
+            raise DaxSyntaxError(f"Expected {text!r} but found {found or 'end of expression'!r}", position)
+        self.index += 1
+        return position + 1
+
+    def var_block(self):
+        start = self.tokens[self.index][2]
+        names, values = [], []
+        outer = set(self.variables)
+        while self.tokens[self.index][0] == "ident" and self.tokens[self.index][1].upper() == "VAR":
+            kind, name, position = self.tokens[self.index + 1]
+            if kind != "ident":
+                raise DaxSyntaxError("Expected a variable name", position)
+            self.index += 2
+            self.expect("=")
+            values.append(self.expression(0))
+            names.append(name)
+            self.variables.add(name)
+        kind, text, position = self.tokens[self.index]
+        if kind != "ident" or text.upper() != "RETURN":
+            raise DaxSyntaxError(f"Expected RETURN but found {text or 'end of expression'!r}", position)
+        self.index += 1
+        body = self.expression(0)
+        self.variables = outer
+        return Node("var", tuple(names), tuple(values) + (body,), start, body.end)
+
+
+def split_measures(text):
+    """Split "Name = expression" definitions (optionally in a DEFINE block) into (name, expression) pairs.
+
+    A definition starts at a line beginning with a name followed by "=" or ":="; text without such
+    a line is one unnamed expression.
+    """
+    text = re.sub(r"^\s*DEFINE\b", "", text, flags=re.IGNORECASE)
+    headers = [m for m in _MEASURE_HEADER.finditer(text) if m.group("name").split()[0].upper() not in ("VAR", "RETURN")]
+    if not headers:
+        return [(None, text.strip())] if text.strip() else []
+    measures = []
+    for header, following in zip(headers, headers[1:] + [None]):
+        expression = text[header.end():following.start() if following else len(text)].strip()
+        measures.append((header.group("name").strip(), expression))
+    return measures
+
+
+@dataclass
+class DaxModel:
+    """
+    What the analyzer knows about the model the measures belong to; every field is optional.
+
+    Attributes:
+        table_rows (dict): Table name -> row count, for the large-table rules.
+        bidirectional (list): (table, table) pairs joined by a bidirectional relationship.
+        measures (set): Measure names; without them, unqualified [Name] references count as measures.
+    """
+    table_rows: dict = field(default_factory=dict)
+    bidirectional: list = field(default_factory=list)
+    measures: set = field(default_factory=set)
+
+    def __post_init__(self):
+        self._rows = {name.lower(): rows for name, rows in self.table_rows.items()}
+        self._measures = {name.lower() for name in self.measures}
+
+    def rows(self, table):
+        return self._rows.get(table.lower())
+
+    def is_measure(self, name):
+        return not self._measures or name.lower() in self._measures
+
+
+class DaxAnalyzer:
+    """
+    Checks DAX measures against the anti-pattern rules in RULES.
+
+    Attributes:
+        model (DaxModel): Model facts used by the rules that need them.
+        large_table_rows (int): Tables with at least this many rows count as large.
+        min_repeat_size (int): Smallest sub-expression, in syntax tree nodes, reported when repeated.
+        disabled (set): Rule ids not to report.
+    """
+
+    def __init__(self, model=None, large_table_rows=1_000_000, min_repeat_size=4, disabled=()):
+        self.model = model or DaxModel()
+        self.large_table_rows = large_table_rows
+        self.min_repeat_size = min_repeat_size
+        self.disabled = set(disabled)
+
+    def analyze(self, expression, name=None):
+        """Return the findings for one DAX expression, as dicts with rule, severity, measure,
+        message, snippet and position."""
+        walk = self._walk(expression, name)
+        walk.check_bidirectional(walk.tables)
+        return [f for f in walk.findings if f["rule"] not in self.disabled]
+
+    def analyze_measures(self, measures):
+        """Analyse many measures.
+
+        Args:
+            measures (str or dict or list): Definitions text (see split_measures), a name ->
+                expression dict, or (name, expression) pairs.
+
+        Returns:
+            dict: measures (count), findings, counts per rule, elapsed_ms and measures_per_second.
+        """
+        if isinstance(measures, str):
+            measures = split_measures(measures)
+        elif isinstance(measures, dict):
+            measures = list(measures.items())
+        started = time.perf_counter()
+        walks = [self._walk(expression, name) for name, expression in measures]
+        # A measure depends on the tables of the measures it references, too.
+        by_name = {walk.name.lower(): walk for walk in walks if walk.name}
+        resolved = {}
+        findings = []
+        for walk in walks:
+            walk.check_bidirectional(_resolve_tables(walk, by_name, resolved, set()))
+            findings.extend(f for f in walk.findings if f["rule"] not in self.disabled)
+        elapsed = time.perf_counter() - started
+        counts = {}
+        for finding in findings:
+            counts[finding["rule"]] = counts.get(finding["rule"], 0) + 1
+        return {
+            "measures": len(measures),
+            "findings": findings,
+            "counts": counts,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "measures_per_second": round(len(measures) / elapsed) if elapsed > 0 else None
+        }
+
+    def _walk(self, expression, name):
+        walk = _Walk(self, expression, name)
+        try:
+            tree = parse(expression)
+        except DaxSyntaxError as e:
+            walk.report("DAX000", None, str(e), position=e.position)
+            return walk
+        walk.visit(tree, ())
+        walk.report_repeats()
+        return walk
+
+
+def _resolve_tables(walk, by_name, resolved, visiting):
+    """Return the tables a measure reads, directly or through the measures it references."""
+    key = (walk.name or "").lower()
+    if key in resolved:
+        return resolved[key]
+    visiting.add(key)
+    tables = set(walk.tables)
+    for reference in walk.measure_refs:
+        referenced = by_name.get(reference.lower())
+        if referenced is not None and reference.lower() not in visiting:
+            tables |= _resolve_tables(referenced, by_name, resolved, visiting)
+    visiting.discard(key)
+    if walk.name:
+        resolved[key] = tables
+    return tables
+
+
+class _Walk:
+    """State of one analysis: the findings so far and what the rules collect across the tree."""
+
+    def __init__(self, analyzer, source, name):
+        self.analyzer = analyzer
+        self.model = analyzer.model
+        self.source = source
+        self.name = name
+        self.findings = []
+        self.repeats = {}
+        self.tables = set()
+        self.measure_refs = set()
+        self.crossfilter = False
+        self.whole_table_filters = set()
+
+    def report(self, rule, node, message, position=None):
+        snippet = " ".join(self.source[node.start:node.end].split()) if node is not None else ""
+        self.findings.append({
+            "rule": rule,
+            "severity": RULES[rule][0],
+            "measure": self.name,
+            "message": message,
+            "snippet": snippet if len(snippet) <= 120 else snippet[:117] + "...",
+            "position": node.start if node is not None else position
+        })
+
+    def visit(self, node, context):
+        """Check `node` and its children; return its canonical key and size in nodes.
+
+        `context` identifies the enclosing evaluation context (iterators and CALCULATE calls), so
+        only repeats evaluated in the same context are suggested as variables.
+        """
+        kind = node.kind
+        if kind == "call":
+            name = node.value
+            inner = context + (id(node),)
+            self.check_call(node, name)
+            keys, size = [], 1
+            for index, arg in enumerate(node.args):
+                if name in ITERATORS:
+                    arg_context = context if index == 0 else inner
+                elif name in CALCULATE_FUNCTIONS:
+                    arg_context = inner if index == 0 else context
+                else:
+                    arg_context = context
+                key, arg_size = self.visit(arg, arg_context)
+                keys.append(key)
+                size += arg_size
+            key = f"{name}({','.join(keys)})"
+        elif kind in ("binary", "unary", "list", "var"):
+            if kind == "binary" and node.value == "/" and node.args[1].kind != "number":
+                self.report("DAX007", node, "Use DIVIDE(numerator, denominator) so a zero or blank denominator "
+                                            "returns blank instead of an error.")
+            keys, size = [], 1
+            for arg in node.args:
+                key, arg_size = self.visit(arg, context)
+                keys.append(key)
+                size += arg_size
+            key = f"{node.value}({','.join(keys)})" if kind != "var" else None
+        elif kind == "column":
+            table, column = node.value
+            if table is not None:
+                self.tables.add(table.lower())
+            elif self.model.is_measure(column):
+                self.measure_refs.add(column)
+            return f"{(table or '').lower()}[{column.lower()}]", 1
+        elif kind == "table":
+            self.tables.add(node.value.lower())
+            return node.value.lower(), 1
+        else:
+            return f"{kind}:{node.value}", 1
+
+        if key is not None and size >= self.analyzer.min_repeat_size:
+            self.repeats.setdefault((context, key), []).append((node, size))
+        return key, size
+
+    def check_call(self, node, name):
+        args = node.args
+        if name in CALCULATE_FUNCTIONS:
+            for arg in args[1:]:
+                if arg.kind == "call" and arg.value == "FILTER" and arg.args and _whole_table(arg.args[0]):
+                    self.whole_table_filters.add(id(arg))
+                    self.report("DAX001", arg, f"FILTER iterates every row of {_table_name(arg.args[0])} to build a "
+                                               f"filter; filter only the columns needed (e.g. KEEPFILTERS(Table[Column] "
+                                               f"= value)) so the predicate is pushed to the storage engine.")
+        elif name in ERROR_FUNCTIONS:
+            self.report("DAX006", node, f"{name} evaluates its argument cell by cell to catch errors; test the "
+                                        f"condition explicitly or use DIVIDE.")
+        elif name == "CROSSFILTER":
+            self.crossfilter = True
+        elif name == "SUMMARIZE" and any(arg.kind == "string" for arg in args[1:]):
+            self.report("DAX008", node, "Columns computed inside SUMMARIZE are evaluated in a complex filter "
+                                        "context; group with SUMMARIZE and add them with ADDCOLUMNS.")
+
+        if name in ITERATORS and args and args[0].kind == "table":
+            table = args[0].value
+            rows = self.model.rows(table)
+            large = rows is not None and rows >= self.analyzer.large_table_rows
+            # A whole-table FILTER in CALCULATE is already reported with its remedy.
+            if large and id(node) not in self.whole_table_filters:
+                self.report("DAX003", node, f"{name} evaluates its expression for each of the {rows:,} rows of "
+                                            f"{table}; aggregate a column or iterate a smaller table such as "
+                                            f"VALUES of the grouping column.")
+            measure = next((ref for arg in args[1:] for ref in _measure_refs(arg, self.model)), None)
+            if measure is not None and (rows is None or rows >= self.analyzer.large_table_rows // 100):
+                self.report("DAX004", node, f"[{measure}] inside {name} over {table} triggers a context "
+                                            f"transition for every row; iterate the distinct values that matter "
+                                            f"or aggregate the column directly.")
+
+    def check_bidirectional(self, tables):
+        """Report bidirectional relationships between tables the measure reads, unless it sets CROSSFILTER itself."""
+        if not self.crossfilter:
+            for first, second in self.model.bidirectional:
+                if first.lower() in tables and second.lower() in tables:
+                    self.report("DAX005", None, f"The result depends on the bidirectional relationship between "
+                                                f"{first} and {second}; make it single-direction and use "
+                                                f"CROSSFILTER(..., BOTH) only in the measures that need it.",
+                                position=0)
+
+    def report_repeats(self):
+        repeated = [(nodes[0][1], key, nodes) for (_, key), nodes in self.repeats.items() if len(nodes) > 1]
+        covered = set()
+        # Largest first, so the parts of a repeated expression are not reported again on their own.
+        for _, key, nodes in sorted(repeated, key=lambda r: -r[0]):
+            if all(id(node) in covered for node, _ in nodes):
+                continue
+            first = nodes[0][0]
+            self.report("DAX002", first, f"This expression is evaluated {len(nodes)} times in the same context; "
+                                         f"compute it once in a VAR and refer to the variable.")
+            for node, _ in nodes:
+                stack = [node]
+                while stack:
+                    current = stack.pop()
+                    covered.add(id(current))
+                    stack.extend(current.args)
+
+
+def _whole_table(node):
+    """Whether a table argument is an entire table: a table name or ALL(table)."""
+    if node.kind == "table":
+        return True
+    return node.kind == "call" and node.value == "ALL" and len(node.args) == 1 and node.args[0].kind == "table"
+
+
+def _table_name(node):
+    return node.value if node.kind == "table" else node.args[0].value
+
+
+def _measure_refs(node, model):
+    """Yield the names of measures referenced anywhere under `node`."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.kind == "column" and current.value[0] is None and model.is_measure(current.value[1]):
+            yield current.value[1]
+        stack.extend(current.args)
+
+
+def format_findings(findings):
+    """Render findings as one line each, grouped by measure."""
+    lines = []
+    for finding in findings:
+        where = f"[{finding['measure']}] " if finding["measure"] else ""
+        snippet = f" ({finding['snippet']})" if finding["snippet"] else ""
+        lines.append(f"{finding['severity'].upper()} {finding['rule']} {where}{finding['message']}{snippet}")
+    return "\n".join(lines)
+
+
+def load_model(path):
+    """Load a DaxModel from a JSON file with optional table_rows, bidirectional and measures keys."""
+    with open(path) as f:
+        spec = json.load(f)
+    return DaxModel(spec.get("table_rows", {}), [tuple(pair) for pair in spec.get("bidirectional", [])],
+                    set(spec.get("measures", [])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find performance anti-patterns in DAX measures.")
+    parser.add_argument("measures", help="File of measure definitions.")
+    parser.add_argument("--model", help="JSON file describing table sizes, bidirectional relationships and measures.")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+    args = parser.parse_args(argv)
+
+    with open(args.measures) as f:
+        text = f.read()
+    analyzer = DaxAnalyzer(load_model(args.model) if args.model else None)
+    report = analyzer.analyze_measures(text)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_findings(report["findings"]))
+        print(f"{report['measures']} measures, {len(report['findings'])} findings, "
+              f"{report['measures_per_second']} measures/s", file=sys.stderr)
+    return 1 if any(f["severity"] == "error" for f in report["findings"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
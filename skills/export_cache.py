@@ -0,0 +1,154 @@
+"""
+This module provides an on-disk, content-addressed cache for exported report pages.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def export_cache_key(report_id, page_name, export_format, report_modified, dataset_refreshed):
+    """Build the cache key of an export from the report page and the versions it was rendered from.
+
+    Args:
+        report_id (str): ID of the Power BI report.
+        page_name (str): Name of the report page.
+        export_format (str): Export format, e.g. PNG or PDF.
+        report_modified (str): Last modified timestamp of the report definition.
+        dataset_refreshed (str): End time of the last refresh of the dataset behind the report.
+
+    Returns:
+        str: Hex digest identifying this exact rendering of the page.
+    """
+    parts = [report_id, page_name, export_format.upper(), report_modified or "", dataset_refreshed or ""]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ExportCache:
+    """
+    Stores exported files by content hash with an SQLite index of cache keys, evicting least recently used entries.
+
+    Blobs are written to a temporary file and moved into place with `os.replace`, so readers never
+    observe a partially written export. Identical exports under different keys share one blob.
+
+    Attributes:
+        cache_dir (str): Directory holding the index database and the blobs.
+        max_bytes (int): Total blob size above which least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir="./sandbox/export_cache", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._blob_dir = os.path.join(cache_dir, "blobs")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.commit()
+
+    def get(self, key):
+        """Return the path of the cached blob for `key`, or None on a miss."""
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self._blob_path(row[0])
+            if not os.path.exists(path):
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return path
+
+    def put(self, key, source_path):
+        """Copy the file at `source_path` into the cache under `key` and return the blob path."""
+        digest, size = _file_digest(source_path)
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out, open(source_path, "rb") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+                os.replace(temp_path, blob_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, digest, size, time.time())
+            )
+            self._db.commit()
+            self._evict()
+        return blob_path
+
+    def materialize(self, key, destination):
+        """Place the cached blob for `key` at `destination`, hard-linking when possible. Returns False on a miss."""
+        blob_path = self.get(key)
+        if blob_path is None:
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        temp_path = f"{destination}.part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(blob_path, temp_path)
+        except OSError:
+            shutil.copyfile(blob_path, temp_path)
+        os.replace(temp_path, destination)
+        return True
+
+    def close(self):
+        """Close the index database."""
+        with self._lock:
+            self._db.close()
+
+    def _blob_path(self, digest):
+        return os.path.join(self._blob_dir, digest[:2], digest)
+
+    def _evict(self):
+        """Drop least recently used entries until the distinct blobs fit in `max_bytes`. Caller holds the lock."""
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, digest, size in self._db.execute(
+                "SELECT key, digest, size FROM entries ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            shared = self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            if shared is None:
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                logger.debug("Evicted export blob %s (%d bytes)", digest, size)
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size
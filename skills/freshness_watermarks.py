@@ -0,0 +1,111 @@
+"""
+This module persists dataset freshness watermarks so later checks only report what moved.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataset_freshness import COMPLETED
+
+
+def refresh_id(refresh):
+    """Return a stable identifier for a completed refresh history entry, or None if there is none.
+
+    Entries of refreshes that are still running or failed have no identifier, so they are never
+    recorded as the refresh a dataset's watermarks belong to.
+    """
+    if not refresh or refresh.get("status", COMPLETED) != COMPLETED:
+        return None
+    return refresh.get("requestId") or refresh.get("id") or refresh.get("endTime")
+
+
+class WatermarkStore:
+    """
+    Records the latest value per (dataset, table, column) and the last refresh id seen per dataset.
+
+    Attributes:
+        db_path (str): Path of the SQLite database.
+    """
+
+    def __init__(self, db_path="./sandbox/freshness_watermarks.sqlite"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS datasets ("
+            " dataset_id TEXT PRIMARY KEY, refresh_id TEXT, checked_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " dataset_id TEXT NOT NULL, table_name TEXT NOT NULL, column_name TEXT NOT NULL,"
+            " max_value TEXT, updated_at REAL NOT NULL, PRIMARY KEY (dataset_id, table_name, column_name));"
+        )
+        self._db.commit()
+
+    def last_refresh_id(self, dataset_id):
+        """Return the refresh id recorded by the previous check of `dataset_id`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT refresh_id FROM datasets WHERE dataset_id = ?", (dataset_id,)).fetchone()
+        return row[0] if row else None
+
+    def watermarks(self, dataset_id):
+        """Return the stored watermarks of a dataset as table -> {column: value}."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT table_name, column_name, max_value FROM watermarks WHERE dataset_id = ?", (dataset_id,)
+            ).fetchall()
+        result = {}
+        for table, column, value in rows:
+            result.setdefault(table, {})[column] = json.loads(value)
+        return result
+
+    def record(self, dataset_id, new_refresh_id, latest_dates):
+        """Store a completed check and return only the columns whose latest value changed.
+
+        Args:
+            dataset_id (str): The Power BI dataset ID.
+            new_refresh_id (str): Id of the dataset's latest refresh at the time of the check.
+            latest_dates (dict): Table name -> {column name: latest value}.
+
+        Returns:
+            dict: Table name -> {column name: {"previous": old value, "current": new value}} for
+                every column that is new or moved since the previous check. Columns no longer in
+                `latest_dates`, including every column of a removed table, are reported with
+                "current" None and "removed" True, and their watermarks are deleted.
+        """
+        previous = self.watermarks(dataset_id)
+        now = time.time()
+        diff = {}
+        with self._lock:
+            for table, columns in latest_dates.items():
+                for column, value in columns.items():
+                    old = previous.get(table, {}).get(column)
+                    if table in previous and column in previous[table] and old == value:
+                        continue
+                    diff.setdefault(table, {})[column] = {"previous": old, "current": value}
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO watermarks (dataset_id, table_name, column_name, max_value, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (dataset_id, table, column, json.dumps(value), now)
+                    )
+            for table, columns in previous.items():
+                for column, old in columns.items():
+                    if column in latest_dates.get(table, {}):
+                        continue
+                    diff.setdefault(table, {})[column] = {"previous": old, "current": None, "removed": True}
+                    self._db.execute(
+                        "DELETE FROM watermarks WHERE dataset_id = ? AND table_name = ? AND column_name = ?",
+                        (dataset_id, table, column)
+                    )
+            self._db.execute(
+                "INSERT OR REPLACE INTO datasets (dataset_id, refresh_id, checked_at) VALUES (?, ?, ?)",
+                (dataset_id, new_refresh_id, now)
+            )
+            self._db.commit()
+        return diff
+
+    def close(self):
+        """Close the store database."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,163 @@
+"""
+This module provides the shared HTTP transport used by every skill: pooled keep-alive connections,
+consistent timeouts, Retry-After-aware retries and a per-host circuit breaker.
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit breaker is open."""
+
+
+class TransportRetry(Retry):
+    """
+    Retry policy that honours Retry-After and also retries non-idempotent requests on a 429 carrying
+    Retry-After, which the service rejected without processing. A 503 may come from a request that
+    was partially processed, so non-idempotent requests are not retried on it.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() not in (self.allowed_methods or ()):
+            return status_code == 429 and has_retry_after and (self.total is None or self.total > 0)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    After `failure_threshold` consecutive failures (connection errors, timeouts or 5xx responses
+    left after retries) a host is short-circuited for `reset_timeout` seconds. The first request
+    after that window is let through as a trial: success closes the circuit, failure reopens it.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a trial request.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._trial_in_flight = set()
+        self._lock = threading.Lock()
+
+    def before_request(self, host):
+        """Raise CircuitOpenError if requests to `host` are currently short-circuited."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return
+            if time.monotonic() - opened_at < self.reset_timeout or host in self._trial_in_flight:
+                raise CircuitOpenError(f"Circuit open for {host}; not sending request")
+            self._trial_in_flight.add(host)
+
+    def release_trial(self, host):
+        """End a trial request for `host` that recorded neither success nor failure.
+
+        The circuit stays open, so the next request after the reset timeout becomes the new trial.
+        """
+        with self._lock:
+            self._trial_in_flight.discard(host)
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial_in_flight.discard(host)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._trial_in_flight.discard(host)
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold or host in self._opened_at:
+                if host not in self._opened_at:
+                    logger.warning("Opening circuit for %s after %d consecutive failures", host, failures)
+                self._opened_at[host] = time.monotonic()
+
+
+class PooledSession(requests.Session):
+    """
+    A requests.Session that applies a default timeout and consults a per-host circuit breaker.
+
+    Attributes:
+        default_timeout (tuple): (connect, read) timeout used when a call does not pass one.
+        breaker (CircuitBreaker): Circuit breaker shared by all requests of this session.
+    """
+
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, breaker=None):
+        super().__init__()
+        self.default_timeout = default_timeout
+        self.breaker = breaker or CircuitBreaker()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        host = urlsplit(url).netloc
+        self.breaker.before_request(host)
+        try:
+            response = super().request(method, url, **kwargs)
+            if response.status_code >= 500:
+                self.breaker.record_failure(host)
+            else:
+                self.breaker.record_success(host)
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.breaker.record_failure(host)
+            raise
+        finally:
+            # Any other error (SSL, decoding, a hook) must not leave the host's trial in flight forever.
+            self.breaker.release_trial(host)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(total=3, status_forcelist=DEFAULT_STATUS_FORCELIST, backoff_factor=0.5,
+                pool_connections=32, pool_maxsize=32):
+    """Return the process-wide pooled session for this retry configuration, creating it on first use.
+
+    Connections are kept alive and pooled per host, so repeated calls to the same service reuse
+    established TLS connections.
+
+    Args:
+        total (int): Maximum retries per request.
+        status_forcelist (tuple): HTTP statuses that trigger a retry.
+        backoff_factor (float): Exponential backoff factor between retries without Retry-After.
+        pool_connections (int): Number of per-host connection pools to keep.
+        pool_maxsize (int): Maximum connections kept per host.
+
+    Returns:
+        PooledSession: The shared session.
+    """
+    key = (total, tuple(status_forcelist), backoff_factor, pool_connections, pool_maxsize)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            retry = TransportRetry(
+                total=total,
+                status_forcelist=status_forcelist,
+                backoff_factor=backoff_factor,
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session = PooledSession()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[key] = session
+        return session
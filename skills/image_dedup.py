@@ -0,0 +1,169 @@
+"""
+This module provides a perceptual-hash index that lets near-identical report pages reuse earlier vision analyses.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_HASH_SIZE = 8
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0, :] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def perceptual_hash(image_path):
+    """Compute the 64-bit DCT perceptual hash (pHash) of an image.
+
+    Args:
+        image_path (str): Path to the image file.
+
+    Returns:
+        int: Unsigned 64-bit hash; visually similar images differ in few bits.
+    """
+    with Image.open(image_path) as img:
+        pixels = np.asarray(img.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    # The DC term only encodes overall brightness, so it is left out of the median.
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming_distances(hashes, target):
+    """Return the Hamming distance between every hash in the uint64 array `hashes` and `target`."""
+    diff = np.bitwise_xor(hashes, np.uint64(target))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(diff)
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def question_key(question):
+    """Normalise a question so that trivially different phrasings of the same text share answers."""
+    return hashlib.sha256(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class PageDedupIndex:
+    """
+    Persists page hashes and their analyses in SQLite and serves near-duplicate lookups from memory.
+
+    Lookups compare the page hash against every stored hash with one vectorised XOR and popcount,
+    which stays well under a millisecond for tens of thousands of pages.
+
+    Attributes:
+        index_dir (str): Directory holding the index database.
+        threshold (int): Maximum Hamming distance at which two pages count as the same.
+    """
+
+    def __init__(self, index_dir="./sandbox/page_dedup", threshold=4):
+        self.index_dir = index_dir
+        self.threshold = threshold
+        os.makedirs(index_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(index_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " phash INTEGER NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL,"
+            " image_file TEXT, created REAL NOT NULL, PRIMARY KEY (phash, question))"
+        )
+        self._db.commit()
+        self._questions = {}
+        for phash, question in self._db.execute("SELECT phash, question FROM answers"):
+            self._questions.setdefault(question, []).append(phash & 0xFFFFFFFFFFFFFFFF)
+        self._arrays = {q: np.array(h, dtype=np.uint64) for q, h in self._questions.items()}
+        self._stats = {"lookups": Counter(), "hits": Counter()}
+        self._labels = {}
+
+    def lookup(self, image_path, question, image_hash=None):
+        """Return a stored answer for a page within `threshold` bits of this one, or None.
+
+        Args:
+            image_path (str): Path to the exported page image.
+            question (str): Question that will be asked about the page.
+            image_hash (int): Precomputed perceptual hash, to avoid hashing the image twice.
+
+        Returns:
+            dict: The reused answer and its hash distance, or None on a miss.
+        """
+        image_hash = perceptual_hash(image_path) if image_hash is None else image_hash
+        key = question_key(question)
+        with self._lock:
+            self._stats["lookups"][key] += 1
+            self._labels[key] = question
+            hashes = self._arrays.get(key)
+            if hashes is None or not len(hashes):
+                return None
+            distances = hamming_distances(hashes, image_hash)
+            best = int(np.argmin(distances))
+            if distances[best] > self.threshold:
+                return None
+            self._stats["hits"][key] += 1
+            matched = int(hashes[best])
+            row = self._db.execute(
+                "SELECT answer, image_file FROM answers WHERE phash = ? AND question = ?",
+                (_to_signed(matched), key)
+            ).fetchone()
+        logger.info("Reusing analysis of %s for %s (distance %d)", row[1], image_path, distances[best])
+        return {"answer": row[0], "distance": int(distances[best]), "source_image": row[1]}
+
+    def record(self, image_path, question, answer, image_hash=None):
+        """Store the answer given for this page and question so similar pages can reuse it."""
+        image_hash = perceptual_hash(image_path) if image_hash is None else image_hash
+        key = question_key(question)
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT 1 FROM answers WHERE phash = ? AND question = ?", (_to_signed(image_hash), key)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (phash, question, answer, image_file, created) VALUES (?, ?, ?, ?, ?)",
+                (_to_signed(image_hash), key, answer, image_path, time.time())
+            )
+            self._db.commit()
+            if existing is None:
+                self._questions.setdefault(key, []).append(image_hash)
+                self._arrays[key] = np.array(self._questions[key], dtype=np.uint64)
+
+    def stats(self):
+        """Return overall and per-question lookup counts and hit rates."""
+        with self._lock:
+            lookups = sum(self._stats["lookups"].values())
+            hits = sum(self._stats["hits"].values())
+            per_question = {
+                self._labels.get(key, key): {
+                    "lookups": count,
+                    "hits": self._stats["hits"][key],
+                    "hit_rate": self._stats["hits"][key] / count
+                }
+                for key, count in self._stats["lookups"].items()
+            }
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "questions": per_question
+        }
+
+    def close(self):
+        """Close the index database."""
+        with self._lock:
+            self._db.close()
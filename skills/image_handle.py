@@ -0,0 +1,166 @@
+"""
+This module provides ImageHandle, a shared, memory-mapped view of an image file that is base64-encoded at most once.
+"""
+
+import base64
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Encode in multiples of 3 bytes so that concatenated chunks form one valid base64 string.
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"\xff\xd8\xff", "jpeg", "image/jpeg"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+    (b"%PDF", "pdf", "application/pdf"),
+)
+
+
+class ImageHandle:
+    """
+    A read-only handle on an image file backed by a memory map.
+
+    The file is mapped rather than read into a `bytes` object, and its base64 form is produced in
+    chunks and memoized, so every skill that needs the image shares one mapping and one encoding.
+    Use `ImageHandle.for_path` to obtain the process-wide handle for a file.
+
+    Attributes:
+        path (str): Absolute path of the image file.
+        size (int): File size in bytes.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        self._mmap = None
+        self._base64 = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path):
+        """Return the memoized handle for `path`, creating a new one if the file changed on disk."""
+        return _registry.get(path)
+
+    @property
+    def format(self):
+        """The detected image format (png, jpeg, gif or pdf), or None if unrecognised."""
+        return _sniff(self.buffer()[:8])[0]
+
+    @property
+    def mime_type(self):
+        """The detected MIME type, defaulting to application/octet-stream."""
+        return _sniff(self.buffer()[:8])[1]
+
+    def buffer(self):
+        """Return a zero-copy memoryview over the file contents."""
+        with self._lock:
+            if self._mmap is None:
+                if self.size == 0:
+                    return memoryview(b"")
+                with open(self.path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self._mmap)
+
+    def iter_base64(self, chunk_size=BASE64_CHUNK_SIZE):
+        """Yield the base64 encoding of the file as a sequence of ASCII strings, without materialising it."""
+        if self._base64 is not None:
+            yield self._base64
+            return
+        view = self.buffer()
+        chunk_size -= chunk_size % 3
+        for offset in range(0, len(view), chunk_size):
+            yield base64.b64encode(view[offset:offset + chunk_size]).decode("ascii")
+
+    def base64(self):
+        """Return the base64 encoding of the file as a string, encoding it on first use only."""
+        encoded = self._base64
+        if encoded is None:
+            with span("image.encode") as encode_span:
+                encoded = "".join(self.iter_base64())
+                encode_span.record_bytes(len(encoded))
+            with self._lock:
+                first = self._base64 is None
+                if first:
+                    self._base64 = encoded
+            if first:
+                _registry.account(self)
+        return encoded
+
+    def data_url(self):
+        """Return the image as a `data:` URL suitable for vision API requests."""
+        return f"data:{self.mime_type};base64,{self.base64()}"
+
+    def release(self):
+        """Drop the memoized encoding and unmap the file."""
+        with self._lock:
+            self._base64 = None
+            if self._mmap is not None:
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    # A caller still holds a view; the mapping is closed when it is collected.
+                    pass
+                self._mmap = None
+
+
+class _HandleRegistry:
+    """Least recently used set of handles whose memoized encodings stay within a byte budget."""
+
+    def __init__(self, max_encoded_bytes=512 * 1024 * 1024):
+        self.max_encoded_bytes = max_encoded_bytes
+        self._handles = OrderedDict()
+        self._encoded_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.version == (stat.st_mtime_ns, stat.st_size):
+                self._handles.move_to_end(key)
+                return handle
+            if handle is not None:
+                self._drop(key)
+            handle = ImageHandle(key)
+            self._handles[key] = handle
+            return handle
+
+    def account(self, handle):
+        with self._lock:
+            if self._handles.get(handle.path) is not handle:
+                return
+            self._encoded_bytes += len(handle._base64 or "")
+            while self._encoded_bytes > self.max_encoded_bytes and len(self._handles) > 1:
+                oldest = next(iter(self._handles))
+                if self._handles[oldest] is handle:
+                    break
+                self._drop(oldest)
+
+    def _drop(self, key):
+        handle = self._handles.pop(key)
+        if handle._base64 is not None:
+            self._encoded_bytes -= len(handle._base64)
+        logger.debug("Released image handle %s", key)
+        handle.release()
+
+
+_registry = _HandleRegistry()
+
+
+def _sniff(header):
+    header = bytes(header)
+    for signature, image_format, mime_type in _SIGNATURES:
+        if header.startswith(signature):
+            return image_format, mime_type
+    return None, "application/octet-stream"
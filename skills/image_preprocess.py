@@ -0,0 +1,173 @@
+"""
+This module prepares report page images for the vision model: downscaling, re-encoding, tiling and token estimates.
+"""
+
+import hashlib
+import io
+import logging
+import math
+import os
+from PIL import Image
+from telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+# GPT-4 Vision fits high-detail images in a 2048px square, scales the short side to 768px and
+# charges 170 tokens per 512px tile plus a fixed 85; low detail is a flat 85 tokens.
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+TILE_SIZE = 512
+TOKENS_PER_TILE = 170
+BASE_TOKENS = 85
+
+
+def effective_size(width, height):
+    """Return the resolution the vision model actually analyses for an image of this size."""
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, MAX_SHORT_SIDE / min(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def estimate_image_tokens(width, height, detail="high"):
+    """Estimate the prompt tokens charged for one image.
+
+    Args:
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        detail (str): Requested detail level, "high" or "low".
+
+    Returns:
+        int: Estimated prompt tokens.
+    """
+    if detail == "low":
+        return BASE_TOKENS
+    width, height = effective_size(width, height)
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return BASE_TOKENS + TOKENS_PER_TILE * tiles
+
+
+def tile_boxes(width, height, max_aspect=2.0, overlap=0.1, min_new_area=0.25):
+    """Split a wide or tall page into overlapping boxes no more elongated than `max_aspect`.
+
+    A page only slightly over `max_aspect` is not split: a second tile that adds less than
+    `min_new_area` of a tile's area in new coverage would double the vision cost for little gain.
+
+    Returns:
+        list: (left, top, right, bottom) boxes, a single full-page box if no split is needed.
+    """
+    long_side, short_side = max(width, height), min(width, height)
+    tile_length = int(short_side * max_aspect)
+    if long_side - tile_length < tile_length * min_new_area:
+        return [(0, 0, width, height)]
+    step = int(tile_length * (1 - overlap))
+    count = math.ceil((long_side - tile_length) / step) + 1
+    # Spread the tiles evenly so the last one ends exactly on the page edge.
+    step = (long_side - tile_length) / (count - 1)
+    starts = [int(round(i * step)) for i in range(count)]
+    if width >= height:
+        return [(start, 0, start + tile_length, height) for start in starts]
+    return [(0, start, width, start + tile_length) for start in starts]
+
+
+def encode_optimal(img, max_bytes=None, jpeg_qualities=(90, 80, 70)):
+    """Encode `img` as both PNG and JPEG and return (format, bytes) for the smallest acceptable result."""
+    candidates = []
+    png = io.BytesIO()
+    img.save(png, format="PNG")
+    candidates.append(("png", png.getvalue()))
+    rgb = img.convert("RGB") if img.mode != "RGB" else img
+    for quality in jpeg_qualities:
+        jpeg = io.BytesIO()
+        rgb.save(jpeg, format="JPEG", quality=quality, optimize=True)
+        candidates.append(("jpeg", jpeg.getvalue()))
+        # Flat dashboards usually compress best as PNG; only fall to lower JPEG quality when needed.
+        if max_bytes is None or len(jpeg.getvalue()) <= max_bytes:
+            break
+    fitting = [c for c in candidates if max_bytes is None or len(c[1]) <= max_bytes]
+    return min(fitting or candidates, key=lambda c: len(c[1]))
+
+
+@traced("image.prepare")
+def prepare_for_vision(image_path, output_dir="./sandbox/prepared", max_bytes=5 * 1024 * 1024,
+                       max_aspect=2.0, overlap=0.1, tile=True, min_new_area=0.25):
+    """Downscale, re-encode and optionally tile an image for the vision model.
+
+    Results are written under `output_dir` with names derived from the source file's path, size
+    and modification time, so preparing the same unchanged file twice reuses the earlier output.
+
+    Args:
+        image_path (str): Path to the source image.
+        output_dir (str): Directory for the prepared images.
+        max_bytes (int): Upper bound for each prepared file.
+        max_aspect (float): Pages more elongated than this are split into tiles.
+        overlap (float): Fraction of each tile shared with its neighbour.
+        tile (bool): Whether very wide or tall pages may be split into tiles.
+        min_new_area (float): Fraction of a tile's area each extra tile must newly cover.
+
+    Returns:
+        dict: source, original size and bytes, and a list of parts with path, box, size,
+            bytes and estimated_tokens; `estimated_tokens` sums over the parts.
+    """
+    stat = os.stat(image_path)
+    fingerprint = hashlib.sha256(
+        f"{os.path.abspath(image_path)}|{stat.st_size}|{stat.st_mtime_ns}|{max_bytes}|{max_aspect}|{overlap}|{tile}"
+        f"|{min_new_area}".encode()
+    ).hexdigest()[:16]
+    os.makedirs(output_dir, exist_ok=True)
+
+    with Image.open(image_path) as img:
+        # Only the header is read until a part actually has to be rendered.
+        width, height = img.size
+        boxes = tile_boxes(width, height, max_aspect, overlap, min_new_area) if tile else [(0, 0, width, height)]
+        parts = []
+        for index, box in enumerate(boxes):
+            target = effective_size(box[2] - box[0], box[3] - box[1])
+            existing = [os.path.join(output_dir, f"{fingerprint}_{index}.{ext}") for ext in ("png", "jpeg")]
+            path = next((p for p in existing if os.path.exists(p)), None)
+            if path is None:
+                part_img = img.crop(box) if len(boxes) > 1 else img
+                if target != part_img.size:
+                    part_img = part_img.resize(target, Image.LANCZOS)
+                image_format, data = encode_optimal(part_img, max_bytes)
+                path = os.path.join(output_dir, f"{fingerprint}_{index}.{image_format}")
+                temp_path = f"{path}.part"
+                with open(temp_path, "wb") as out:
+                    out.write(data)
+                os.replace(temp_path, path)
+            parts.append({
+                "path": path,
+                "box": box,
+                "size": target,
+                "bytes": os.path.getsize(path),
+                "estimated_tokens": estimate_image_tokens(*target)
+            })
+
+    prepared = {
+        "source": image_path,
+        "original_size": (width, height),
+        "original_bytes": stat.st_size,
+        "parts": parts,
+        "estimated_tokens": sum(p["estimated_tokens"] for p in parts)
+    }
+    logger.info("Prepared %s: %dx%d, %d bytes -> %d part(s), %d bytes, ~%d tokens",
+                image_path, width, height, stat.st_size, len(parts),
+                sum(p["bytes"] for p in parts), prepared["estimated_tokens"])
+    return prepared
+
+
+def stitch_answers(prepared, answers):
+    """Combine per-tile answers into one answer that names the region each part covers."""
+    if len(answers) == 1:
+        return answers[0]
+    width, _ = prepared["original_size"]
+    sections = []
+    for index, (part, answer) in enumerate(zip(prepared["parts"], answers), 1):
+        left, top, right, bottom = part["box"]
+        if right - left < width:
+            region = f"{100 * left // width}%-{100 * right // width}% from the left"
+        else:
+            height = prepared["original_size"][1]
+            region = f"{100 * top // height}%-{100 * bottom // height}% from the top"
+        sections.append(f"Part {index} of {len(answers)} ({region}): {answer}")
+    return "\n\n".join(sections)
@@ -0,0 +1,393 @@
+"""
+This module scores the visual quality of exported report pages locally with NumPy.
+
+Every metric is computed over the whole page at once: the page is split into square blocks
+and per-block statistics come from reshaped arrays rather than Python loops, so a 1280x720
+page scores in milliseconds. The result names the criteria a page fails and the vision
+questions worth asking about them, so only those pages and questions go to GPT-4 Vision.
+
+Usage:
+    python image_quality.py page.png [page2.png ...] [--workers N] [--output report.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from image_preprocess import effective_size
+
+# sRGB channel value -> weighted linear light, per WCAG 2.x relative luminance; one table per channel.
+_CHANNEL = np.arange(256, dtype=np.float64) / 255
+_LINEAR = np.where(_CHANNEL <= 0.04045, _CHANNEL / 12.92, ((_CHANNEL + 0.055) / 1.055) ** 2.4)
+_LUMINANCE_TABLES = [(_LINEAR * weight).astype(np.float32) for weight in (0.2126, 0.7152, 0.0722)]
+
+WCAG_AA_TEXT = 4.5
+WCAG_AA_GRAPHICS = 3.0
+
+# Targeted follow-up questions for the vision model, per failed criterion.
+CRITERIA_QUESTIONS = {
+    "contrast": "Which text, labels or data marks have too little contrast against their background, and what colours would fix them?",
+    "whitespace": "Is the page too crowded or too empty, and how should the visuals be spaced or resized?",
+    "balance": "Which part of the page is visually overloaded, and how could the visuals be rebalanced?",
+    "palette": "Are there too many distinct colours on the page, and which could be consolidated into a consistent palette?",
+    "alignment": "Which visuals are slightly misaligned with each other, and how should they snap to a common grid?",
+    "text_resolution": "Which text is too small or blurry to read, and what font sizes should be used instead?"
+}
+
+
+def relative_luminance(rgb):
+    """Return the WCAG relative luminance (0-1) of every pixel of an (..., 3) uint8 array."""
+    # Table lookups are much faster on contiguous channel planes than on interleaved pixels.
+    return _luminance_of_planes(np.moveaxis(rgb, -1, 0).copy())
+
+
+def contrast_ratio(luminance_a, luminance_b):
+    """Return the WCAG contrast ratio (1-21) of two luminances or arrays of luminances."""
+    lighter = np.maximum(luminance_a, luminance_b)
+    darker = np.minimum(luminance_a, luminance_b)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def to_blocks(array, block):
+    """View an (H, W) array as (H // block, W // block, block * block), dropping the ragged edges."""
+    rows, cols = array.shape[0] // block, array.shape[1] // block
+    trimmed = array[:rows * block, :cols * block]
+    return trimmed.reshape(rows, block, cols, block).swapaxes(1, 2).reshape(rows, cols, block * block)
+
+
+def color_counts(planes):
+    """Count pixels per colour at 5 bits per channel, from every other pixel in each direction.
+
+    Args:
+        planes (ndarray): (3, H, W) uint8 channel planes.
+
+    Returns:
+        ndarray: 32768 counts indexed by (r >> 3) << 10 | (g >> 3) << 5 | b >> 3.
+    """
+    sample = planes[:, ::2, ::2] >> 3
+    codes = (sample[0].astype(np.int32) << 10) | (sample[1].astype(np.int32) << 5) | sample[2]
+    return np.bincount(codes.ravel(), minlength=1 << 15)
+
+
+def page_background(planes):
+    """Return the page background, the most frequent colour, as an int16 RGB array."""
+    return _decode_color(int(color_counts(planes).argmax()))
+
+
+def content_mask(planes, background, threshold=24):
+    """Return the (H, W) mask of pixels where any channel differs from `background` by more than `threshold`."""
+    ink = np.zeros(planes.shape[1:], dtype=bool)
+    for plane, level in zip(planes, background):
+        if level - threshold > 0:
+            ink |= plane < level - threshold
+        if level + threshold < 255:
+            ink |= plane > level + threshold
+    return ink
+
+
+def vertical_runs(mask):
+    """Return (column, start_row, length) arrays of every vertical run of True in a 2-D mask."""
+    # Coordinates of the transposed mask come out sorted by column, then row.
+    columns, rows = np.nonzero(np.ascontiguousarray(mask.T))
+    starts = np.ones(columns.size, dtype=bool)
+    starts[1:] = (columns[1:] != columns[:-1]) | (rows[1:] != rows[:-1] + 1)
+    lengths = np.bincount(np.cumsum(starts) - 1) if columns.size else np.zeros(0, dtype=np.int64)
+    return columns[starts], rows[starts], lengths
+
+
+class ImageQualityScorer:
+    """
+    Computes contrast, whitespace, density balance, palette, alignment and text resolution metrics
+    of a report page and combines them into a 0-100 score.
+
+    Attributes:
+        block (int): Side in pixels of the blocks the page is analysed in.
+        ink_threshold (int): Channel difference from the page background above which a pixel is content.
+        palette_min_share (float): Share of the page a colour must cover to count towards the palette;
+            anti-aliasing shades fall below it.
+        alignment_tolerance (int): Edges this many pixels apart or fewer count as a near miss of a shared grid line.
+        min_edge_fraction (float): Minimum length of a visual's edge, as a fraction of the page side.
+        min_text_px (float): Minimum height in pixels of a line of text, at the resolution the vision
+            model sees, for it to be legible.
+        min_sharpness (float): Minimum share of a text block's contrast crossed in a single pixel step.
+        pass_score (int): Criteria scoring below this are reported as issues.
+    """
+
+    def __init__(self, block=16, ink_threshold=24, palette_min_share=0.001, alignment_tolerance=6,
+                 min_edge_fraction=0.05, min_text_px=8.0, min_sharpness=0.45, pass_score=70):
+        self.block = block
+        self.ink_threshold = ink_threshold
+        self.palette_min_share = palette_min_share
+        self.alignment_tolerance = alignment_tolerance
+        self.min_edge_fraction = min_edge_fraction
+        self.min_text_px = min_text_px
+        self.min_sharpness = min_sharpness
+        self.pass_score = pass_score
+
+    def score(self, image, include_maps=False):
+        """Score one page.
+
+        Args:
+            image (str or ndarray or Image): Path to the image, an (H, W, 3) uint8 array or a PIL image.
+            include_maps (bool): Also return the per-block density and contrast maps as nested lists.
+
+        Returns:
+            dict: score (0-100), scores per criterion, metrics per criterion, issues (criteria scoring
+                below `pass_score`), questions for the vision model about those issues, and elapsed_ms.
+        """
+        started = time.perf_counter()
+        rgb = load_rgb(image)
+        height, width = rgb.shape[:2]
+
+        planes = np.moveaxis(rgb, -1, 0).copy()
+        counts = color_counts(planes)
+        background = _decode_color(int(counts.argmax()))
+        ink = content_mask(planes, background, self.ink_threshold)
+        luminance = _luminance_of_planes(planes)
+
+        density = to_blocks(ink, self.block).mean(axis=2)
+        text, text_metrics = self._text_resolution(ink, luminance, density, width, height)
+        metrics = {
+            "page": {"width": width, "height": height, "background": "#%02x%02x%02x" % tuple(background)},
+            "contrast": self._contrast(luminance, density, text),
+            "whitespace": self._whitespace(density),
+            "palette": self._palette(counts, int(counts.sum())),
+            "alignment": self._alignment(ink),
+            "text_resolution": text_metrics
+        }
+        metrics["balance"] = metrics["whitespace"].pop("balance")
+
+        scores = {
+            "contrast": _clip(100 * (1 - metrics["contrast"]["text_below_aa"] - 0.5 * metrics["contrast"]["graphics_below_aa"])),
+            "whitespace": _clip(100 - 250 * max(0.25 - metrics["whitespace"]["ratio"],
+                                                metrics["whitespace"]["ratio"] - 0.65, 0)),
+            # Some imbalance is normal (e.g. KPI cards above a large chart); beyond 0.25 it costs points.
+            "balance": _clip(100 * (1 - max(metrics["balance"]["imbalance"] - 0.25, 0) / 0.6)),
+            "palette": _clip(100 - 5 * max(metrics["palette"]["size"] - 10, 0)),
+            "alignment": _clip(100 * metrics["alignment"]["aligned_ratio"]),
+            "text_resolution": _clip(100 * (1 - metrics["text_resolution"]["low_res_ratio"]))
+        }
+        issues = [name for name, value in scores.items() if value < self.pass_score]
+        maps = metrics["contrast"].pop("map")
+        result = {
+            "score": round(float(np.mean(list(scores.values()))), 1),
+            "scores": {name: round(value, 1) for name, value in scores.items()},
+            "metrics": metrics,
+            "issues": issues,
+            "questions": [CRITERIA_QUESTIONS[name] for name in issues]
+        }
+        if include_maps:
+            result["maps"] = {"density": np.round(density, 3).tolist(), "contrast": np.round(maps, 2).tolist()}
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def sweep(self, paths, workers=None):
+        """Score many pages concurrently and return path -> result (or {"error": ...})."""
+        def score_one(path):
+            try:
+                return self.score(path)
+            except (OSError, ValueError) as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+
+        # NumPy releases the GIL in the heavy array operations, so threads scale across cores.
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            return dict(zip(paths, executor.map(score_one, paths)))
+
+    def _contrast(self, luminance, density, text):
+        """Contrast of each block's foreground against its background.
+
+        Text blocks are held to the WCAG AA text ratio (4.5:1) and other blocks with solid content
+        (bars, markers, icons) to the non-text ratio (3:1). Thin decorative lines and blocks fully
+        covered by a fill are not assessed.
+        """
+        size = self.block * self.block
+        ranks = [int(size * 0.02), size // 2, int(size * 0.98)]
+        low, median, high = np.moveaxis(np.partition(to_blocks(luminance, self.block), ranks, axis=2)[..., ranks], 2, 0)
+        foreground = np.where(np.abs(high - median) >= np.abs(low - median), high, low)
+        ratios = contrast_ratio(foreground, median)
+        distinct = np.abs(foreground - median) > 1e-3
+        text = text & distinct
+        graphics = ~text & distinct & (density >= 0.1) & (density < 0.9)
+        text_ratios, graphic_ratios = ratios[text], ratios[graphics]
+        failing = (text & (ratios < WCAG_AA_TEXT)) | (graphics & (ratios < WCAG_AA_GRAPHICS))
+        rows, cols = np.nonzero(failing)
+        worst = np.argsort(ratios[rows, cols])[:10]
+        return {
+            "text_blocks": int(text_ratios.size),
+            "graphic_blocks": int(graphic_ratios.size),
+            "min_text_ratio": round(float(text_ratios.min()), 2) if text_ratios.size else None,
+            "p10_text_ratio": round(float(np.percentile(text_ratios, 10)), 2) if text_ratios.size else None,
+            "text_below_aa": round(float((text_ratios < WCAG_AA_TEXT).mean()), 4) if text_ratios.size else 0.0,
+            "graphics_below_aa": round(float((graphic_ratios < WCAG_AA_GRAPHICS).mean()), 4) if graphic_ratios.size else 0.0,
+            "worst_regions": [
+                {"box": [int(cols[i]) * self.block, int(rows[i]) * self.block, self.block, self.block],
+                 "ratio": round(float(ratios[rows[i], cols[i]]), 2), "text": bool(text[rows[i], cols[i]])}
+                for i in worst
+            ],
+            "map": np.where(text | graphics, ratios, 0.0)
+        }
+
+    def _whitespace(self, density):
+        """Share of empty blocks, plus how evenly content is spread between the page halves."""
+        rows, cols = density.shape
+        left, right = density[:, :cols // 2].sum(), density[:, cols - cols // 2:].sum()
+        top, bottom = density[:rows // 2].sum(), density[rows - rows // 2:].sum()
+        horizontal = abs(left - right) / (left + right) if left + right else 0.0
+        # Pages are read top-down and often open with a light row of cards, so a denser top or
+        # bottom half weighs half as much as a lopsided left or right.
+        vertical = 0.5 * abs(top - bottom) / (top + bottom) if top + bottom else 0.0
+        return {
+            "ratio": round(float((density < 0.02).mean()), 4),
+            "mean_density": round(float(density.mean()), 4),
+            "max_density": round(float(density.max()), 4) if density.size else 0.0,
+            "balance": {
+                "horizontal": round(float(horizontal), 4),
+                "vertical": round(float(vertical), 4),
+                "imbalance": round(float(max(horizontal, vertical)), 4)
+            }
+        }
+
+    def _palette(self, counts, pixels):
+        """Number of distinct colours (at 5 bits per channel) covering a meaningful share of the page."""
+        significant = np.nonzero(counts >= max(self.palette_min_share * pixels, 1))[0]
+        ordered = significant[np.argsort(-counts[significant])]
+        return {
+            "size": int(ordered.size),
+            "colors": ["#%02x%02x%02x" % tuple(_decode_color(int(code))) for code in ordered[:16]]
+        }
+
+    def _alignment(self, ink):
+        """Near misses between the left edges and between the top edges of the page's visuals."""
+        height, width = ink.shape
+        axes = {}
+        for axis, mask, length in (("left", ink, height), ("top", ink.T, width)):
+            # Columns where content starts (background -> content), kept where the edge runs long
+            # enough to be the side of a visual rather than a glyph.
+            rising = mask[:, 1:] & ~mask[:, :-1]
+            columns, _, runs = vertical_runs(rising)
+            edges = np.unique(columns[runs >= max(self.min_edge_fraction * length, 8)]) + 1
+            gaps = np.diff(edges)
+            near_misses = gaps[(gaps > 0) & (gaps <= self.alignment_tolerance)]
+            axes[axis] = {
+                "edges": int(edges.size),
+                "near_misses": int(near_misses.size),
+                "mean_deviation_px": round(float(near_misses.mean()), 2) if near_misses.size else 0.0
+            }
+        edges = sum(a["edges"] for a in axes.values())
+        misses = sum(a["near_misses"] for a in axes.values())
+        return dict(axes, aligned_ratio=round(1 - misses / edges, 4) if edges else 1.0)
+
+    def _text_resolution(self, ink, luminance, density, width, height):
+        """Find text-like blocks whose lines are too short or too blurred at the model's resolution.
+
+        Returns:
+            tuple: The (rows, cols) mask of text blocks and the text resolution metrics.
+        """
+        rows, cols = density.shape
+        # Text blocks have partial coverage and many content/background transitions both along rows
+        # and along columns; straight lines and bar edges only have transitions in one direction.
+        across = np.zeros_like(ink)
+        across[:, 1:] = ink[:, 1:] != ink[:, :-1]
+        down = np.zeros_like(ink)
+        down[1:] = ink[1:] != ink[:-1]
+        text = ((density > 0.03) & (density < 0.6) & (to_blocks(across, self.block).mean(axis=2) > 0.04)
+                & (to_blocks(down, self.block).mean(axis=2) > 0.04))
+
+        # Sharpness: the largest one-pixel luminance step relative to the block's luminance range.
+        steps = np.zeros_like(luminance)
+        steps[:, 1:] = np.abs(np.diff(luminance, axis=1))
+        blocks_lum = to_blocks(luminance, self.block)
+        spread = blocks_lum.max(axis=2) - blocks_lum.min(axis=2)
+        sharpness = np.divide(to_blocks(steps, self.block).max(axis=2), spread,
+                              out=np.zeros_like(spread), where=spread > 1e-3)
+
+        # Line height: runs of consecutive rows with content within each block-wide column strip,
+        # after removing long vertical strokes (borders, axes, bars) that would join the lines.
+        line_columns, line_starts, line_lengths = vertical_runs(ink)
+        long = line_lengths > 4 * self.block
+        glyphs = ink.copy()
+        glyphs[_fill_runs(line_columns[long], line_starts[long], line_lengths[long])] = False
+        strips = glyphs[:, :cols * self.block].reshape(ink.shape[0], cols, self.block).any(axis=2)
+        strip_cols, starts, lengths = vertical_runs(strips)
+        line_height = np.zeros(strips.shape, dtype=np.int32)
+        line_height[_fill_runs(strip_cols, starts, lengths)] = np.repeat(lengths, lengths)
+        block_height = line_height[:rows * self.block].reshape(rows, self.block, cols).max(axis=1)
+        scale = effective_size(width, height)[0] / width
+
+        low_res = text & ((block_height * scale < self.min_text_px) | (sharpness < self.min_sharpness))
+        text_blocks = int(text.sum())
+        return text, {
+            "text_blocks": text_blocks,
+            "low_res_blocks": int(low_res.sum()),
+            "low_res_ratio": round(float(low_res.sum() / text_blocks), 4) if text_blocks else 0.0,
+            "model_scale": round(scale, 3),
+            "median_line_px": round(float(np.median(block_height[text]) * scale), 1) if text_blocks else None,
+            "median_sharpness": round(float(np.median(sharpness[text])), 3) if text_blocks else None
+        }
+
+
+def load_rgb(image):
+    """Return an (H, W, 3) uint8 array from a path, a PIL image or an array."""
+    if isinstance(image, np.ndarray):
+        if image.ndim != 3 or image.shape[2] < 3:
+            raise ValueError(f"Expected an (H, W, 3) array, got shape {image.shape}")
+        return np.ascontiguousarray(image[..., :3], dtype=np.uint8)
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("RGB"))
+    with Image.open(image) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def _luminance_of_planes(planes):
+    red, green, blue = _LUMINANCE_TABLES
+    luminance = np.take(red, planes[0])
+    luminance += np.take(green, planes[1])
+    luminance += np.take(blue, planes[2])
+    return luminance
+
+
+def _fill_runs(columns, starts, lengths):
+    """Return (rows, columns) index arrays covering every pixel of the given vertical runs."""
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets, np.repeat(columns, lengths)
+
+
+def _decode_color(code):
+    return np.array([(code >> 10) & 31, (code >> 5) & 31, code & 31], dtype=np.int16) * 8 + 4
+
+
+def _clip(value):
+    return float(min(max(value, 0.0), 100.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score the visual quality of exported report pages.")
+    parser.add_argument("images", nargs="+", help="Image files or glob patterns, e.g. './sandbox/exports/**/*.png'.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Write the report to this file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    paths = sorted({p for pattern in args.images for p in (glob.glob(pattern, recursive=True) or [pattern])})
+    started = time.perf_counter()
+    results = ImageQualityScorer().sweep(paths, args.workers)
+    report = {
+        "pages": len(paths),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "results": results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
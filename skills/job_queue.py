@@ -0,0 +1,216 @@
+"""
+This module provides a durable SQLite job queue with leases, retries, priorities and a dead-letter state.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+
+class Job:
+    """
+    A leased unit of work: one page run through a chain of skills.
+
+    Attributes:
+        id (int): Job id.
+        payload (dict): The page item (workspace_id, report_id, page_name, ...).
+        chain (list): Skill names to run in order, as written in workflow files.
+        priority (int): Higher runs first.
+        attempts (int): Leases taken so far, including this one.
+        max_attempts (int): Attempts after which a failing job is dead-lettered.
+        lease_token (str): Identifies this lease; completing or failing with a stale token is ignored.
+    """
+
+    def __init__(self, id, payload, chain, priority, attempts, max_attempts, lease_token):
+        self.id = id
+        self.payload = payload
+        self.chain = chain
+        self.priority = priority
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_token = lease_token
+
+    def __repr__(self):
+        return f"Job({self.id}, attempt {self.attempts}/{self.max_attempts}, {self.payload})"
+
+
+class JobQueue:
+    """
+    Job queue shared by worker processes through one SQLite database.
+
+    A worker leases the highest-priority available job for `lease_seconds`; it must complete,
+    fail or extend the lease before it runs out, otherwise the job becomes available to other
+    workers again (a crashed worker loses its jobs only for one lease period). Failed jobs are
+    retried with exponential backoff and moved to the dead-letter state after `max_attempts`.
+
+    The database runs in WAL mode with a busy timeout, and claims are made inside an immediate
+    transaction so two processes never lease the same job. Several nodes can share the queue on
+    a filesystem with working POSIX locks; SQLite must not be used over filesystems without them.
+
+    Attributes:
+        db_path (str): Path of the SQLite database.
+        retry_base_delay (float): Delay before the first retry; doubles with every attempt.
+        retry_max_delay (float): Upper bound on the retry delay.
+    """
+
+    def __init__(self, db_path="./sandbox/jobs.sqlite", retry_base_delay=30.0, retry_max_delay=3600.0):
+        self.db_path = db_path
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, chain TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " max_attempts INTEGER NOT NULL, available_at REAL NOT NULL, lease_owner TEXT, lease_token TEXT,"
+            " lease_expires REAL, last_error TEXT, result TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " dedup_key TEXT UNIQUE);"
+            "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, available_at, id);"
+            "CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (status, lease_expires);"
+        )
+
+    def enqueue(self, payload, chain, priority=0, max_attempts=5, dedup_key=None, delay=0.0):
+        """Add a job and return its id.
+
+        Args:
+            payload (dict): The page item passed to the first skill.
+            chain (list): Skill names to run in order.
+            priority (int): Higher runs first.
+            max_attempts (int): Attempts before the job is dead-lettered.
+            dedup_key (str): If given, a job with the same key is not added twice; its id is returned.
+            delay (float): Seconds before the job becomes available.
+
+        Returns:
+            int: The job id.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (payload, chain, priority, status, max_attempts, available_at,"
+                " created_at, updated_at, dedup_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (json.dumps(payload), json.dumps(chain), priority, QUEUED, max_attempts, now + delay, now, now,
+                 dedup_key)
+            )
+            if cursor.rowcount == 0:
+                return self._db.execute("SELECT id FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()[0]
+            return cursor.lastrowid
+
+    def lease(self, worker_id, lease_seconds=300.0):
+        """Lease the highest-priority available job, or return None if there is none.
+
+        Jobs whose lease expired are reclaimed here: they are leased again, or dead-lettered if
+        they already used all their attempts.
+        """
+        now = time.time()
+        token = f"{worker_id}:{time.monotonic_ns()}"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, last_error = COALESCE(last_error, 'lease expired'), updated_at = ?"
+                    " WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                    (DEAD, now, LEASED, now)
+                )
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?)"
+                    " ORDER BY priority DESC, available_at, id LIMIT 1",
+                    (QUEUED, now, LEASED, now)
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_token = ?,"
+                    " lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (LEASED, worker_id, token, now + lease_seconds, now, row[0])
+                )
+                job = self._db.execute(
+                    "SELECT id, payload, chain, priority, attempts, max_attempts, lease_token FROM jobs WHERE id = ?",
+                    (row[0],)
+                ).fetchone()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return Job(job[0], json.loads(job[1]), json.loads(job[2]), job[3], job[4], job[5], job[6])
+
+    def extend(self, job, lease_seconds=300.0):
+        """Extend a job's lease; returns False if the lease was lost to another worker."""
+        return self._update_leased(job, "lease_expires = ?", (time.time() + lease_seconds,))
+
+    def complete(self, job, result=None):
+        """Mark a job done and store its result; returns False if the lease was lost."""
+        return self._update_leased(job, "status = ?, result = ?, last_error = NULL, lease_expires = NULL",
+                                   (DONE, json.dumps(result, default=str)))
+
+    def fail(self, job, error, retryable=True):
+        """Record a failed attempt.
+
+        The job is made available again after an exponential backoff, or dead-lettered when it is
+        not retryable or has used all its attempts.
+
+        Returns:
+            str: The job's new status, or None if the lease was lost.
+        """
+        if not retryable or job.attempts >= job.max_attempts:
+            updated = self._update_leased(job, "status = ?, last_error = ?, lease_expires = NULL", (DEAD, error))
+            if updated:
+                logger.warning("Job %s dead-lettered after %d attempt(s): %s", job.id, job.attempts, error)
+            return DEAD if updated else None
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (job.attempts - 1))
+        updated = self._update_leased(job, "status = ?, last_error = ?, available_at = ?, lease_expires = NULL",
+                                      (QUEUED, error, time.time() + delay))
+        return QUEUED if updated else None
+
+    def requeue_dead(self, job_ids=None):
+        """Give dead-lettered jobs (all of them, or `job_ids`) a fresh set of attempts; returns the count."""
+        now = time.time()
+        query = "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE status = ?"
+        params = [QUEUED, now, now, DEAD]
+        if job_ids is not None:
+            job_ids = list(job_ids)
+            query += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            params.extend(job_ids)
+        with self._lock:
+            return self._db.execute(query, params).rowcount
+
+    def dead_letters(self, limit=100):
+        """Return (id, payload, chain, attempts, last_error) of dead-lettered jobs."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload, chain, attempts, last_error FROM jobs WHERE status = ? ORDER BY id LIMIT ?",
+                (DEAD, limit)
+            ).fetchall()
+        return [(i, json.loads(p), json.loads(c), a, e) for i, p, c, a, e in rows]
+
+    def stats(self):
+        """Return the number of jobs per status."""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        """Close the queue database."""
+        with self._lock:
+            self._db.close()
+
+    def _update_leased(self, job, assignments, params):
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                (*params, time.time(), job.id, LEASED, job.lease_token)
+            )
+        return cursor.rowcount == 1
@@ -0,0 +1,277 @@
+"""
+This module detects what changed between successive exports of the same report page.
+
+Pages are compared block by block with NumPy. A pixel counts as changed only if it differs from
+the previous export by more than a tolerance and one rendering's colour is also outside the range
+of the other's 3x3 neighbourhood, so anti-aliased edges blended slightly differently or shifted by
+a pixel are ignored, while a changed digit or bar is not. Changed blocks are grouped into
+regions, snapped to the visuals they touch, and summarised as a change score: unchanged pages can
+reuse their previous analysis, and slightly changed pages only need their changed regions analysed.
+
+Usage:
+    python page_changes.py previous.png current.png [--block 16]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import numpy as np
+from image_quality import load_rgb, to_blocks
+from visual_segmentation import VisualIndex, close_runs, component_boxes, label_components, merge_boxes
+
+logger = logging.getLogger(__name__)
+
+# Offsets of the 3x3 neighbourhood a changed pixel is compared with.
+_SHIFTS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+REPLACED = "replaced"
+NEW = "new"
+
+
+def diff_pages(previous, current, block=16, pixel_tolerance=40, min_block_pixels=3, include_mask=False):
+    """Compare two renderings of a page block by block.
+
+    Args:
+        previous (str or ndarray or Image): The earlier rendering.
+        current (str or ndarray or Image): The new rendering.
+        block (int): Side in pixels of the blocks changes are counted in.
+        pixel_tolerance (int): Largest channel difference still treated as the same colour.
+        min_block_pixels (int): Changed pixels a block needs before it counts as changed.
+        include_mask (bool): Also return the per-block change mask as nested lists.
+
+    Returns:
+        dict: size [width, height], change_score (share of blocks changed, 0-1), changed_pixels (share of pixels),
+            regions ([left, top, right, bottom] boxes of the changed areas) and elapsed_ms.
+    """
+    started = time.perf_counter()
+    before, after = load_rgb(previous), load_rgb(current)
+    height, width = after.shape[:2]
+    rows, cols = -(-height // block), -(-width // block)
+    if before.shape != after.shape:
+        # A resized page cannot be compared region by region.
+        return _diff_result((width, height), np.ones((rows, cols), dtype=bool), 1.0, [[0, 0, width, height]], started, include_mask)
+    if np.array_equal(before, after):
+        return _diff_result((width, height), np.zeros((rows, cols), dtype=bool), 0.0, [], started, include_mask)
+
+    delta = np.abs(before.astype(np.int16) - after).max(axis=2)
+    changed = delta > pixel_tolerance
+    candidates = _block_counts(changed, block) >= min_block_pixels
+    # Only pixels in candidate blocks are checked against their neighbours, so a few changed values
+    # on a large page cost little more than the first pass.
+    in_candidates = np.repeat(np.repeat(candidates, block, axis=0), block, axis=1)[:height, :width]
+    ys, xs = np.nonzero(changed & in_candidates)
+    if ys.size:
+        real = ~(_within_neighbourhood(after[ys, xs], before, ys, xs, pixel_tolerance) &
+                 _within_neighbourhood(before[ys, xs], after, ys, xs, pixel_tolerance))
+        changed = np.zeros_like(changed)
+        changed[ys[real], xs[real]] = True
+        blocks = _block_counts(changed, block) >= min_block_pixels
+    else:
+        blocks = candidates
+
+    regions = []
+    if blocks.any():
+        # Changed blocks one block apart belong to the same region.
+        closed = close_runs(close_runs(blocks, 2, axis=1), 2, axis=0)
+        labels, count = label_components(closed)
+        cell_boxes = component_boxes(labels, count) * block
+        regions = [[int(min(left, width)), int(min(top, height)), int(min(right, width)), int(min(bottom, height))]
+                   for top, left, bottom, right in cell_boxes]
+    return _diff_result((width, height), blocks, float(changed.mean()), regions, started, include_mask)
+
+
+def _within_neighbourhood(values, image, ys, xs, tolerance):
+    """Whether each (N, 3) colour lies, per channel, within the range of `image`'s 3x3 neighbourhood at (ys, xs)."""
+    height, width = image.shape[:2]
+    low = np.full(values.shape, 255, dtype=np.int16)
+    high = np.zeros(values.shape, dtype=np.int16)
+    for dy, dx in _SHIFTS:
+        neighbours = image[np.clip(ys + dy, 0, height - 1), np.clip(xs + dx, 0, width - 1)]
+        np.minimum(low, neighbours, out=low)
+        np.maximum(high, neighbours, out=high)
+    return ((values >= low - tolerance) & (values <= high + tolerance)).all(axis=1)
+
+
+def _block_counts(mask, block):
+    height, width = mask.shape
+    padded = np.zeros((-(-height // block) * block, -(-width // block) * block), dtype=bool)
+    padded[:height, :width] = mask
+    return to_blocks(padded, block).sum(axis=2)
+
+
+def _diff_result(size, blocks, changed_pixels, regions, started, include_mask):
+    result = {
+        "size": list(size),
+        "change_score": round(float(blocks.mean()), 4),
+        "changed_pixels": round(changed_pixels, 5),
+        "regions": regions,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+    if include_mask:
+        result["mask"] = blocks.tolist()
+    return result
+
+
+class PageChangeDetector:
+    """
+    Compares new exports of a page with the export its stored analysis was made from.
+
+    The baseline of a page only advances when a full analysis of the page is recorded, so the
+    analysis stored with it always describes the baseline, and changes accumulate against it until
+    they are large enough to warrant a new full analysis.
+
+    Attributes:
+        store_dir (str): Directory holding each page's baseline image and its analysis.
+        block (int): Side in pixels of the blocks changes are counted in.
+        pixel_tolerance (int): Largest channel difference still treated as the same colour.
+        max_partial_score (float): Pages with a larger change score are re-analysed in full.
+        max_regions (int): Pages with more changed regions than this are re-analysed in full.
+        max_region_area (float): Pages whose changed regions cover more than this share of the page
+            are re-analysed in full, since sending the regions would cost about as much.
+        snap_to_visuals (bool): Widen each changed region to the visuals it touches, so a changed
+            value is analysed together with its card or chart.
+    """
+
+    def __init__(self, store_dir="./sandbox/page_baselines", block=16, pixel_tolerance=40,
+                 max_partial_score=0.25, max_regions=6, max_region_area=0.5, snap_to_visuals=True):
+        self.store_dir = store_dir
+        self.block = block
+        self.pixel_tolerance = pixel_tolerance
+        self.max_partial_score = max_partial_score
+        self.max_regions = max_regions
+        self.max_region_area = max_region_area
+        self.snap_to_visuals = snap_to_visuals
+        self._visual_index = VisualIndex()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def compare(self, page_key, image_path):
+        """Compare a new export of a page with its baseline.
+
+        Args:
+            page_key (str): Identifies the page across runs, e.g. "<report_id>/<page_name>".
+            image_path (str): Path of the new export.
+
+        Returns:
+            dict: page_change ("new", "unchanged", "changed" or "replaced"), change_score,
+                changed_regions and, unless the page is new, previous_answer.
+        """
+        entry = self._load(page_key)
+        baseline_path = self._paths(page_key)[0]
+        if entry is None or not os.path.exists(baseline_path):
+            return {"page_change": NEW, "change_score": 1.0, "changed_regions": []}
+
+        change = {"page_change": UNCHANGED, "change_score": 0.0, "changed_regions": [],
+                  "previous_answer": entry["answer"]}
+        if _file_digest(image_path) == entry["digest"]:
+            return change
+
+        diff = diff_pages(baseline_path, image_path, self.block, self.pixel_tolerance)
+        regions = diff["regions"]
+        if regions and self.snap_to_visuals:
+            regions = self._snap(image_path, regions)
+        change.update(change_score=diff["change_score"], changed_regions=regions)
+        width, height = diff["size"]
+        region_area = sum((right - left) * (bottom - top) for left, top, right, bottom in regions) / (width * height)
+        if (diff["change_score"] > self.max_partial_score or len(regions) > self.max_regions
+                or region_area > self.max_region_area):
+            change["page_change"] = REPLACED
+        elif regions:
+            change["page_change"] = CHANGED
+        logger.info("Compared %s with its baseline: %s, score %.3f, %d region(s) in %.0f ms", page_key,
+                    change["page_change"], diff["change_score"], len(regions), diff["elapsed_ms"])
+        return change
+
+    def record(self, page_key, image_path, answer):
+        """Make `image_path` the baseline of the page, described by the full analysis `answer`."""
+        baseline_path, entry_path = self._paths(page_key)
+        temp_path = f"{baseline_path}.part"
+        shutil.copyfile(image_path, temp_path)
+        os.replace(temp_path, baseline_path)
+        entry = {"page_key": page_key, "digest": _file_digest(baseline_path), "answer": answer,
+                 "recorded_at": time.time()}
+        temp_path = f"{entry_path}.part"
+        with open(temp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, entry_path)
+
+    def forget(self, page_key):
+        """Remove the baseline of a page, so its next export is analysed in full."""
+        for path in self._paths(page_key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _snap(self, image_path, regions):
+        visuals = self._visual_index.get(image_path)["visuals"]
+        boxes = np.array(regions, dtype=np.int64)
+        for visual in visuals:
+            left, top, right, bottom = visual["box"]
+            touching = ((boxes[:, 0] < right) & (boxes[:, 2] > left) & (boxes[:, 1] < bottom) & (boxes[:, 3] > top))
+            boxes[touching] = np.column_stack([np.minimum(boxes[touching, 0], left),
+                                               np.minimum(boxes[touching, 1], top),
+                                               np.maximum(boxes[touching, 2], right),
+                                               np.maximum(boxes[touching, 3], bottom)])
+        # Regions widened to the same visual collapse into one.
+        return [[int(v) for v in box] for box in merge_boxes(boxes, 0, 0)]
+
+    def _load(self, page_key):
+        try:
+            with open(self._paths(page_key)[1]) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _paths(self, page_key):
+        name = hashlib.sha256(page_key.encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.store_dir, f"{name}.png"), os.path.join(self.store_dir, f"{name}.json")
+
+
+def change_key(report_id, page_name, question=""):
+    """Identify a report page and the question its baseline analysis answers across runs."""
+    digest = hashlib.sha256(question.encode("utf-8")).hexdigest()[:16]
+    return f"{report_id}/{page_name}#{digest}"
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_change_detector():
+    """Return the process-wide change detector."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = PageChangeDetector()
+        return _detector
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two exports of a report page.")
+    parser.add_argument("previous", help="Earlier export.")
+    parser.add_argument("current", help="New export.")
+    parser.add_argument("--block", type=int, default=16, help="Block side in pixels.")
+    parser.add_argument("--tolerance", type=int, default=40, help="Largest channel difference ignored.")
+    parser.add_argument("--mask", action="store_true", help="Include the per-block change mask.")
+    args = parser.parse_args(argv)
+
+    print(json.dumps(diff_pages(args.previous, args.current, args.block, args.tolerance, include_mask=args.mask)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+This module provides an asyncio engine that exports many Power BI report pages concurrently.
+
+It follows the Power BI ExportTo job lifecycle: submit a job with POST .../ExportTo, poll
+GET .../exports/{exportId} until it succeeds or fails, then stream GET .../exports/{exportId}/file
+to disk. Jobs run concurrently, bounded per capacity and per workspace. With an ExportCache
+attached, pages whose report and dataset have not changed are served from disk without a job;
+pages whose version cannot be determined are always exported.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import requests
+from export_cache import export_cache_key
+from http_transport import get_session
+from telemetry import span
+
+POWERBI_API_URL = "https://api.powerbi.com/v1.0/myorg"
+
+logger = logging.getLogger(__name__)
+
+
+class ExportJobError(Exception):
+    """Raised when a Power BI export job fails or does not finish in time."""
+
+
+class ExportTarget:
+    """
+    A single report page to export.
+
+    Attributes:
+        report_id (str): ID of the Power BI report.
+        page_name (str): Name of the report page to export.
+        export_format (str): Export format, e.g. PNG or PDF.
+        workspace_id (str): ID of the workspace holding the report, None for "My workspace".
+        capacity_id (str): ID of the capacity backing the workspace, used for concurrency caps.
+    """
+
+    __slots__ = ("report_id", "page_name", "export_format", "workspace_id", "capacity_id")
+
+    def __init__(self, report_id, page_name, export_format="PNG", workspace_id=None, capacity_id=None):
+        self.report_id = report_id
+        self.page_name = page_name
+        self.export_format = export_format.upper()
+        self.workspace_id = workspace_id
+        self.capacity_id = capacity_id
+
+    def __repr__(self):
+        return f"ExportTarget({self.report_id!r}, {self.page_name!r}, {self.export_format!r})"
+
+
+class PowerBIExportEngine:
+    """
+    Exports report pages through the asynchronous Power BI ExportTo API.
+
+    Attributes:
+        token_getter (callable): Zero-argument coroutine function returning a Power BI access token.
+        output_dir (str): Directory the exported files are written to.
+        base_url (str): Power BI REST API base URL, overridable for local stubs.
+        max_per_capacity (int): Maximum concurrent export jobs per capacity.
+        max_per_workspace (int): Maximum concurrent export jobs per workspace.
+        poll_interval (float): Initial delay in seconds between status polls of a job.
+        max_poll_interval (float): Upper bound for the per-job polling backoff.
+        job_timeout (float): Seconds after which a job that has not finished is abandoned.
+        request_timeout (float): Timeout in seconds for individual HTTP requests.
+        cache (ExportCache): Optional export cache consulted before submitting a job.
+    """
+
+    def __init__(self, token_getter, output_dir="./sandbox/exports", base_url=POWERBI_API_URL,
+                 max_per_capacity=8, max_per_workspace=4, poll_interval=1.0, max_poll_interval=30.0,
+                 job_timeout=600.0, request_timeout=30.0, cache=None):
+        self.token_getter = token_getter
+        self.output_dir = output_dir
+        self.base_url = base_url.rstrip("/")
+        self.max_per_capacity = max_per_capacity
+        self.max_per_workspace = max_per_workspace
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.job_timeout = job_timeout
+        self.request_timeout = request_timeout
+        self.cache = cache
+        self._report_versions = {}
+        self._capacity_limits = {}
+        self._workspace_limits = {}
+        self._session = get_session()
+
+    async def export_pages(self, targets, return_exceptions=True):
+        """Export every target concurrently and return one result per target, in order.
+
+        Targets writing the same output file are exported once and share the result.
+
+        Args:
+            targets (list): ExportTarget instances or (report_id, page_name) tuples.
+            return_exceptions (bool): If True, a failed target yields its exception in the result
+                list instead of cancelling the remaining exports.
+
+        Returns:
+            list: Dictionaries with report_id, page_name, file_path, bytes, elapsed seconds and
+                whether the file was served from the cache.
+        """
+        targets = [t if isinstance(t, ExportTarget) else ExportTarget(*t) for t in targets]
+        exports = {}
+        for target in targets:
+            path = self._output_path(target)
+            if path not in exports:
+                exports[path] = asyncio.ensure_future(self.export_page(target))
+        results = await asyncio.gather(*(exports[self._output_path(t)] for t in targets),
+                                       return_exceptions=return_exceptions)
+        return [dict(result) if isinstance(result, dict) else result for result in results]
+
+    def run(self, targets, return_exceptions=True):
+        """Synchronous entry point wrapping `export_pages` for callers without an event loop."""
+        # Semaphores and memoized version lookups belong to the previous run's event loop.
+        self._report_versions.clear()
+        self._capacity_limits.clear()
+        self._workspace_limits.clear()
+        return asyncio.run(self.export_pages(targets, return_exceptions=return_exceptions))
+
+    async def export_page(self, target):
+        """Run the submit, poll and download lifecycle for one target under the concurrency caps."""
+        with span("powerbi.export", report_id=target.report_id, page_name=target.page_name) as export_span:
+            result = await self._export_page(target)
+            export_span.set(cached=result["cached"])
+            export_span.record_bytes(result["bytes"], direction="in")
+            return result
+
+    async def _export_page(self, target):
+        started = time.monotonic()
+        file_path = self._output_path(target)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = await self._cache_key(target)
+            if cache_key is not None and await asyncio.to_thread(self.cache.materialize, cache_key, file_path):
+                logger.info("Served %s/%s from the export cache", target.report_id, target.page_name)
+                return self._result(target, file_path, os.path.getsize(file_path), started, cached=True)
+
+        async with self._limit(self._capacity_limits, target.capacity_id, self.max_per_capacity):
+            async with self._limit(self._workspace_limits, target.workspace_id, self.max_per_workspace):
+                with span("powerbi.export.submit"):
+                    export_id = await self._submit(target)
+                with span("powerbi.export.render"):
+                    await self._wait_for_completion(target, export_id)
+                with span("powerbi.export.download"):
+                    size = await self._download(target, export_id, file_path)
+
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.put, cache_key, file_path)
+        result = self._result(target, file_path, size, started, cached=False)
+        logger.info("Exported %s/%s in %.1fs (%d bytes)", target.report_id, target.page_name, result["elapsed"], size)
+        return result
+
+    def _result(self, target, file_path, size, started, cached):
+        return {
+            "report_id": target.report_id,
+            "page_name": target.page_name,
+            "file_path": file_path,
+            "bytes": size,
+            "elapsed": time.monotonic() - started,
+            "cached": cached
+        }
+
+    def _output_path(self, target):
+        return os.path.join(self.output_dir, target.report_id, f"{target.page_name}.{target.export_format.lower()}")
+
+    async def _cache_key(self, target):
+        """Return the cache key for `target`, or None if its version is unknown and it must be exported."""
+        version = await self._report_version(target)
+        if version is None:
+            return None
+        report_modified, dataset_refreshed = version
+        return export_cache_key(target.report_id, target.page_name, target.export_format,
+                                report_modified, dataset_refreshed)
+
+    async def _report_version(self, target):
+        """Return (report modified time, dataset last refresh time), looked up once per report, or None."""
+        key = (target.workspace_id, target.report_id)
+        if key not in self._report_versions:
+            self._report_versions[key] = asyncio.ensure_future(self._fetch_report_version(target))
+        return await self._report_versions[key]
+
+    async def _fetch_report_version(self, target):
+        try:
+            response = await self._request("GET", self._report_url(target))
+            response.raise_for_status()
+            report = response.json()
+            dataset_id = report.get("datasetId")
+            refreshes = []
+            if dataset_id:
+                prefix = f"{self.base_url}/groups/{target.workspace_id}" if target.workspace_id else self.base_url
+                response = await self._request("GET", f"{prefix}/datasets/{dataset_id}/refreshes",
+                                               params={"$top": 1})
+                response.raise_for_status()
+                refreshes = response.json().get("value", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # DirectQuery datasets and missing dataset permissions answer 403/404 on the refresh history.
+            logger.info("Version of report %s unavailable, exporting without the cache: %s", target.report_id, e)
+            return None
+        # Without a refresh the data version is unknown (DirectQuery, never refreshed), so a cached
+        # image could never be invalidated. modifiedDateTime is only returned for some report types.
+        if not refreshes:
+            logger.info("Dataset of report %s has no refresh history, exporting without the cache", target.report_id)
+            return None
+        dataset_refreshed = refreshes[0].get("endTime") or refreshes[0].get("startTime", "")
+        return report.get("modifiedDateTime", ""), dataset_refreshed
+
+    def _limit(self, limits, key, size):
+        if key not in limits:
+            limits[key] = asyncio.Semaphore(size)
+        return limits[key]
+
+    def _report_url(self, target):
+        if target.workspace_id:
+            return f"{self.base_url}/groups/{target.workspace_id}/reports/{target.report_id}"
+        return f"{self.base_url}/reports/{target.report_id}"
+
+    async def _headers(self):
+        return {"Authorization": f"Bearer {await self.token_getter()}"}
+
+    async def _request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.request_timeout)
+        kwargs["headers"] = await self._headers()
+        return await asyncio.to_thread(self._session.request, method, url, **kwargs)
+
+    async def _submit(self, target):
+        body = {
+            "format": target.export_format,
+            "powerBIReportConfiguration": {"pages": [{"pageName": target.page_name}]}
+        }
+        # Throttled submissions are retried by the shared transport, which honours Retry-After.
+        response = await self._request("POST", f"{self._report_url(target)}/ExportTo", json=body)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def _wait_for_completion(self, target, export_id):
+        url = f"{self._report_url(target)}/exports/{export_id}"
+        deadline = time.monotonic() + self.job_timeout
+        interval = self.poll_interval
+        while True:
+            response = await self._request("GET", url)
+            if response.status_code != 429:
+                response.raise_for_status()
+                status = response.json().get("status")
+                if status == "Succeeded":
+                    return
+                if status == "Failed":
+                    error = response.json().get("error", {})
+                    raise ExportJobError(f"Export job {export_id} for {target!r} failed: {error}")
+
+            if time.monotonic() >= deadline:
+                raise ExportJobError(f"Export job {export_id} for {target!r} did not finish in {self.job_timeout}s")
+            # Each job backs off on its own schedule; the service's Retry-After takes precedence.
+            delay = _retry_after(response, interval * random.uniform(0.8, 1.2))
+            await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    async def _download(self, target, export_id, file_path):
+        url = f"{self._report_url(target)}/exports/{export_id}/file"
+        headers = await self._headers()
+        return await asyncio.to_thread(self._stream_to_file, url, headers, file_path, export_id)
+
+    def _stream_to_file(self, url, headers, file_path, export_id):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Named per job, so engines in other threads or processes exporting the same page never share it.
+        temp_path = f"{file_path}.{export_id}.part"
+        size = 0
+        with self._session.get(url, headers=headers, stream=True, timeout=self.request_timeout) as response:
+            response.raise_for_status()
+            with open(temp_path, "wb") as out:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    out.write(chunk)
+                    size += len(chunk)
+        os.replace(temp_path, file_path)
+        return size
+
+
+def _retry_after(response, default):
+    """Return the Retry-After header of `response` in seconds, or `default` if absent."""
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
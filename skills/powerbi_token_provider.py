@@ -0,0 +1,194 @@
+"""
+This module provides a process-wide Power BI access token cache shared by every skill.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import requests
+from http_transport import get_session
+from telemetry import span
+
+POWERBI_SCOPE = "https://analysis.windows.net/powerbi/api/.default"
+AUTHORITY_HOST = "https://login.microsoftonline.com"
+TOKEN_ENDPOINT_TEMPLATE = "{authority}/{tenant_id}/oauth2/v2.0/token"
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedToken:
+    """A single access token with its absolute expiry time, refresh margin and whether it has been read."""
+
+    __slots__ = ("access_token", "expires_at", "margin", "read")
+
+    def __init__(self, access_token, expires_at, margin):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.margin = margin
+        self.read = False
+
+
+class PowerBITokenProvider:
+    """
+    Caches client-credentials tokens per (tenant, client, scope) and refreshes them before they expire.
+
+    Concurrent callers asking for the same key while a refresh is in flight wait for that single
+    request instead of issuing their own. A daemon timer refreshes each token `refresh_margin`
+    seconds before `expires_in` runs out, so callers on the hot path normally never block. Tokens
+    that have not been read since their last refresh are left to expire instead.
+
+    Attributes:
+        refresh_margin (int): Seconds before expiry at which a token is considered stale, capped at
+            half its lifetime for short-lived tokens.
+        timeout (int): Timeout in seconds for token endpoint requests.
+        background_refresh (bool): Whether to refresh tokens proactively on a timer.
+        authority (str): Base URL of the token authority, overridable for local stubs.
+    """
+
+    def __init__(self, refresh_margin=300, timeout=10, background_refresh=True, authority=AUTHORITY_HOST):
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.background_refresh = background_refresh
+        self.authority = authority.rstrip("/")
+        self._tokens = {}
+        self._credentials = {}
+        self._key_locks = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, tenant_id, client_id, client_secret, scope=POWERBI_SCOPE):
+        """Return a valid access token, fetching one only if the cached token is missing or stale.
+
+        Args:
+            tenant_id (str): Azure tenant ID.
+            client_id (str): Registered client ID.
+            client_secret (str): Client secret for the app registration.
+            scope (str): OAuth2 scope to request.
+
+        Returns:
+            str: Access token.
+
+        Raises:
+            requests.exceptions.RequestException: If the token endpoint call fails.
+        """
+        key = (tenant_id, client_id, scope)
+        cached = self._fresh_token(key)
+        if cached is not None:
+            return cached
+
+        with self._lock_for(key):
+            # Another caller may have refreshed the token while we waited for the lock.
+            cached = self._fresh_token(key)
+            if cached is not None:
+                return cached
+            self._credentials[key] = client_secret
+            return self._refresh(key)
+
+    async def get_token_async(self, tenant_id, client_id, client_secret, scope=POWERBI_SCOPE):
+        """Asyncio-friendly variant of `get_token` that never blocks the event loop."""
+        cached = self._fresh_token((tenant_id, client_id, scope))
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self.get_token, tenant_id, client_id, client_secret, scope)
+
+    def invalidate(self, tenant_id, client_id, scope=POWERBI_SCOPE):
+        """Drop a cached token, e.g. after the API rejected it with a 401."""
+        key = (tenant_id, client_id, scope)
+        with self._lock:
+            self._tokens.pop(key, None)
+            timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def close(self):
+        """Cancel all pending background refreshes and forget every cached token."""
+        with self._lock:
+            timers = list(self._timers.values())
+            self._timers.clear()
+            self._tokens.clear()
+            self._credentials.clear()
+        for timer in timers:
+            timer.cancel()
+
+    def _lock_for(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _fresh_token(self, key):
+        cached = self._tokens.get(key)
+        if cached is not None and cached.expires_at - cached.margin > time.monotonic():
+            cached.read = True
+            return cached.access_token
+        return None
+
+    def _refresh(self, key):
+        """Fetch a new token for `key` and schedule its proactive refresh. Caller holds the key lock."""
+        tenant_id, client_id, scope = key
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": client_id,
+            "client_secret": self._credentials[key],
+            "scope": scope
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        token_endpoint = TOKEN_ENDPOINT_TEMPLATE.format(authority=self.authority, tenant_id=tenant_id)
+
+        with span("powerbi.token_fetch", client_id=client_id):
+            response = get_session().post(token_endpoint, headers=headers, data=payload, timeout=self.timeout)
+            response.raise_for_status()
+            token_data = response.json()
+        expires_in = int(token_data.get("expires_in", 3600))
+        # A fixed margin would make tokens living shorter than it stale on arrival and refresh them
+        # in a tight loop.
+        margin = min(self.refresh_margin, expires_in / 2)
+        self._tokens[key] = _CachedToken(token_data["access_token"], time.monotonic() + expires_in, margin)
+        logger.debug("Fetched Power BI token for client %s, expires in %ss", client_id, expires_in)
+
+        if self.background_refresh:
+            self._schedule_refresh(key, max(expires_in - margin, 1))
+        return token_data["access_token"]
+
+    def _schedule_refresh(self, key, delay):
+        timer = threading.Timer(delay, self._background_refresh, args=(key,))
+        timer.daemon = True
+        with self._lock:
+            previous = self._timers.pop(key, None)
+            self._timers[key] = timer
+        if previous is not None:
+            previous.cancel()
+        timer.start()
+
+    def _background_refresh(self, key):
+        if key not in self._credentials:
+            return
+        cached = self._tokens.get(key)
+        if cached is not None and not cached.read:
+            # Nobody used the token since the last refresh; the next caller fetches one on demand.
+            logger.debug("Not refreshing unused Power BI token for client %s", key[1])
+            with self._lock:
+                self._timers.pop(key, None)
+            return
+        with self._lock_for(key):
+            try:
+                self._refresh(key)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                # Also covers a malformed token response (no JSON body or no access_token). The
+                # current token is still valid for its refresh margin; the next foreground call
+                # will retry once it goes stale.
+                logger.warning("Background Power BI token refresh failed: %r", e)
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_token_provider():
+    """Return the process-wide PowerBITokenProvider, creating it on first use."""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = PowerBITokenProvider()
+        return _default_provider
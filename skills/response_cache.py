@@ -0,0 +1,199 @@
+"""
+This module provides a persistent SQLite cache for LLM responses with optional near-duplicate prompt matching.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(*parts):
+    """Hash the exact inputs of an LLM call into a cache key."""
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(str(part).encode("utf-8"))
+        sha.update(b"\x1f")
+    return sha.hexdigest()
+
+
+class AzureOpenAIEmbedder:
+    """
+    Embeds prompt text with an Azure OpenAI embedding deployment for near-duplicate lookups.
+
+    Attributes:
+        client (AzureOpenAI): Client used to call the embeddings API.
+        deployment (str): Name of the embedding deployment, e.g. config.AZURE_OPENAI_EMBEDDING_NAME.
+    """
+
+    def __init__(self, client, deployment):
+        self.client = client
+        self.deployment = deployment
+
+    def __call__(self, text):
+        response = self.client.embeddings.create(model=self.deployment, input=text)
+        return response.data[0].embedding
+
+
+class ResponseCache:
+    """
+    Caches LLM responses by content hash, with TTL and least-recently-used size eviction.
+
+    When an embedder is configured, a miss on the exact key falls back to comparing the prompt
+    embedding with those of earlier prompts in the same namespace and scope, and reuses the
+    response of the most similar prompt above `similarity_threshold`. Scope keeps near-duplicate
+    matches from crossing inputs that must match exactly, such as the image being analysed. Every
+    new entry is stored with its embedding; the similarity search is skipped while the namespace and
+    scope hold fewer than `min_scope_entries` entries.
+
+    The database is shared by several skills and processes, so it runs in WAL mode with a busy timeout.
+
+    Attributes:
+        db_path (str): Path of the SQLite database.
+        ttl (float): Seconds after which an entry expires, None to keep entries until evicted.
+        max_entries (int): Number of entries above which least recently used entries are evicted.
+        embedder (callable): Optional text -> vector function enabling near-duplicate lookups.
+        similarity_threshold (float): Minimum cosine similarity for a near-duplicate hit.
+        min_scope_entries (int): Entries a namespace and scope must hold before a miss searches them.
+    """
+
+    def __init__(self, db_path="./sandbox/response_cache.sqlite", ttl=7 * 24 * 3600, max_entries=50000,
+                 embedder=None, similarity_threshold=0.97, min_scope_entries=1):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.min_scope_entries = min_scope_entries
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, namespace TEXT NOT NULL, scope TEXT NOT NULL, value TEXT NOT NULL,"
+            " embedding BLOB, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (namespace, scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+
+    def get_or_compute(self, namespace, key_parts, compute, prompt_text=None, scope=""):
+        """Return the cached response for these inputs, calling `compute()` and storing its result on a miss.
+
+        Args:
+            namespace (str): Name of the calling skill, keeping unrelated responses apart.
+            key_parts (tuple): Every input that determines the response, hashed into the exact key.
+            compute (callable): Zero-argument function producing a JSON-serialisable response.
+            prompt_text (str): Prompt used for near-duplicate matching when an embedder is set.
+            scope (str): Inputs that must match exactly for a near-duplicate hit, e.g. an image hash.
+
+        Returns:
+            The cached or freshly computed response.
+        """
+        key = content_key(namespace, *key_parts)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        embedding = None
+        if self.embedder is not None and prompt_text:
+            embedding = self._embed(prompt_text)
+            if embedding is not None and self._scope_size(namespace, scope) >= self.min_scope_entries:
+                similar = self._nearest(namespace, scope, embedding)
+                if similar is not None:
+                    return similar
+
+        value = compute()
+        self.put(key, namespace, value, scope, embedding)
+        return value
+
+    def get(self, key):
+        """Return the unexpired value stored under `key`, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, namespace, value, scope="", embedding=None):
+        """Store `value` under `key`, evicting expired and least recently used entries as needed."""
+        now = time.time()
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, namespace, scope, value, embedding, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, scope, json.dumps(value), blob, now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._db.close()
+
+    def _scope_size(self, namespace, scope):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM responses WHERE namespace = ? AND scope = ? AND created >= ?",
+                (namespace, scope, self._oldest())
+            ).fetchone()[0]
+
+    def _oldest(self):
+        return time.time() - self.ttl if self.ttl is not None else 0
+
+    def _embed(self, text):
+        try:
+            return np.asarray(self.embedder(text), dtype=np.float32)
+        except Exception as e:
+            # Near-duplicate matching is an optimisation; an embedding failure must not fail the call.
+            logger.warning("Prompt embedding failed, skipping near-duplicate lookup: %s", e)
+            return None
+
+    def _nearest(self, namespace, scope, embedding):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, embedding FROM responses"
+                " WHERE namespace = ? AND scope = ? AND embedding IS NOT NULL AND created >= ?",
+                (namespace, scope, self._oldest())
+            ).fetchall()
+        if not rows:
+            return None
+        matrix = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(embedding)
+        similarities = matrix @ embedding / np.where(norms == 0, 1, norms)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        logger.info("Near-duplicate %s cache hit (similarity %.3f)", namespace, similarities[best])
+        with self._lock:
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), rows[best][0]))
+            self._db.commit()
+        return json.loads(rows[best][1])
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used beyond `max_entries`. Caller holds the lock."""
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
@@ -0,0 +1,152 @@
+"""
+This module persists per-page, per-step progress of a workflow run so an interrupted run can be resumed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def page_key(page):
+    """Return a stable identifier for a page item, independent of its position in the run."""
+    return hashlib.sha256(json.dumps(page, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:24]
+
+
+def new_run_id():
+    """Return a new, sortable run id."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+
+class RunCheckpoint:
+    """
+    Records each completed step of each page under a run id.
+
+    A run lives in `<runs_dir>/<run_id>/`: `run.json` holds the workflow path and the page list,
+    `checkpoint.sqlite` the output of every completed step, and `artifacts/` a copy (hardlink
+    where possible) of every exported image, so a resumed run does not depend on the export
+    directory or cache still holding the file. Failed steps are recorded with their error and
+    are retried on resume.
+
+    Attributes:
+        run_id (str): Identifier of the run.
+        run_dir (str): Directory holding the run's state.
+    """
+
+    def __init__(self, run_id=None, runs_dir="./sandbox/runs"):
+        self.run_id = run_id or new_run_id()
+        self.run_dir = os.path.join(runs_dir, self.run_id)
+        self._artifact_dir = os.path.join(self.run_dir, "artifacts")
+        os.makedirs(self._artifact_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.run_dir, "checkpoint.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS steps ("
+            " page_key TEXT NOT NULL, step TEXT NOT NULL, status TEXT NOT NULL, output TEXT,"
+            " error TEXT, attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (page_key, step))"
+        )
+        self._db.commit()
+
+    @classmethod
+    def resume(cls, run_id, runs_dir="./sandbox/runs"):
+        """Open an existing run.
+
+        Raises:
+            FileNotFoundError: If no run with this id exists.
+        """
+        if not os.path.exists(os.path.join(runs_dir, run_id, "run.json")):
+            raise FileNotFoundError(f"No run {run_id} under {runs_dir}")
+        return cls(run_id, runs_dir)
+
+    def save_manifest(self, workflow, pages):
+        """Record the workflow and pages of the run, so `--resume` needs only the run id."""
+        path = os.path.join(self.run_dir, "run.json")
+        temp_path = f"{path}.part"
+        with open(temp_path, "w") as out:
+            json.dump({"run_id": self.run_id, "workflow": workflow, "pages": pages, "created": time.time()},
+                      out, indent=2, default=str)
+        os.replace(temp_path, path)
+
+    def load_manifest(self):
+        """Return the manifest written by `save_manifest`."""
+        with open(os.path.join(self.run_dir, "run.json")) as f:
+            return json.load(f)
+
+    def completed_steps(self, key):
+        """Return step id -> output item for the steps of page `key` that completed."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT step, output FROM steps WHERE page_key = ? AND status = 'done'", (key,)
+            ).fetchall()
+        completed = {}
+        for step, output in rows:
+            item = json.loads(output)
+            # A completed export whose artifact disappeared has to run again.
+            if item.get("image_file") and not os.path.exists(item["image_file"]):
+                continue
+            completed[step] = item
+        return completed
+
+    def record_done(self, key, step, item):
+        """Persist a completed step; exported images are copied into the run first.
+
+        Returns:
+            dict: The item as stored, with `image_file` pointing at the run's copy.
+        """
+        item = dict(item)
+        image_file = item.get("image_file")
+        if image_file and not os.path.abspath(image_file).startswith(os.path.abspath(self._artifact_dir)):
+            item["image_file"] = self._store_artifact(key, image_file)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO steps (page_key, step, status, output, error, attempts, updated_at)"
+                " VALUES (?, ?, 'done', ?, NULL, 1, ?)"
+                " ON CONFLICT (page_key, step) DO UPDATE SET status = 'done', output = excluded.output,"
+                " error = NULL, attempts = attempts + 1, updated_at = excluded.updated_at",
+                (key, step, json.dumps(item, default=str), time.time())
+            )
+            self._db.commit()
+        return item
+
+    def record_failed(self, key, step, error):
+        """Persist a failed step so the run's state shows where and why it stopped."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO steps (page_key, step, status, output, error, attempts, updated_at)"
+                " VALUES (?, ?, 'failed', NULL, ?, 1, ?)"
+                " ON CONFLICT (page_key, step) DO UPDATE SET status = 'failed', error = excluded.error,"
+                " attempts = attempts + 1, updated_at = excluded.updated_at",
+                (key, step, error, time.time())
+            )
+            self._db.commit()
+
+    def summary(self):
+        """Return the number of steps per status."""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM steps GROUP BY status").fetchall())
+
+    def close(self):
+        """Close the checkpoint database."""
+        with self._lock:
+            self._db.close()
+
+    def _store_artifact(self, key, source_path):
+        extension = os.path.splitext(source_path)[1]
+        target = os.path.join(self._artifact_dir, f"{key}{extension}")
+        temp_path = f"{target}.part"
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            os.link(source_path, temp_path)
+        except OSError:
+            shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, target)
+        return target
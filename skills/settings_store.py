@@ -0,0 +1,186 @@
+"""
+This module provides a lazily initialised, process-wide store for configuration values and encrypted secrets.
+"""
+
+import logging
+import os
+import threading
+import time
+from configparser import ConfigParser
+from dotenv import dotenv_values, find_dotenv
+
+logger = logging.getLogger(__name__)
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+_FALSE_VALUES = {"0", "false", "no", "off", ""}
+
+
+class SettingsStore:
+    """
+    Parses .env and settings.ini once and decrypts each secret once.
+
+    Files are re-read only when their modification time changes, checked at most once per
+    `check_interval` seconds, so configuration edits are picked up without restarting while the
+    per-request cost stays a dictionary lookup. As with `load_dotenv`, values already present in
+    the process environment take precedence over the .env file, and .env values are exported to
+    `os.environ` for code that still reads it directly.
+
+    Attributes:
+        env_file (str): Path of the .env file; by default the nearest .env above the working directory.
+        ini_file (str): Path of the settings.ini file holding encrypted secrets.
+        check_interval (float): Minimum seconds between file modification checks.
+    """
+
+    def __init__(self, env_file=None, ini_file="settings.ini", check_interval=1.0):
+        self.env_file = env_file or find_dotenv(usecwd=True) or ".env"
+        self.ini_file = ini_file
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._env_mtime = None
+        self._env_exported = {}
+        self._ini_mtime = None
+        self._ini = None
+        self._fernet = None
+        self._fernet_key = None
+        self._secrets = {}
+        self._checked_at = None
+
+    def get_str(self, name, default=None):
+        """Return a configuration value as a string, or `default` if it is not set."""
+        self._check_files()
+        return os.environ.get(name, default)
+
+    def require(self, name):
+        """Return a configuration value, raising ValueError if it is not set."""
+        value = self.get_str(name)
+        if value is None:
+            raise ValueError(f"{name} is not set in the environment variables.")
+        return value
+
+    def get_int(self, name, default=None):
+        """Return a configuration value parsed as an int."""
+        value = self.get_str(name)
+        return default if value is None else int(value)
+
+    def get_float(self, name, default=None):
+        """Return a configuration value parsed as a float."""
+        value = self.get_str(name)
+        return default if value is None else float(value)
+
+    def get_bool(self, name, default=False):
+        """Return a configuration value parsed as a boolean (1/0, true/false, yes/no, on/off)."""
+        value = self.get_str(name)
+        if value is None:
+            return default
+        normalized = value.strip().lower()
+        if normalized in _TRUE_VALUES:
+            return True
+        if normalized in _FALSE_VALUES:
+            return False
+        raise ValueError(f"{name} is not a boolean value: {value!r}")
+
+    def secret(self, section, option="api_key"):
+        """Return the decrypted value of an encrypted settings.ini entry, decrypting it once.
+
+        Args:
+            section (str): Section of settings.ini, e.g. "api" or "bing_search".
+            option (str): Option holding the Fernet-encrypted value.
+
+        Returns:
+            str: The decrypted secret.
+
+        Raises:
+            ValueError: If CONFIG_ENCRYPTION_KEY is not set.
+            KeyError: If the section or option is missing from settings.ini.
+        """
+        self._check_files()
+        with self._lock:
+            cached = self._secrets.get((section, option))
+            if cached is not None:
+                return cached
+            fernet = self._get_fernet()
+            encrypted_value = self._ini[section][option]
+            decrypted_value = fernet.decrypt(encrypted_value.encode()).decode()
+            self._secrets[(section, option)] = decrypted_value
+            return decrypted_value
+
+    def invalidate(self):
+        """Force the next access to re-read both files and decrypt secrets again."""
+        with self._lock:
+            self._env_mtime = None
+            self._ini_mtime = None
+            self._checked_at = None
+            self._secrets.clear()
+
+    def _check_files(self):
+        if self._fresh():
+            return
+        with self._lock:
+            # Another thread may have finished the check while we waited for the lock.
+            if self._fresh():
+                return
+            env_mtime = _mtime(self.env_file)
+            if env_mtime != self._env_mtime:
+                self._load_env()
+                self._env_mtime = env_mtime
+            ini_mtime = _mtime(self.ini_file)
+            if ini_mtime != self._ini_mtime or self._ini is None:
+                self._ini = ConfigParser()
+                self._ini.read(self.ini_file)
+                self._ini_mtime = ini_mtime
+                self._secrets.clear()
+            # Marked only once loading has finished, so the lock-free fast path never sees a
+            # recent check before .env has been applied to the environment.
+            self._checked_at = time.monotonic()
+
+    def _fresh(self):
+        checked_at = self._checked_at
+        return checked_at is not None and time.monotonic() - checked_at < self.check_interval
+
+    def _load_env(self):
+        values = dotenv_values(self.env_file) if os.path.exists(self.env_file) else {}
+        # Withdraw values exported from a previous version of the file before applying the new one.
+        for name, exported in self._env_exported.items():
+            if os.environ.get(name) == exported and name not in values:
+                del os.environ[name]
+        exported = {}
+        for name, value in values.items():
+            if value is None:
+                continue
+            if name not in os.environ or os.environ[name] == self._env_exported.get(name):
+                os.environ[name] = value
+                exported[name] = value
+        self._env_exported = exported
+        logger.debug("Loaded %d settings from %s", len(exported), self.env_file)
+
+    def _get_fernet(self):
+        key = os.environ.get("CONFIG_ENCRYPTION_KEY")
+        if not key:
+            raise ValueError("CONFIG_ENCRYPTION_KEY environment variable is not set")
+        if key != self._fernet_key:
+            # Imported on first use: cryptography is comparatively slow to import.
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(key)
+            self._fernet_key = key
+            self._secrets.clear()
+        return self._fernet
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_settings():
+    """Return the process-wide SettingsStore, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = SettingsStore()
+        return _default_store
@@ -0,0 +1,203 @@
+"""
+This module indexes the skills in this directory by name without importing them, and imports a skill only when it is used.
+"""
+
+import ast
+import importlib
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+
+SKILLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SKILL_FILE_PREFIX = "Skill_"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SkillSpec:
+    """Where a skill is defined, as found by reading its source.
+
+    Attributes:
+        name (str): The skill's `name`, used in workflows and agent configurations.
+        description (str): The skill's description, if it is a string literal.
+        module (str): Module that defines the skill.
+        path (str): Source file of the module.
+        attribute (str): Class, function or module-level variable holding the skill.
+        kind (str): "class" for classes, "function" for plain-function skills, "instance" for
+            module-level autogen.Skill(...) objects.
+    """
+    name: str
+    description: str
+    module: str
+    path: str
+    attribute: str
+    kind: str
+
+
+def _literal(node):
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _base_name(node):
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+def _entry_point(tree, module, path):
+    # Modules without a declared skill follow the AutoGen Studio convention of one skill per file,
+    # named after the file; its entry point is the public class or function nothing else calls.
+    definitions = [node for node in tree.body
+                   if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+                   and not node.name.startswith("_") and not node.name.startswith("Test")]
+    used = set()
+    for node in definitions:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and child.id != node.name:
+                used.add(child.id)
+    candidates = [node for node in definitions if node.name not in used]
+    candidates.sort(key=lambda node: not isinstance(node, ast.ClassDef))
+    if not candidates:
+        return None
+    entry = candidates[0]
+    kind = "class" if isinstance(entry, ast.ClassDef) else "function"
+    return SkillSpec(module[len(SKILL_FILE_PREFIX):], ast.get_docstring(entry) or "", module, path, entry.name, kind)
+
+
+def scan_source(source, module, path=None):
+    """Return the SkillSpecs defined in one module's source without executing it."""
+    specs = []
+    tree = ast.parse(source, filename=path or module)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any((_base_name(b) or "").endswith("Skill") for b in node.bases):
+            fields = {}
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and len(statement.targets) == 1 \
+                        and isinstance(statement.targets[0], ast.Name):
+                    fields[statement.targets[0].id] = _literal(statement.value)
+            if fields.get("name"):
+                specs.append(SkillSpec(fields["name"], fields.get("description") or "", module, path,
+                                       node.name, "class"))
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Call) \
+                and _base_name(node.value.func) == "Skill" and isinstance(node.targets[0], ast.Name):
+            keywords = {k.arg: _literal(k.value) for k in node.value.keywords if k.arg}
+            if keywords.get("name"):
+                specs.append(SkillSpec(keywords["name"], keywords.get("description") or "", module, path,
+                                       node.targets[0].id, "instance"))
+    if not specs and module.startswith(SKILL_FILE_PREFIX):
+        entry = _entry_point(tree, module, path)
+        if entry is not None:
+            specs.append(entry)
+    return specs
+
+
+class SkillRegistry:
+    """
+    Finds skills by name by parsing the Skill_*.py sources, so listing or resolving skills costs a
+    few milliseconds instead of importing every skill and its dependencies (OpenAI, PIL, NumPy,
+    Azure SDKs). A skill's module is imported the first time the skill is loaded.
+
+    Skills are found by their declared `name`, and also by their file name without the Skill_
+    prefix (e.g. "ExportToImage"), which is how workflow definitions refer to them. Source files
+    are re-parsed only when their modification time changes.
+
+    Attributes:
+        skills_dir (str): Directory searched for Skill_*.py modules.
+    """
+
+    def __init__(self, skills_dir=SKILLS_DIR):
+        self.skills_dir = os.path.abspath(skills_dir)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._specs = {}
+        self._aliases = {}
+
+    def names(self):
+        """Return the names of all skills, sorted."""
+        return sorted(self._index())
+
+    def spec(self, name):
+        """Return the SkillSpec registered under `name`.
+
+        Raises:
+            KeyError: If no skill has that name.
+        """
+        specs = self._index()
+        spec = specs.get(name) or self._aliases.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown skill: {name}")
+        return spec
+
+    def __contains__(self, name):
+        return name in self._index() or name in self._aliases
+
+    def load(self, name):
+        """Import the skill's module and return the skill's class, function or module-level skill object."""
+        spec = self.spec(name)
+        if self.skills_dir not in sys.path:
+            # Skills import their helpers as top-level modules from this directory.
+            sys.path.insert(0, self.skills_dir)
+        module = importlib.import_module(spec.module)
+        return getattr(module, spec.attribute)
+
+    def create(self, name, *args, **kwargs):
+        """Return a ready-to-use skill: a new instance of a skill class, otherwise the function or skill object."""
+        skill = self.load(name)
+        if self.spec(name).kind == "class":
+            return skill(*args, **kwargs)
+        return skill
+
+    def _index(self):
+        with self._lock:
+            seen = set()
+            changed = False
+            for entry in os.scandir(self.skills_dir):
+                if not (entry.name.startswith(SKILL_FILE_PREFIX) and entry.name.endswith(".py")):
+                    continue
+                seen.add(entry.path)
+                mtime = entry.stat().st_mtime_ns
+                cached = self._files.get(entry.path)
+                if cached is not None and cached[0] == mtime:
+                    continue
+                module = entry.name[:-3]
+                try:
+                    with open(entry.path, encoding="utf-8") as source:
+                        specs = scan_source(source.read(), module, entry.path)
+                except (OSError, SyntaxError, ValueError) as e:
+                    logger.warning("Skipping skill module %s: %s", entry.path, e)
+                    specs = []
+                self._files[entry.path] = (mtime, specs)
+                changed = True
+            for path in set(self._files) - seen:
+                del self._files[path]
+                changed = True
+            if changed:
+                self._specs = {}
+                self._aliases = {}
+                for path in sorted(self._files):
+                    for spec in self._files[path][1]:
+                        if spec.name in self._specs:
+                            logger.warning("Skill %s is defined in both %s and %s; using the first",
+                                           spec.name, self._specs[spec.name].path, spec.path)
+                            continue
+                        self._specs[spec.name] = spec
+                        self._aliases.setdefault(spec.module[len(SKILL_FILE_PREFIX):], spec)
+            return self._specs
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide SkillRegistry for this directory, creating it on first use."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = SkillRegistry()
+        return _default_registry
@@ -0,0 +1,122 @@
+"""
+This module measures worker cold-start cost: the import time of the skill registry and of each skill module.
+
+Usage:
+    python startup_benchmark.py [module ...] [--repeat N] [--top N] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from skill_registry import SKILLS_DIR, get_registry
+
+
+def parse_importtime(stderr):
+    """Parse `python -X importtime` output into a list of (module, self_us, cumulative_us)."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        entries.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return entries
+
+
+def measure_import(module, python=sys.executable, cwd=SKILLS_DIR, top=10):
+    """Import `module` in a fresh interpreter and report its import cost.
+
+    Args:
+        module (str): Module to import, resolved from `cwd`.
+        python (str): Interpreter to benchmark.
+        cwd (str): Working directory of the child process.
+        top (int): Number of slowest dependencies (by self time) to report.
+
+    Returns:
+        dict: module, ok, wall_ms (interpreter start to exit), import_ms (cumulative import time of
+            `module`), modules (number of modules imported) and the `top` slowest imports; `error`
+            holds the last line of the traceback if the import failed.
+    """
+    command = [python, "-X", "importtime", "-c", f"import {module}"]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    entries = parse_importtime(completed.stderr)
+    # Nested imports are indented; the requested module is the last top-level entry.
+    own = [e for e in entries if e[0] == module]
+    result = {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(own[-1][2] / 1000, 1) if own else None,
+        "modules": len(entries),
+        "slowest": [{"module": name.strip(), "self_ms": round(self_us / 1000, 1)}
+                    for name, self_us, _ in sorted(entries, key=lambda e: -e[1])[:top]]
+    }
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if line and not line.startswith("import time:")]
+        result["error"] = errors[-1] if errors else f"exit code {completed.returncode}"
+    return result
+
+
+def run_benchmark(modules=None, repeat=3, top=10):
+    """Measure every module `repeat` times and keep the median run of each.
+
+    By default the bare interpreter, the skill registry and every
+    skill module found by the registry are measured.
+    """
+    if modules is None:
+        registry = get_registry()
+        modules = ["skill_registry"] + sorted({registry.spec(name).module for name in registry.names()})
+    results = [{"module": "<interpreter>", **_median_run("", repeat, top, code="pass")}]
+    for module in modules:
+        results.append(_median_run(module, repeat, top))
+    return {"python": sys.version.split()[0], "repeat": repeat, "results": results}
+
+
+def _median_run(module, repeat, top, code=None):
+    if code is not None:
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=SKILLS_DIR, check=True)
+            runs.append({"wall_ms": round((time.perf_counter() - started) * 1000, 1)})
+    else:
+        runs = [measure_import(module, top=top) for _ in range(repeat)]
+    runs.sort(key=lambda r: r["wall_ms"])
+    median = dict(runs[len(runs) // 2])
+    median["wall_ms_runs"] = [r["wall_ms"] for r in runs]
+    median.pop("module", None)
+    return median if code is not None else {"module": module, **median}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost of the skills.")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (default: registry and all skills).")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module; the median is kept.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest dependencies to list per module.")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.modules or None, args.repeat, args.top)
+    for result in report["results"]:
+        status = "ok" if result.get("ok", True) else f"FAILED ({result.get('error')})"
+        import_ms = result.get("import_ms")
+        print(f"{result['module']:<40} wall {result['wall_ms']:>8.1f} ms  "
+              f"import {'-' if import_ms is None else f'{import_ms:.1f}':>8} ms  {status}",
+              file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as out:
+            out.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
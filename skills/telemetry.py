@@ -0,0 +1,369 @@
+"""
+This module provides process-wide spans and histograms for the skills, exportable as Prometheus text or OTLP/HTTP JSON.
+
+Usage:
+    from telemetry import span
+
+    with span("vision.call", deployment=deployment) as s:
+        response = client.chat.completions.create(...)
+        s.record_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
+
+    print(get_telemetry().prometheus_text())
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2 ** n for n in range(10, 31, 2))
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("telemetry_current_span", default=None)
+
+
+class Histogram:
+    """
+    A cumulative histogram with one series per label set.
+
+    Attributes:
+        name (str): Metric name.
+        help (str): Description shown in the Prometheus exposition.
+        buckets (tuple): Upper bounds of the buckets, ascending.
+    """
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self):
+        """Return (labels, bucket counts, sum, count) per series; bucket counts are not cumulative."""
+        with self._lock:
+            return [(dict(key), list(s["counts"]), s["sum"], s["count"]) for key, s in self._series.items()]
+
+
+class Span:
+    """
+    A timed operation. Spans nest through context variables, so a span opened inside another one
+    (in the same thread or asyncio task) records it as its parent.
+
+    Attributes:
+        name (str): Operation name, e.g. "powerbi.export".
+        attributes (dict): Attributes attached to the span.
+        trace_id (str): 32 hex digits shared by a span and its descendants.
+        span_id (str): 16 hex digits.
+        parent_id (str): span_id of the enclosing span, or None.
+    """
+
+    def __init__(self, telemetry, name, attributes):
+        parent = _current_span.get()
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.status = "ok"
+        self.error = None
+        self.start_ns = None
+        self.end_ns = None
+        self._started = None
+        self._token = None
+
+    def set(self, **attributes):
+        """Attach attributes to the span."""
+        self.attributes.update(attributes)
+
+    def record_bytes(self, size, direction="out"):
+        """Record a payload size for this span, e.g. an exported file or an encoded image."""
+        self.attributes[f"bytes.{direction}"] = self.attributes.get(f"bytes.{direction}", 0) + size
+        self.telemetry.payload_bytes.observe(size, span=self.name, direction=direction)
+
+    def record_tokens(self, prompt_tokens=None, completion_tokens=None):
+        """Record model token usage for this span; missing counts are skipped."""
+        for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+            if tokens is not None:
+                self.attributes[f"tokens.{kind}"] = self.attributes.get(f"tokens.{kind}", 0) + tokens
+                self.telemetry.tokens.observe(tokens, span=self.name, kind=kind)
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(duration * 1e9)
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.status = "error"
+            self.error = f"{type(exc).__name__}: {exc}"
+        self.telemetry._finish(self, duration)
+        return False
+
+
+class Telemetry:
+    """
+    Holds the metrics and the most recent finished spans of the process.
+
+    Every span feeds `skill_span_duration_seconds`; spans that record payload sizes or token
+    usage also feed `skill_payload_bytes` and `skill_model_tokens`. All three are labelled by span
+    name, so a Prometheus scrape or an OTLP export shows where a run spends its time.
+
+    Attributes:
+        service_name (str): Reported as the OTLP service.name resource attribute.
+        max_spans (int): Finished spans kept for trace export; older ones are dropped.
+    """
+
+    def __init__(self, service_name="powerbi-skills", max_spans=10000):
+        self.service_name = service_name
+        self.start_ns = time.time_ns()
+        self.latency = Histogram("skill_span_duration_seconds", "Duration of skill operations.", LATENCY_BUCKETS)
+        self.payload_bytes = Histogram("skill_payload_bytes", "Size of payloads handled by skill operations.",
+                                       BYTES_BUCKETS)
+        self.tokens = Histogram("skill_model_tokens", "Model tokens used by skill operations.", TOKEN_BUCKETS)
+        self._spans = deque(maxlen=max_spans)
+        self._spans_lock = threading.Lock()
+
+    @property
+    def histograms(self):
+        return (self.latency, self.payload_bytes, self.tokens)
+
+    def span(self, name, **attributes):
+        """Return a context manager timing the operation `name`."""
+        return Span(self, name, attributes)
+
+    def drain_spans(self):
+        """Return and forget the finished spans collected since the last call."""
+        with self._spans_lock:
+            spans = list(self._spans)
+            self._spans.clear()
+        return spans
+
+    def prometheus_text(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for histogram in self.histograms:
+            lines.append(f"# HELP {histogram.name} {histogram.help}")
+            lines.append(f"# TYPE {histogram.name} histogram")
+            for labels, counts, total, count in histogram.snapshot():
+                cumulative = 0
+                for bound, bucket_count in zip(list(histogram.buckets) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{histogram.name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{histogram.name}_sum{_labels(labels)} {total}")
+                lines.append(f"{histogram.name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def otlp_metrics(self):
+        """Return the metrics as an OTLP/HTTP JSON ExportMetricsServiceRequest (cumulative temporality)."""
+        now = time.time_ns()
+        metrics = []
+        for histogram in self.histograms:
+            points = [{
+                "attributes": _otlp_attributes(labels),
+                "startTimeUnixNano": str(self.start_ns),
+                "timeUnixNano": str(now),
+                "count": str(count),
+                "sum": total,
+                "bucketCounts": [str(c) for c in counts],
+                "explicitBounds": list(histogram.buckets)
+            } for labels, counts, total, count in histogram.snapshot()]
+            metrics.append({"name": histogram.name, "description": histogram.help,
+                            "histogram": {"dataPoints": points, "aggregationTemporality": 2}})
+        return {"resourceMetrics": [{"resource": self._resource(),
+                                     "scopeMetrics": [{"scope": {"name": __name__}, "metrics": metrics}]}]}
+
+    def otlp_traces(self, spans):
+        """Return `spans` as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+        encoded = []
+        for s in spans:
+            entry = {
+                "traceId": s.trace_id, "spanId": s.span_id, "name": s.name, "kind": 1,
+                "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+                "attributes": _otlp_attributes(s.attributes),
+                "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1}
+            }
+            if s.parent_id:
+                entry["parentSpanId"] = s.parent_id
+            encoded.append(entry)
+        return {"resourceSpans": [{"resource": self._resource(),
+                                   "scopeSpans": [{"scope": {"name": __name__}, "spans": encoded}]}]}
+
+    def export_otlp(self, endpoint="http://localhost:4318", timeout=10):
+        """Push metrics and the finished spans to an OTLP/HTTP collector.
+
+        Spans are only dropped from memory once the collector accepted them.
+        """
+        from http_transport import get_session
+        session = get_session()
+        endpoint = endpoint.rstrip("/")
+        response = session.post(f"{endpoint}/v1/metrics", json=self.otlp_metrics(), timeout=timeout)
+        response.raise_for_status()
+        spans = self.drain_spans()
+        if spans:
+            try:
+                response = session.post(f"{endpoint}/v1/traces", json=self.otlp_traces(spans), timeout=timeout)
+                response.raise_for_status()
+            except Exception:
+                # Put the batch back in front of the spans finished meanwhile; extending the bounded
+                # deque from the right then drops the oldest spans if it overflows.
+                with self._spans_lock:
+                    pending = spans + list(self._spans)
+                    self._spans.clear()
+                    self._spans.extend(pending)
+                raise
+        return len(spans)
+
+    def _finish(self, finished_span, duration):
+        self.latency.observe(duration, span=finished_span.name, status=finished_span.status)
+        with self._spans_lock:
+            self._spans.append(finished_span)
+
+    def _resource(self):
+        return {"attributes": _otlp_attributes({"service.name": self.service_name, "process.pid": os.getpid()})}
+
+
+def _labels(labels, **extra):
+    merged = dict(labels, **extra)
+    if not merged:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(merged.items())) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _otlp_attributes(attributes):
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        elif value is not None:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+
+class OTLPExporter:
+    """
+    Pushes telemetry to an OTLP/HTTP collector every `interval` seconds from a daemon thread.
+
+    Attributes:
+        endpoint (str): Collector base URL, e.g. http://localhost:4318.
+        interval (float): Seconds between exports.
+    """
+
+    def __init__(self, endpoint="http://localhost:4318", interval=15.0, telemetry=None):
+        self.endpoint = endpoint
+        self.interval = interval
+        self.telemetry = telemetry or get_telemetry()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the exporter after a final export."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            stopping = self._stop.wait(self.interval)
+            try:
+                self.telemetry.export_otlp(self.endpoint)
+            except Exception as e:
+                logger.warning("OTLP export to %s failed: %s", self.endpoint, e)
+            if stopping:
+                return
+
+
+def start_metrics_server(port=9464, host="127.0.0.1", telemetry=None):
+    """Serve the Prometheus exposition at http://host:port/metrics from a daemon thread."""
+    telemetry = telemetry or get_telemetry()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = telemetry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+_default_telemetry = Telemetry()
+
+
+def get_telemetry():
+    """Return the process-wide Telemetry."""
+    return _default_telemetry
+
+
+def span(name, **attributes):
+    """Time the operation `name` in the process-wide Telemetry; use as a context manager."""
+    return _default_telemetry.span(name, **attributes)
+
+
+def current_span():
+    """Return the innermost open span of this thread or task, or None."""
+    return _current_span.get()
+
+
+def traced(name):
+    """Decorator running a function (sync or async) inside a span named `name`."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
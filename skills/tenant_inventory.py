@@ -0,0 +1,397 @@
+"""
+This module crawls a Power BI tenant's workspaces, datasets, reports and pages into a local SQLite catalog.
+
+Usage:
+    python tenant_inventory.py crawl [--full] [--workspace ID ...]
+    python tenant_inventory.py targets [--workspace ID ...] [--report LIKE] [--page LIKE] [--output pages.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from http_transport import get_session
+
+POWERBI_API_URL = "https://api.powerbi.com/v1.0/myorg"
+# The modified-workspaces admin API only looks back 30 days.
+MODIFIED_LOOKBACK_LIMIT = 30 * 24 * 3600
+# Subtracted from the last crawl time to cover the listing itself and clock skew.
+MODIFIED_SINCE_MARGIN = 600
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryCatalog:
+    """
+    Local, indexed copy of the tenant's workspaces, datasets, reports and report pages.
+
+    Rows not returned by the latest crawl of their workspace are deleted, so the catalog mirrors
+    the tenant as of each workspace's `crawled_at`.
+
+    Attributes:
+        db_path (str): Path of the SQLite database.
+    """
+
+    def __init__(self, db_path="./sandbox/inventory.sqlite"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "PRAGMA foreign_keys = ON;"
+            "CREATE TABLE IF NOT EXISTS workspaces ("
+            " id TEXT PRIMARY KEY, name TEXT, type TEXT, capacity_id TEXT, crawled_at REAL);"
+            "CREATE TABLE IF NOT EXISTS datasets ("
+            " id TEXT PRIMARY KEY, workspace_id TEXT NOT NULL REFERENCES workspaces (id) ON DELETE CASCADE,"
+            " name TEXT, configured_by TEXT, is_refreshable INTEGER, created_at TEXT);"
+            "CREATE TABLE IF NOT EXISTS reports ("
+            " id TEXT PRIMARY KEY, workspace_id TEXT NOT NULL REFERENCES workspaces (id) ON DELETE CASCADE,"
+            " dataset_id TEXT, name TEXT, web_url TEXT, modified_at TEXT, pages_modified_at TEXT,"
+            " pages_crawled_at REAL);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " report_id TEXT NOT NULL REFERENCES reports (id) ON DELETE CASCADE, name TEXT NOT NULL,"
+            " display_name TEXT, ordinal INTEGER, PRIMARY KEY (report_id, name));"
+            "CREATE INDEX IF NOT EXISTS datasets_workspace ON datasets (workspace_id);"
+            "CREATE INDEX IF NOT EXISTS reports_workspace ON reports (workspace_id);"
+            "CREATE INDEX IF NOT EXISTS reports_dataset ON reports (dataset_id);"
+            "CREATE INDEX IF NOT EXISTS reports_name ON reports (name COLLATE NOCASE);"
+            "CREATE INDEX IF NOT EXISTS pages_display_name ON pages (display_name COLLATE NOCASE);"
+        )
+        self._db.commit()
+
+    def store_workspaces(self, workspaces, prune=False):
+        """Insert or update workspaces; with `prune`, delete workspaces not in the list (and their contents)."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO workspaces (id, name, type, capacity_id) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET name = excluded.name, type = excluded.type,"
+                " capacity_id = excluded.capacity_id",
+                [(w["id"], w.get("name"), w.get("type"), w.get("capacityId")) for w in workspaces]
+            )
+            if prune:
+                ids = [w["id"] for w in workspaces]
+                self._db.execute(f"DELETE FROM workspaces WHERE id NOT IN ({', '.join('?' * len(ids))})", ids)
+            self._db.commit()
+
+    def store_workspace_contents(self, workspace_id, datasets, reports):
+        """Replace the datasets and report list of one workspace, keeping pages of unchanged reports."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO datasets (id, workspace_id, name, configured_by, is_refreshable, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET workspace_id = excluded.workspace_id,"
+                " name = excluded.name, configured_by = excluded.configured_by,"
+                " is_refreshable = excluded.is_refreshable, created_at = excluded.created_at",
+                [(d["id"], workspace_id, d.get("name"), d.get("configuredBy"), d.get("isRefreshable"),
+                  d.get("createdDate")) for d in datasets]
+            )
+            self._db.executemany(
+                "INSERT INTO reports (id, workspace_id, dataset_id, name, web_url, modified_at)"
+                " VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET workspace_id = excluded.workspace_id,"
+                " dataset_id = excluded.dataset_id, name = excluded.name, web_url = excluded.web_url,"
+                " modified_at = excluded.modified_at",
+                [(r["id"], workspace_id, r.get("datasetId"), r.get("name"), r.get("webUrl"),
+                  r.get("modifiedDateTime")) for r in reports]
+            )
+            for table, rows in (("datasets", datasets), ("reports", reports)):
+                ids = [row["id"] for row in rows]
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE workspace_id = ? AND id NOT IN ({', '.join('?' * len(ids))})",
+                    [workspace_id, *ids]
+                )
+            self._db.execute("UPDATE workspaces SET crawled_at = ? WHERE id = ?", (time.time(), workspace_id))
+            self._db.commit()
+
+    def crawled_at(self):
+        """Return workspace id -> time of its last successful crawl, for workspaces crawled before."""
+        with self._lock:
+            return dict(self._db.execute("SELECT id, crawled_at FROM workspaces WHERE crawled_at IS NOT NULL"))
+
+    def reports_needing_pages(self, workspace_id, max_age=None):
+        """Return ids of the workspace's reports whose pages are missing or older than the report.
+
+        Reports without a modified timestamp are re-crawled once their pages are `max_age` seconds
+        old (never, if `max_age` is None).
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, modified_at, pages_modified_at, pages_crawled_at FROM reports WHERE workspace_id = ?",
+                (workspace_id,)
+            ).fetchall()
+        now = time.time()
+        stale = []
+        for report_id, modified_at, pages_modified_at, pages_crawled_at in rows:
+            if pages_crawled_at is None:
+                stale.append(report_id)
+            elif modified_at is not None:
+                if modified_at != pages_modified_at:
+                    stale.append(report_id)
+            elif max_age is not None and now - pages_crawled_at > max_age:
+                stale.append(report_id)
+        return stale
+
+    def store_pages(self, report_id, pages):
+        """Replace the pages of a report and remember which report version they belong to."""
+        with self._lock:
+            self._db.execute("DELETE FROM pages WHERE report_id = ?", (report_id,))
+            self._db.executemany(
+                "INSERT INTO pages (report_id, name, display_name, ordinal) VALUES (?, ?, ?, ?)",
+                [(report_id, p["name"], p.get("displayName"), p.get("order")) for p in pages]
+            )
+            self._db.execute(
+                "UPDATE reports SET pages_modified_at = modified_at, pages_crawled_at = ? WHERE id = ?",
+                (time.time(), report_id)
+            )
+            self._db.commit()
+
+    def export_targets(self, workspace_ids=None, dataset_id=None, report_like=None, page_like=None, export_format="PNG"):
+        """Select report pages from the catalog as export targets.
+
+        Args:
+            workspace_ids (list): Restrict to these workspaces.
+            dataset_id (str): Restrict to reports built on this dataset.
+            report_like (str): SQL LIKE pattern on the report name (case-insensitive).
+            page_like (str): SQL LIKE pattern on the page display name (case-insensitive).
+            export_format (str): Format of the returned targets.
+
+        Returns:
+            list: ExportTarget instances, ordered by workspace, report and page order.
+        """
+        from powerbi_export_engine import ExportTarget
+        query = ("SELECT r.id, p.name, r.workspace_id, w.capacity_id FROM pages p"
+                 " JOIN reports r ON r.id = p.report_id JOIN workspaces w ON w.id = r.workspace_id WHERE 1 = 1")
+        params = []
+        if workspace_ids:
+            query += f" AND r.workspace_id IN ({', '.join('?' * len(workspace_ids))})"
+            params.extend(workspace_ids)
+        if dataset_id:
+            query += " AND r.dataset_id = ?"
+            params.append(dataset_id)
+        if report_like:
+            query += " AND r.name LIKE ?"
+            params.append(report_like)
+        if page_like:
+            query += " AND p.display_name LIKE ?"
+            params.append(page_like)
+        query += " ORDER BY r.workspace_id, r.name, p.ordinal"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [ExportTarget(report_id, page_name, export_format, workspace_id, capacity_id)
+                for report_id, page_name, workspace_id, capacity_id in rows]
+
+    def counts(self):
+        """Return the number of catalogued workspaces, datasets, reports and pages."""
+        with self._lock:
+            return {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("workspaces", "datasets", "reports", "pages")}
+
+    def close(self):
+        """Close the catalog database."""
+        with self._lock:
+            self._db.close()
+
+
+class TenantCrawler:
+    """
+    Enumerates the tenant through the Power BI REST API and keeps an InventoryCatalog current.
+
+    Workspaces are listed with $top/$skip paging (following @odata.nextLink when the service
+    returns one); each workspace's datasets and reports are then listed concurrently, and report
+    pages are fetched only for reports that are new or whose modified timestamp changed since
+    their pages were last stored. With `skip_unchanged`, workspaces crawled before are listed again
+    only if the admin modified-workspaces API reports a change since; callers without Power BI
+    admin rights get every workspace listed.
+
+    Attributes:
+        token_getter (callable): Zero-argument function returning a Power BI access token.
+        catalog (InventoryCatalog): Catalog to update.
+        base_url (str): Power BI REST API base URL, overridable for local stubs.
+        max_concurrency (int): Maximum API calls in flight.
+        page_size (int): $top used when listing workspaces.
+        pages_max_age (float): Age in seconds after which pages of reports without a modified
+            timestamp are fetched again; None to keep them until a full crawl.
+        timeout (int): Timeout in seconds for each HTTP request.
+        skip_unchanged (bool): Skip workspaces the admin API reports as unchanged since their last crawl.
+    """
+
+    def __init__(self, token_getter, catalog, base_url=POWERBI_API_URL, max_concurrency=16, page_size=5000,
+                 pages_max_age=24 * 3600, timeout=60, skip_unchanged=True):
+        self.token_getter = token_getter
+        self.catalog = catalog
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self.pages_max_age = pages_max_age
+        self.timeout = timeout
+        self.skip_unchanged = skip_unchanged
+        self._session = get_session()
+
+    def crawl(self, workspace_ids=None, full=False):
+        """Refresh the catalog.
+
+        Args:
+            workspace_ids (list): Crawl only these workspaces; by default all workspaces visible to
+                the caller are listed, and workspaces that disappeared are removed from the catalog.
+            full (bool): List every workspace and fetch the pages of every report, not only changed ones.
+
+        Returns:
+            dict: Numbers of workspaces, datasets and reports listed, reports whose pages were
+                fetched, skipped unchanged and failed workspaces, plus the elapsed seconds.
+        """
+        started = time.perf_counter()
+        workspaces = self._list("/groups", paged=True)
+        if workspace_ids:
+            wanted = set(workspace_ids)
+            workspaces = [w for w in workspaces if w["id"] in wanted]
+        self.catalog.store_workspaces(workspaces, prune=not workspace_ids)
+
+        stats = {"workspaces": len(workspaces), "datasets": 0, "reports": 0, "reports_refreshed": 0,
+                 "skipped_workspaces": 0, "failed_workspaces": 0}
+        if self.skip_unchanged and not full:
+            changed = self._changed_workspaces(workspaces)
+            stats["skipped_workspaces"] = len(workspaces) - len(changed)
+            workspaces = changed
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            listings = executor.map(lambda w: self._list_workspace(w["id"]), workspaces)
+            page_jobs = []
+            for workspace, listing in zip(workspaces, listings):
+                if isinstance(listing, Exception):
+                    logger.error("Failed to crawl workspace %s: %s", workspace["id"], listing)
+                    stats["failed_workspaces"] += 1
+                    continue
+                datasets, reports = listing
+                self.catalog.store_workspace_contents(workspace["id"], datasets, reports)
+                stats["datasets"] += len(datasets)
+                stats["reports"] += len(reports)
+                stale = [r["id"] for r in reports] if full else \
+                    self.catalog.reports_needing_pages(workspace["id"], self.pages_max_age)
+                page_jobs.extend(executor.submit(self._crawl_pages, workspace["id"], report_id)
+                                 for report_id in stale)
+            for job in page_jobs:
+                stats["reports_refreshed"] += job.result()
+        stats["elapsed"] = round(time.perf_counter() - started, 2)
+        logger.info("Crawled %s", stats)
+        return stats
+
+    def _changed_workspaces(self, workspaces):
+        """Return the workspaces never crawled or modified since their last crawl, or all of them
+        if the admin API cannot tell."""
+        crawled = self.catalog.crawled_at()
+        last_crawls = [crawled[w["id"]] for w in workspaces if w["id"] in crawled]
+        if not last_crawls:
+            return workspaces
+        since = min(last_crawls) - MODIFIED_SINCE_MARGIN
+        if time.time() - since > MODIFIED_LOOKBACK_LIMIT:
+            return workspaces
+        try:
+            modified = self._modified_since(since)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            # The admin API needs Power BI admin rights (Tenant.Read.All) that many callers lack.
+            logger.info("Modified workspaces unavailable, listing every workspace: %s", e)
+            return workspaces
+        return [w for w in workspaces if w["id"] not in crawled or w["id"] in modified]
+
+    def _modified_since(self, since):
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S.0000000Z", time.gmtime(since))
+        response = self._session.get(f"{self.base_url}/admin/workspaces/modified", params={"modifiedSince": stamp},
+                                     headers=self._headers(), timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        # The API answers with a bare list of {"id": ...}.
+        items = body.get("value", []) if isinstance(body, dict) else body
+        return {item["id"] for item in items}
+
+    def _list_workspace(self, workspace_id):
+        try:
+            datasets = self._list(f"/groups/{workspace_id}/datasets")
+            reports = self._list(f"/groups/{workspace_id}/reports")
+            return datasets, reports
+        except Exception as e:
+            return e
+
+    def _crawl_pages(self, workspace_id, report_id):
+        try:
+            pages = self._list(f"/groups/{workspace_id}/reports/{report_id}/pages")
+        except Exception as e:
+            logger.warning("Failed to list pages of report %s: %s", report_id, e)
+            return 0
+        self.catalog.store_pages(report_id, pages)
+        return 1
+
+    def _list(self, path, paged=False):
+        items = []
+        url = f"{self.base_url}{path}"
+        params = {"$top": self.page_size, "$skip": 0} if paged else None
+        while url:
+            response = self._session.get(url, params=params, headers=self._headers(), timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            batch = body.get("value", [])
+            items.extend(batch)
+            if body.get("@odata.nextLink"):
+                url, params = body["@odata.nextLink"], None
+            elif paged and params is not None and len(batch) == self.page_size:
+                params = dict(params, **{"$skip": params["$skip"] + self.page_size})
+            else:
+                url = None
+        return items
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token_getter()}"}
+
+
+def _token_getter():
+    from powerbi_token_provider import get_token_provider, POWERBI_SCOPE
+    from settings_store import get_settings
+    settings = get_settings()
+    return get_token_provider().get_token(settings.require("TENANT_ID"), settings.require("CLIENT_ID"),
+                                          settings.require("CLIENT_SECRET"), POWERBI_SCOPE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Power BI tenant inventory.")
+    parser.add_argument("--db", default="./sandbox/inventory.sqlite", help="Path of the catalog database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    crawl = commands.add_parser("crawl", help="Refresh the catalog from the Power BI REST API.")
+    crawl.add_argument("--workspace", action="append", help="Crawl only this workspace (repeatable).")
+    crawl.add_argument("--full", action="store_true",
+                       help="List every workspace and fetch pages of every report, not only changed ones.")
+    crawl.add_argument("--concurrency", type=int, default=16)
+    crawl.add_argument("--base-url", default=POWERBI_API_URL)
+    targets = commands.add_parser("targets", help="Print report pages as a pages file for the export step.")
+    targets.add_argument("--workspace", action="append", help="Restrict to this workspace (repeatable).")
+    targets.add_argument("--dataset", help="Restrict to reports on this dataset.")
+    targets.add_argument("--report", help="LIKE pattern on report names.")
+    targets.add_argument("--page", help="LIKE pattern on page display names.")
+    targets.add_argument("--format", default="PNG")
+    targets.add_argument("--output", help="Write to this file instead of stdout.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    catalog = InventoryCatalog(args.db)
+    try:
+        if args.command == "crawl":
+            crawler = TenantCrawler(_token_getter, catalog, base_url=args.base_url, max_concurrency=args.concurrency)
+            print(json.dumps(crawler.crawl(args.workspace, args.full)))
+        else:
+            pages = [{"report_id": t.report_id, "page_name": t.page_name, "workspace_id": t.workspace_id,
+                      "capacity_id": t.capacity_id, "export_format": t.export_format}
+                     for t in catalog.export_targets(args.workspace, args.dataset, args.report, args.page, args.format)]
+            text = json.dumps(pages, indent=2)
+            if args.output:
+                with open(args.output, "w") as out:
+                    out.write(text)
+            else:
+                print(text)
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
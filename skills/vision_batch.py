@@ -0,0 +1,299 @@
+"""
+This module provides batched, concurrent GPT-4 Vision analysis with adaptive rate limiting.
+
+Many (image, question) pairs are queued by priority, questions about the same image are packed
+into one request, and requests are paced by a token bucket sized to the deployment's RPM and TPM
+limits. Throttled requests honour Retry-After and back off with jitter instead of failing the batch.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from openai import AsyncAzureOpenAI, RateLimitError, APIConnectionError, APIStatusError
+from image_handle import ImageHandle
+from response_cache import content_key
+from image_preprocess import prepare_for_vision
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """
+    Paces requests against per-minute request (RPM) and token (TPM) budgets.
+
+    Both buckets refill continuously. A 429 from the service pauses every caller until its
+    Retry-After has elapsed and temporarily lowers the refill rate, which then recovers
+    gradually as requests succeed. The budgets carry over between event loops, so one limiter can
+    pace consecutive `VisionBatchAnalyzer.run` calls.
+
+    Attributes:
+        rpm (int): Requests per minute allowed by the deployment.
+        tpm (int): Tokens per minute allowed by the deployment.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._scale = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = None
+        self._lock_loop = None
+
+    async def acquire(self, tokens):
+        """Wait until one request consuming `tokens` tokens fits in both budgets."""
+        tokens = min(tokens, self.tpm)
+        async with self._loop_lock():
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                request_wait = (1 - self._requests) * 60 / (self.rpm * self._scale)
+                token_wait = (tokens - self._tokens) * 60 / (self.tpm * self._scale)
+                await asyncio.sleep(max(request_wait, token_wait, 0.01))
+
+    def throttled(self, retry_after):
+        """Record a 429: pause all callers for `retry_after` seconds and slow the refill rate."""
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._scale = max(self._scale * 0.5, 0.1)
+
+    def succeeded(self):
+        """Record a successful request, letting a throttled refill rate recover."""
+        self._scale = min(self._scale * 1.1, 1.0)
+
+    def _loop_lock(self):
+        # An asyncio.Lock is bound to the loop it first waits on; each loop gets its own.
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm * self._scale / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm * self._scale / 60)
+
+
+class VisionBatchAnalyzer:
+    """
+    Answers many (image, question) pairs concurrently through the async Azure OpenAI client.
+
+    Attributes:
+        client (AsyncAzureOpenAI): Async client used for chat completion requests.
+        deployment (str): Name of the GPT-4 Vision deployment.
+        limiter (TokenBucketLimiter): Rate limiter sized to the deployment quotas.
+        max_concurrency (int): Number of requests in flight at once.
+        questions_per_request (int): Maximum questions about one image packed into a single request.
+        max_retries (int): Attempts per request before the pair is reported as failed.
+        max_tokens (int): Completion token budget per question.
+        temperature (float): Sampling temperature.
+        response_cache (ResponseCache): Optional cache shared with AnalyzeImageWithGPT4Vision.
+    """
+
+    def __init__(self, client=None, deployment=None, rpm=60, tpm=40000, max_concurrency=8,
+                 questions_per_request=5, max_retries=6, max_tokens=250, temperature=0.5, response_cache=None):
+        self.client = client or AsyncAzureOpenAI(
+            api_version="2024-02-01",
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY")
+        )
+        self.deployment = deployment or os.getenv("AZURE_OPENAI_MODEL_NAME")
+        self.limiter = TokenBucketLimiter(rpm, tpm)
+        self.max_concurrency = max_concurrency
+        self.questions_per_request = questions_per_request
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.response_cache = response_cache
+
+    async def analyze(self, pairs, priority=0):
+        """Answer every (image_file, question) pair and return one result per pair, in order.
+
+        Args:
+            pairs (list): (image_file, question) tuples.
+            priority (int or list): Queue priority for all pairs or per pair; lower runs first.
+
+        Returns:
+            list: Dictionaries with image_file, question and either answer or error.
+        """
+        priorities = priority if isinstance(priority, list) else [priority] * len(pairs)
+        results = [None] * len(pairs)
+        queue = asyncio.PriorityQueue()
+        sequence = 0
+
+        # Each image is decoded, resized, encoded and hashed once, off the event loop.
+        image_files = list(dict.fromkeys(image_file for image_file, _ in pairs))
+        prepared = dict(zip(image_files, await asyncio.gather(
+            *(asyncio.to_thread(self._prepare, image_file) for image_file in image_files), return_exceptions=True)))
+
+        by_image = {}
+        for index, (image_file, question) in enumerate(pairs):
+            image = prepared[image_file]
+            if isinstance(image, Exception):
+                results[index] = {"image_file": image_file, "question": question, "error": str(image)}
+                continue
+            cached = self._cached_answer(image["key"], question)
+            if cached is not None:
+                results[index] = {"image_file": image_file, "question": question, "answer": cached}
+                continue
+            by_image.setdefault(image_file, []).append((index, question, priorities[index]))
+
+        for image_file, items in by_image.items():
+            for start in range(0, len(items), self.questions_per_request):
+                group = items[start:start + self.questions_per_request]
+                queue.put_nowait((min(p for _, _, p in group), sequence, image_file, group))
+                sequence += 1
+
+        async def worker():
+            while True:
+                try:
+                    _, _, image_file, group = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._answer_group(image_file, prepared[image_file], group, results)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+        return results
+
+    def run(self, pairs, priority=0):
+        """Synchronous entry point wrapping `analyze` for callers without an event loop."""
+        return asyncio.run(self.analyze(pairs, priority))
+
+    async def _answer_group(self, image_file, image, group, results):
+        questions = [question for _, question, _ in group]
+        try:
+            answers = await self._ask(image, questions)
+        except Exception as e:
+            logger.error("Vision analysis failed for %s: %s", image_file, e)
+            for index, question, _ in group:
+                results[index] = {"image_file": image_file, "question": question, "error": str(e)}
+            return
+
+        if answers is None:
+            # The packed answer could not be parsed; ask each question on its own instead.
+            for item in group:
+                await self._answer_group(image_file, image, [item], results)
+            return
+
+        for (index, question, _), answer in zip(group, answers):
+            self._store_answer(image["key"], question, answer)
+            results[index] = {"image_file": image_file, "question": question, "answer": answer}
+
+    async def _ask(self, image, questions):
+        """Send one request for `questions` about a prepared image, retrying throttled and transient failures."""
+        if len(questions) == 1:
+            prompt = questions[0]
+        else:
+            numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+            prompt = ("Answer each of the following questions about the image. Respond only with a JSON object "
+                      "mapping each question number (as a string) to its answer.\n" + numbered)
+        max_tokens = self.max_tokens * len(questions)
+        estimated_tokens = len(prompt) // 4 + image["estimated_tokens"] + max_tokens
+        messages = [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image["data_url"]}}
+            ]
+        }]
+
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire(estimated_tokens)
+            try:
+                with span("vision.call", deployment=self.deployment, questions=len(questions)) as call_span:
+                    response = await self.client.chat.completions.create(
+                        model=self.deployment, messages=messages, max_tokens=max_tokens, temperature=self.temperature)
+                    usage = getattr(response, "usage", None)
+                    call_span.record_tokens(getattr(usage, "prompt_tokens", None),
+                                            getattr(usage, "completion_tokens", None))
+                self.limiter.succeeded()
+                break
+            except RateLimitError as e:
+                delay = _retry_after(e.response, attempt)
+                self.limiter.throttled(delay)
+                logger.warning("Vision request throttled, retrying in %.1fs", delay)
+            except (APIConnectionError, APIStatusError) as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status < 500:
+                    raise
+                delay = _backoff(attempt)
+                logger.warning("Vision request failed (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+        else:
+            raise RuntimeError(f"Vision request still failing after {self.max_retries} attempts")
+
+        text = (response.choices[0].message.content or "").strip() if response.choices else ""
+        if not text:
+            raise RuntimeError("Unexpected response format from GPT-4 Vision API.")
+        if len(questions) == 1:
+            return [text]
+        return parse_packed_answers(text, len(questions))
+
+    @staticmethod
+    def _prepare(image_file):
+        """Prepare an image for the model and return its data URL, estimated tokens and cache key."""
+        part = prepare_for_vision(image_file, tile=False)["parts"][0]
+        handle = ImageHandle.for_path(part["path"])
+        return {"data_url": handle.data_url(), "estimated_tokens": part["estimated_tokens"],
+                "key": content_key(handle.base64())}
+
+    def _cache_key(self, image_key, question):
+        # Same key layout as AnalyzeImageWithGPT4Vision.ask_gpt4_vision, so both paths share entries.
+        return content_key("AnalyzeImageWithGPT4Vision", image_key, question, self.max_tokens, self.temperature)
+
+    def _cached_answer(self, image_key, question):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(self._cache_key(image_key, question))
+
+    def _store_answer(self, image_key, question, answer):
+        if self.response_cache is not None:
+            self.response_cache.put(self._cache_key(image_key, question), "AnalyzeImageWithGPT4Vision", answer,
+                                    scope=image_key)
+
+
+def parse_packed_answers(text, count):
+    """Extract the numbered answers of a packed request, or None if the reply is not usable."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match is None:
+        return None
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return None
+    answers = [parsed.get(str(i)) for i in range(1, count + 1)]
+    if any(not isinstance(answer, str) or not answer.strip() for answer in answers):
+        return None
+    return [answer.strip() for answer in answers]
+
+
+def _backoff(attempt, base=1.0, cap=60.0):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _retry_after(response, attempt):
+    """Seconds to wait after a 429, from Retry-After headers when present, plus a little jitter."""
+    headers = getattr(response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) * scale + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+    return _backoff(attempt)
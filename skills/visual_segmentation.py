@@ -0,0 +1,490 @@
+"""
+This module finds the visual containers on an exported report page and indexes their boxes.
+
+Segmentation works on arrays throughout: the page is reduced to a coarse grid of content cells,
+background-colour runs shorter than the gutter width are closed so that each visual becomes one
+solid region, regions are labelled as connected components, and long thin lines along a box's
+edges mark it as a bordered container. The boxes are written to `<image>.visuals.json` next to
+the page, so skills can ask about one cropped visual, or send all visuals as one numbered grid,
+instead of the whole page.
+
+Usage:
+    python visual_segmentation.py page.png [page2.png ...] [--crops] [--grid]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image, ImageDraw
+from image_quality import content_mask, load_rgb, page_background, to_blocks
+from image_preprocess import encode_optimal, estimate_image_tokens
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".visuals.json"
+
+
+def close_runs(mask, max_gap, axis):
+    """Fill every run of False along `axis` that is shorter than `max_gap` and has True on both sides."""
+    moved = np.moveaxis(mask, axis, -1)
+    length = moved.shape[-1]
+    positions = np.broadcast_to(np.arange(length), moved.shape)
+    previous = np.maximum.accumulate(np.where(moved, positions, -1), axis=-1)
+    following = np.minimum.accumulate(np.where(moved, positions, length)[..., ::-1], axis=-1)[..., ::-1]
+    gap = following - previous - 1
+    closed = moved | ((previous >= 0) & (following < length) & (gap < max_gap))
+    return np.moveaxis(closed, -1, axis)
+
+
+def label_components(mask):
+    """Label the 4-connected components of a 2-D mask.
+
+    Every cell starts with its own label; each pass hooks a label onto the smallest label among its
+    neighbours and then compresses the label chains by pointer jumping, so the number of passes
+    grows with the logarithm of a component's size rather than its diameter.
+
+    Returns:
+        tuple: (labels, count), where labels is an int array with -1 outside the mask and
+            0..count-1 inside it.
+    """
+    size = mask.size
+    cells = np.flatnonzero(mask)
+    # Cells outside the mask point at a sentinel whose label never wins a minimum.
+    parent = np.full(size + 1, size, dtype=np.int64)
+    parent[cells] = cells
+    grid = parent[:size].reshape(mask.shape).copy()
+    while True:
+        lowest = grid.copy()
+        np.minimum(lowest[1:], grid[:-1], out=lowest[1:])
+        np.minimum(lowest[:-1], grid[1:], out=lowest[:-1])
+        np.minimum(lowest[:, 1:], grid[:, :-1], out=lowest[:, 1:])
+        np.minimum(lowest[:, :-1], grid[:, 1:], out=lowest[:, :-1])
+        roots = grid.ravel()[cells]
+        np.minimum.at(parent, roots, lowest.ravel()[cells])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        updated = parent[:size].reshape(mask.shape).copy()
+        if np.array_equal(updated, grid):
+            break
+        grid = updated
+    labels = np.full(size, -1, dtype=np.int64)
+    roots, labels[cells] = np.unique(grid.ravel()[cells], return_inverse=True)
+    return labels.reshape(mask.shape), roots.size
+
+
+def component_boxes(labels, count):
+    """Return a (count, 4) array of [top, left, bottom, right) cell bounds of each labelled component."""
+    rows, cols = np.nonzero(labels >= 0)
+    ids = labels[rows, cols]
+    boxes = np.empty((count, 4), dtype=np.int64)
+    for column, values, reducer in ((0, rows, np.minimum), (1, cols, np.minimum),
+                                    (2, rows + 1, np.maximum), (3, cols + 1, np.maximum)):
+        boxes[:, column] = values.max() + 1 if reducer is np.minimum else 0
+        reducer.at(boxes[:, column], ids, values)
+    return boxes
+
+
+def merge_boxes(boxes, attach_area, attach_distance):
+    """Merge overlapping boxes, then attach small boxes (titles, legends) to an adjacent larger box.
+
+    Args:
+        boxes (ndarray): (N, 4) [left, top, right, bottom) pixel boxes.
+        attach_area (int): Boxes smaller than this many pixels are candidates for attaching.
+        attach_distance (int): Maximum gap in pixels between a small box and the box it joins.
+
+    Returns:
+        ndarray: The merged boxes.
+    """
+    boxes = boxes.copy()
+    changed = True
+    while changed and len(boxes) > 1:
+        changed = False
+        left, top, right, bottom = (boxes[:, i, None] for i in range(4))
+        overlap = (np.minimum(right, right.T) > np.maximum(left, left.T)) & \
+                  (np.minimum(bottom, bottom.T) > np.maximum(top, top.T))
+        np.fill_diagonal(overlap, False)
+        if overlap.any():
+            changed = True
+            boxes = _union_groups(boxes, overlap)
+            continue
+        area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        # Distance between the facing edges, and the share of the small box's span the pair shares.
+        gap_y = np.maximum(top, top.T) - np.minimum(bottom, bottom.T)
+        gap_x = np.maximum(left, left.T) - np.minimum(right, right.T)
+        shared_x = -gap_x / (right - left)
+        shared_y = -gap_y / (bottom - top)
+        adjacent = (((gap_y <= attach_distance) & (shared_x >= 0.5)) |
+                    ((gap_x <= attach_distance) & (shared_y >= 0.5)))
+        adjacent &= (area[:, None] < attach_area) & (area[:, None] < area[None, :])
+        if adjacent.any():
+            # Each small box joins its largest neighbour.
+            small = np.flatnonzero(adjacent.any(axis=1))
+            target = np.where(adjacent[small], area[None, :], -1).argmax(axis=1)
+            pairs = np.zeros_like(adjacent)
+            pairs[small, target] = True
+            changed = True
+            boxes = _union_groups(boxes, pairs | pairs.T)
+    return boxes
+
+
+def reading_order(boxes):
+    """Return the indices of (N, 4) [left, top, right, bottom) boxes row by row, left to right.
+
+    A box starts a new row unless its top lies above the vertical centre of the row's first box.
+    """
+    rows = []
+    for index in np.argsort(boxes[:, 1], kind="stable"):
+        if rows and boxes[index, 1] < (boxes[rows[-1][0], 1] + boxes[rows[-1][0], 3]) / 2:
+            rows[-1].append(index)
+        else:
+            rows.append([index])
+    return [int(i) for row in rows for i in sorted(row, key=lambda i: boxes[i, 0])]
+
+
+def _union_groups(boxes, linked):
+    labels, count = _group_labels(linked)
+    merged = np.empty((count, 4), dtype=boxes.dtype)
+    merged[:, :2] = np.iinfo(boxes.dtype).max
+    merged[:, 2:] = np.iinfo(boxes.dtype).min
+    np.minimum.at(merged[:, 0], labels, boxes[:, 0])
+    np.minimum.at(merged[:, 1], labels, boxes[:, 1])
+    np.maximum.at(merged[:, 2], labels, boxes[:, 2])
+    np.maximum.at(merged[:, 3], labels, boxes[:, 3])
+    return merged
+
+
+def _group_labels(linked):
+    """Label the connected groups of a symmetric boolean adjacency matrix."""
+    labels = np.arange(len(linked))
+    while True:
+        lowest = np.where(linked, labels[None, :], labels[:, None]).min(axis=1)
+        lowest = np.minimum(labels, lowest)
+        lowest = lowest[lowest]
+        if np.array_equal(lowest, labels):
+            break
+        labels = lowest
+    return np.unique(labels, return_inverse=True)[1], np.unique(labels).size
+
+
+def compose_grid(img, boxes, background=(255, 255, 255), padding=4, spacing=12, label_height=20):
+    """Pack regions of an image into one image, each below a label with its 1-based number.
+
+    Regions are placed on shelves of roughly square overall shape, so the grid is usually far
+    smaller than the page when the regions leave much of the page empty.
+
+    Args:
+        img (Image): Source image.
+        boxes (list): [left, top, right, bottom] regions of `img`.
+        background (tuple): RGB colour of the space between regions.
+
+    Returns:
+        tuple: (grid image, cells), where cells is a list of {number, box} giving each region's
+            position in the grid.
+    """
+    img = img.convert("RGB")
+    width, height = img.size
+    crops = [(max(0, left - padding), max(0, top - padding), min(width, right + padding), min(height, bottom + padding))
+             for left, top, right, bottom in boxes]
+    sizes = [(right - left, bottom - top) for left, top, right, bottom in crops]
+    shelf_width = max(max(w for w, _ in sizes),
+                      int(math.sqrt(sum((w + spacing) * (h + spacing + label_height) for w, h in sizes))))
+    positions, x, y, shelf_height = [], spacing, spacing, 0
+    for w, h in sizes:
+        if x > spacing and x + w + spacing > shelf_width + 2 * spacing:
+            x, y = spacing, y + shelf_height + spacing
+            shelf_height = 0
+        positions.append((x, y))
+        x += w + spacing
+        shelf_height = max(shelf_height, h + label_height)
+    canvas_size = (max(px + w for (px, _), (w, _) in zip(positions, sizes)) + spacing, y + shelf_height + spacing)
+
+    canvas = Image.new("RGB", canvas_size, background)
+    draw = ImageDraw.Draw(canvas)
+    cells = []
+    for number, (crop, (px, py), (w, h)) in enumerate(zip(crops, positions, sizes), 1):
+        canvas.paste(img.crop(crop), (px, py + label_height))
+        draw.rectangle((px, py, px + 8 * len(str(number)) + 10, py + label_height - 4), fill=(0, 0, 0))
+        draw.text((px + 5, py + 3), str(number), fill=(255, 255, 255))
+        cells.append({"number": number, "box": [px, py + label_height, px + w, py + label_height + h]})
+    return canvas, cells
+
+
+def write_image(img, output_dir, name):
+    """Encode `img` for the vision model as `<output_dir>/<name>.png` or `.jpeg`, unless already written.
+
+    Returns:
+        dict: path, size and estimated_tokens.
+    """
+    existing = [os.path.join(output_dir, f"{name}.{ext}") for ext in ("png", "jpeg")]
+    path = next((p for p in existing if os.path.exists(p)), None)
+    if path is None:
+        os.makedirs(output_dir, exist_ok=True)
+        image_format, data = encode_optimal(img)
+        path = os.path.join(output_dir, f"{name}.{image_format}")
+        temp_path = f"{path}.part"
+        with open(temp_path, "wb") as out:
+            out.write(data)
+        os.replace(temp_path, path)
+    return {"path": path, "size": img.size, "estimated_tokens": estimate_image_tokens(*img.size)}
+
+
+class VisualSegmenter:
+    """
+    Splits a report page into the bounding boxes of its visuals.
+
+    Attributes:
+        cell (int): Side in pixels of the grid cells the page is reduced to.
+        gutter (int): Background runs at least this many pixels long separate visuals; shorter runs
+            (between bars, words or chart lines) are closed.
+        ink_threshold (int): Channel difference from the page background above which a pixel is content.
+        min_side (int): Boxes narrower or shorter than this many pixels are dropped.
+        min_area_ratio (float): Boxes covering less than this share of the page are dropped, unless
+            they attach to a neighbouring visual.
+        attach_ratio (float): Boxes smaller than this share of the page join an adjacent visual
+            within `gutter * 2` pixels, such as a title above a borderless chart.
+        border_coverage (float): Share of an edge that must be drawn as a line for it to count as a border.
+    """
+
+    def __init__(self, cell=4, gutter=12, ink_threshold=24, min_side=16, min_area_ratio=0.001,
+                 attach_ratio=0.02, border_coverage=0.9):
+        self.cell = cell
+        self.gutter = gutter
+        self.ink_threshold = ink_threshold
+        self.min_side = min_side
+        self.min_area_ratio = min_area_ratio
+        self.attach_ratio = attach_ratio
+        self.border_coverage = border_coverage
+
+    @property
+    def parameters(self):
+        return dict(vars(self))
+
+    def segment(self, image):
+        """Find the visuals of one page.
+
+        Args:
+            image (str or ndarray or Image): Path to the image, an (H, W, 3) uint8 array or a PIL image.
+
+        Returns:
+            dict: size [width, height], background "#rrggbb", visuals (a list of {id, box [left, top,
+                right, bottom], area_ratio, ink_ratio, bordered} in reading order) and elapsed_ms.
+        """
+        started = time.perf_counter()
+        rgb = load_rgb(image)
+        height, width = rgb.shape[:2]
+        planes = np.moveaxis(rgb, -1, 0).copy()
+        background = page_background(planes)
+        ink = content_mask(planes, background, self.ink_threshold)
+
+        # Coarse grid: a cell is content if any of its pixels is; the ragged edge gets its own cells.
+        cell = self.cell
+        padded = np.zeros((math.ceil(height / cell) * cell, math.ceil(width / cell) * cell), dtype=bool)
+        padded[:height, :width] = ink
+        grid = to_blocks(padded, cell).any(axis=2)
+        # Background runs shorter than a gutter lie inside a visual.
+        max_gap = max(1, math.ceil(self.gutter / cell))
+        closed = close_runs(close_runs(grid, max_gap, axis=1), max_gap, axis=0)
+        labels, count = label_components(closed)
+        if count == 0:
+            return self._result(width, height, background, [], started)
+
+        cell_boxes = component_boxes(labels, count)
+        boxes = np.stack([cell_boxes[:, 1], cell_boxes[:, 0], cell_boxes[:, 3], cell_boxes[:, 2]], axis=1) * cell
+        boxes = np.minimum(boxes, [width, height, width, height])
+        boxes = self._tighten(ink, boxes)
+        page_area = width * height
+        boxes = merge_boxes(boxes, self.attach_ratio * page_area, self.gutter * 2)
+        boxes = self._tighten(ink, boxes)
+
+        sides = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        keep = (sides >= self.min_side) & (areas >= self.min_area_ratio * page_area)
+        boxes = boxes[keep]
+        order = reading_order(boxes)
+
+        visuals = []
+        for number, index in enumerate(order, 1):
+            left, top, right, bottom = (int(v) for v in boxes[index])
+            region = ink[top:bottom, left:right]
+            visuals.append({
+                "id": number,
+                "box": [left, top, right, bottom],
+                "area_ratio": round(region.size / page_area, 4),
+                "ink_ratio": round(float(region.mean()), 4),
+                "bordered": bool(self._bordered(planes, ink, (left, top, right, bottom)))
+            })
+        return self._result(width, height, background, visuals, started)
+
+    def _tighten(self, ink, boxes):
+        """Shrink each box to the content pixels inside it; the coarse grid rounds boxes outwards."""
+        tightened = boxes.copy()
+        for row, (left, top, right, bottom) in enumerate(boxes):
+            region = ink[top:bottom, left:right]
+            rows = np.flatnonzero(region.any(axis=1))
+            if rows.size == 0:
+                continue
+            cols = np.flatnonzero(region.any(axis=0))
+            tightened[row] = (left + cols[0], top + rows[0], left + cols[-1] + 1, top + rows[-1] + 1)
+        return tightened
+
+    def _bordered(self, planes, ink, box):
+        """Whether at least three edges of the box are drawn as thin lines distinct from the interior."""
+        left, top, right, bottom = box
+        if right - left < 8 or bottom - top < 8:
+            return False
+        edges = (
+            (ink[top, left:right], planes[:, top, left:right], planes[:, top + 3, left:right]),
+            (ink[bottom - 1, left:right], planes[:, bottom - 1, left:right], planes[:, bottom - 4, left:right]),
+            (ink[top:bottom, left], planes[:, top:bottom, left], planes[:, top:bottom, left + 3]),
+            (ink[top:bottom, right - 1], planes[:, top:bottom, right - 1], planes[:, top:bottom, right - 4])
+        )
+        drawn = 0
+        for line, colors, inside in edges:
+            # A filled box has the same colour on its edge and just inside it; a border does not.
+            differs = np.abs(colors.astype(np.int16) - inside).max(axis=0) > self.ink_threshold
+            drawn += (line & differs).mean() >= self.border_coverage
+        return drawn >= 3
+
+    def _result(self, width, height, background, visuals, started):
+        return {
+            "size": [width, height],
+            "background": "#{:02x}{:02x}{:02x}".format(*(int(v) for v in background)),
+            "visuals": visuals,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+
+class VisualIndex:
+    """
+    Keeps the segmentation of each page in `<image>.visuals.json` next to the image.
+
+    Entries record the image's size and modification time and the segmenter's parameters, and are
+    recomputed when either changes. Crops and grids are written under `output_dir` with names
+    derived from the same fingerprint, so repeated requests reuse them.
+
+    Attributes:
+        segmenter (VisualSegmenter): Segmenter used for pages without a current entry.
+        output_dir (str): Directory for cropped visuals and grids.
+    """
+
+    def __init__(self, segmenter=None, output_dir="./sandbox/visuals"):
+        self.segmenter = segmenter or VisualSegmenter()
+        self.output_dir = output_dir
+
+    @staticmethod
+    def path_for(image_path):
+        return image_path + INDEX_SUFFIX
+
+    def get(self, image_path):
+        """Return the index entry of a page, segmenting it if there is no current entry."""
+        fingerprint = self._fingerprint(image_path)
+        index_path = self.path_for(image_path)
+        try:
+            with open(index_path) as f:
+                entry = json.load(f)
+            if entry.get("fingerprint") == fingerprint:
+                return entry
+        except (OSError, ValueError):
+            pass
+
+        entry = {"image": os.path.basename(image_path), "fingerprint": fingerprint,
+                 "segmenter": self.segmenter.parameters}
+        entry.update(self.segmenter.segment(image_path))
+        temp_path = f"{index_path}.part"
+        with open(temp_path, "w") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(temp_path, index_path)
+        logger.info("Segmented %s into %d visual(s) in %.0f ms", image_path, len(entry["visuals"]),
+                    entry["elapsed_ms"])
+        return entry
+
+    def visual(self, image_path, visual_id):
+        """Return one visual of a page by id, raising KeyError if the page has no such visual."""
+        for visual in self.get(image_path)["visuals"]:
+            if visual["id"] == visual_id:
+                return visual
+        raise KeyError(f"{image_path} has no visual {visual_id}")
+
+    def crop(self, image_path, visual_ids=None, padding=4):
+        """Write the selected visuals (all by default) as separate images sized for the vision model.
+
+        Returns:
+            list: One {id, box, path, size, estimated_tokens} per visual.
+        """
+        entry = self.get(image_path)
+        visuals = [v for v in entry["visuals"] if visual_ids is None or v["id"] in visual_ids]
+        width, height = entry["size"]
+        crops = []
+        with Image.open(image_path) as img:
+            for visual in visuals:
+                left, top, right, bottom = visual["box"]
+                box = (max(0, left - padding), max(0, top - padding),
+                       min(width, right + padding), min(height, bottom + padding))
+                crops.append(self._write(img.convert("RGB").crop(box), f"{entry['fingerprint']}_v{visual['id']}",
+                                         visual))
+        return crops
+
+    def grid(self, image_path, visual_ids=None, padding=4, spacing=12, label_height=20):
+        """Pack the selected visuals (all by default) into one image, each under a numbered label.
+
+        Returns:
+            dict: path, size, estimated_tokens and cells, a list of {number, id, box} where box is the
+                visual's position in the grid.
+        """
+        entry = self.get(image_path)
+        visuals = [v for v in entry["visuals"] if visual_ids is None or v["id"] in visual_ids]
+        if not visuals:
+            raise ValueError(f"{image_path} has no visuals to arrange")
+        background = tuple(int(entry["background"][i:i + 2], 16) for i in (1, 3, 5))
+        with Image.open(image_path) as img:
+            canvas, cells = compose_grid(img, [v["box"] for v in visuals], background, padding, spacing, label_height)
+        for cell, visual in zip(cells, visuals):
+            cell["id"] = visual["id"]
+
+        ids = ",".join(str(v["id"]) for v in visuals)
+        name = f"{entry['fingerprint']}_grid_{hashlib.sha256(ids.encode()).hexdigest()[:8]}"
+        return dict(write_image(canvas, self.output_dir, name), cells=cells)
+
+    def _write(self, img, name, visual):
+        return {"id": visual["id"], "box": visual["box"], **write_image(img, self.output_dir, name)}
+
+    def _fingerprint(self, image_path):
+        stat = os.stat(image_path)
+        parameters = json.dumps(self.segmenter.parameters, sort_keys=True)
+        return hashlib.sha256(f"{stat.st_size}|{stat.st_mtime_ns}|{parameters}".encode()).hexdigest()[:16]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the visuals on exported report pages.")
+    parser.add_argument("images", nargs="+", help="Page images or glob patterns.")
+    parser.add_argument("--crops", action="store_true", help="Also write each visual as a separate image.")
+    parser.add_argument("--grid", action="store_true", help="Also write all visuals as one numbered grid.")
+    parser.add_argument("--output-dir", default="./sandbox/visuals", help="Directory for crops and grids.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    paths = [p for pattern in args.images for p in (sorted(glob.glob(pattern)) or [pattern])]
+    index = VisualIndex(output_dir=args.output_dir)
+    for path in paths:
+        entry = index.get(path)
+        report = {"image": path, "visuals": entry["visuals"]}
+        if args.crops:
+            report["crops"] = index.crop(path)
+        if args.grid and entry["visuals"]:
+            report["grid"] = index.grid(path)
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
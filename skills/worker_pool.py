@@ -0,0 +1,264 @@
+"""
+This module runs skill chains from the job queue in a pool of worker processes.
+
+Usage:
+    python worker_pool.py enqueue ../workflows/Workflow_PowerBIReportVisionAnalyzer.json pages.json [--priority N]
+    python worker_pool.py work [--processes N] [--exit-when-idle]
+    python worker_pool.py stats | dead | requeue [JOB_ID ...]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import requests
+from job_queue import JobQueue
+from run_checkpoint import RunCheckpoint, page_key
+from skill_registry import get_registry
+from workflow_executor import WorkflowError, load_workflow, resolve_skill, run_step
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error):
+    """Return False for errors that will fail the same way on every attempt.
+
+    Skills wrap errors in SkillExecutionError, so the whole cause chain is inspected: connection
+    errors, timeouts, 429 and 5xx responses are transient; unknown skills and malformed jobs are not.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        if isinstance(error, (WorkflowError, KeyError, TypeError)):
+            return False
+        error = error.__cause__ or error.__context__
+    return True
+
+
+class JobRunner:
+    """
+    Runs leased jobs in the current process.
+
+    Skills are resolved through the registry and constructed once per process, so their caches,
+    clients and pooled connections are reused across jobs. A job whose payload carries a
+    `run_id` checkpoints every step, so a retried job resumes after its last completed step.
+
+    Attributes:
+        queue (JobQueue): The queue jobs are leased from.
+        worker_id (str): Identifies this worker in leases.
+        lease_seconds (float): Lease length; the lease is renewed in the background while a job runs.
+        runs_dir (str): Directory of run checkpoints.
+    """
+
+    def __init__(self, queue, worker_id, lease_seconds=300.0, runs_dir="./sandbox/runs"):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.runs_dir = runs_dir
+        self._skills = {}
+        self._checkpoints = {}
+
+    def run_forever(self, idle_sleep=2.0, exit_when_idle=False, max_jobs=None):
+        """Lease and run jobs until the queue is empty (with `exit_when_idle`) or `max_jobs` ran."""
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            job = self.queue.lease(self.worker_id, self.lease_seconds)
+            if job is None:
+                if exit_when_idle:
+                    break
+                time.sleep(idle_sleep)
+                continue
+            self.run_job(job)
+            processed += 1
+        for checkpoint in self._checkpoints.values():
+            checkpoint.close()
+        self._checkpoints.clear()
+        return processed
+
+    def run_job(self, job):
+        """Run one leased job and record its outcome in the queue."""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        heartbeat.start()
+        started = time.perf_counter()
+        try:
+            item = self._run_chain(job)
+        except Exception as e:
+            status = self.queue.fail(job, f"{type(e).__name__}: {e}", retryable=is_retryable(e))
+            logger.error("Job %s failed on attempt %d (%s): %s", job.id, job.attempts, status, e)
+        else:
+            self.queue.complete(job, item)
+            logger.info("Job %s done in %.1fs", job.id, time.perf_counter() - started)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def _run_chain(self, job):
+        item = dict(job.payload)
+        checkpoint = self._checkpoint(item.get("run_id"))
+        key = page_key(job.payload)
+        completed = checkpoint.completed_steps(key) if checkpoint else {}
+        for position, name in enumerate(job.chain):
+            step_id = f"{position + 1}:{name}"
+            if step_id in completed:
+                item.update(completed[step_id])
+                continue
+            spec = resolve_skill(name)
+            if spec is None:
+                raise WorkflowError(f"Unknown skill: {name}")
+            if spec.name not in self._skills:
+                self._skills[spec.name] = get_registry().create(spec.name)
+            try:
+                item = run_step(spec, self._skills[spec.name], item)
+            except Exception as e:
+                if checkpoint:
+                    checkpoint.record_failed(key, step_id, f"{type(e).__name__}: {e}")
+                raise
+            if checkpoint:
+                item = checkpoint.record_done(key, step_id, item)
+                # Later steps of this page are invalidated once an earlier one re-ran.
+                completed = {}
+        return item
+
+    def _checkpoint(self, run_id):
+        if not run_id:
+            return None
+        if run_id not in self._checkpoints:
+            self._checkpoints[run_id] = RunCheckpoint(run_id, self.runs_dir)
+        return self._checkpoints[run_id]
+
+    def _heartbeat(self, job, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            if not self.queue.extend(job, self.lease_seconds):
+                logger.warning("Lost the lease on job %s", job.id)
+                return
+
+
+def _worker_main(db_path, worker_id, lease_seconds, exit_when_idle, runs_dir, log_level):
+    logging.basicConfig(level=log_level, format=f"%(asctime)s {worker_id} %(levelname)s %(name)s: %(message)s")
+    queue = JobQueue(db_path)
+    try:
+        JobRunner(queue, worker_id, lease_seconds, runs_dir).run_forever(exit_when_idle=exit_when_idle)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+class WorkerPool:
+    """
+    Starts one worker process per core, each leasing jobs from the shared queue.
+
+    Processes are started with the "spawn" method so every worker begins from a clean interpreter
+    and imports only the skills its jobs use. Worker ids include the host name, so workers on
+    several nodes sharing the queue database can be told apart in leases and logs.
+
+    Attributes:
+        db_path (str): Path of the queue database.
+        processes (int): Number of worker processes.
+        lease_seconds (float): Lease length for each job.
+        runs_dir (str): Directory of run checkpoints.
+    """
+
+    def __init__(self, db_path="./sandbox/jobs.sqlite", processes=None, lease_seconds=300.0,
+                 runs_dir="./sandbox/runs"):
+        self.db_path = db_path
+        self.processes = processes or os.cpu_count() or 1
+        self.lease_seconds = lease_seconds
+        self.runs_dir = runs_dir
+
+    def run(self, exit_when_idle=False):
+        """Run the workers until they exit (when idle, if requested) or the pool is interrupted."""
+        context = multiprocessing.get_context("spawn")
+        host = socket.gethostname()
+        workers = [
+            context.Process(
+                target=_worker_main,
+                args=(self.db_path, f"{host}-{os.getpid()}-{n}", self.lease_seconds, exit_when_idle,
+                      self.runs_dir, logging.getLogger().level or logging.INFO),
+                name=f"skill-worker-{n}"
+            )
+            for n in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Jobs of interrupted workers become available again when their leases expire.
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Job queue and worker pool for skill chains.")
+    parser.add_argument("--db", default="./sandbox/jobs.sqlite", help="Path of the queue database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add one job per page for a workflow's skill chain.")
+    enqueue.add_argument("workflow", help="Workflow JSON file whose steps form the skill chain.")
+    enqueue.add_argument("pages", help="JSON file listing the pages.")
+    enqueue.add_argument("--priority", type=int, default=0)
+    enqueue.add_argument("--max-attempts", type=int, default=5)
+    enqueue.add_argument("--run-id", help="Checkpoint every step under this run id.")
+    enqueue.add_argument("--skip-missing", action="store_true", help="Leave out steps whose skill does not exist.")
+
+    work = commands.add_parser("work", help="Run worker processes.")
+    work.add_argument("--processes", type=int, default=None)
+    work.add_argument("--lease-seconds", type=float, default=300.0)
+    work.add_argument("--exit-when-idle", action="store_true")
+    work.add_argument("--runs-dir", default="./sandbox/runs")
+
+    commands.add_parser("stats", help="Show the number of jobs per status.")
+    commands.add_parser("dead", help="List dead-lettered jobs.")
+    requeue = commands.add_parser("requeue", help="Requeue dead-lettered jobs.")
+    requeue.add_argument("job_ids", nargs="*", type=int)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "work":
+        WorkerPool(args.db, args.processes, args.lease_seconds, args.runs_dir).run(args.exit_when_idle)
+        return 0
+
+    queue = JobQueue(args.db)
+    try:
+        if args.command == "enqueue":
+            _, steps = load_workflow(args.workflow, skip_missing=args.skip_missing)
+            chain = [step.skill for step in steps]
+            with open(args.pages) as f:
+                pages = json.load(f)
+            for page in pages:
+                if args.run_id:
+                    page = dict(page, run_id=args.run_id)
+                queue.enqueue(page, chain, args.priority, args.max_attempts,
+                              dedup_key=f"{args.run_id or ''}|{page_key(page)}|{'>'.join(chain)}")
+            print(f"Enqueued {len(pages)} job(s): {' -> '.join(chain)}")
+        elif args.command == "stats":
+            print(json.dumps(queue.stats()))
+        elif args.command == "dead":
+            for job_id, payload, chain, attempts, error in queue.dead_letters():
+                print(f"{job_id}\t{attempts}\t{json.dumps(payload)}\t{error}")
+        elif args.command == "requeue":
+            print(f"Requeued {queue.requeue_dead(args.job_ids or None)} job(s)")
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+"""
+This module executes the workflow JSON files as pipelined DAGs of skills over many report pages.
+
+Usage:
+    python workflow_executor.py ../workflows/Workflow_PowerBIReportVisionAnalyzer.json pages.json [--output results.json]
+    python workflow_executor.py --resume <run_id>
+
+`pages.json` is a list of objects with at least report_id and page_name (optionally workspace_id,
+export_format and question).
+"""
+
+import argparse
+import inspect
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from run_checkpoint import RunCheckpoint, page_key
+from skill_registry import get_registry
+from telemetry import OTLPExporter, span, start_metrics_server
+
+# Fields of the export result describing how the page changed since its last full analysis.
+CHANGE_FIELDS = ("change_key", "change_question", "page_change", "change_score", "changed_regions", "previous_answer")
+
+DEFAULT_QUESTION = "Review this report page for design quality, clarity and readability."
+
+# Names used by the workflow files for skills whose declared name differs.
+SKILL_ALIASES = {
+    "DesignRecommendations": "GenerateDesignRecommendations",
+    "StoryTeller": "PowerBIStoryteller",
+    "Skill_StoryTeller": "PowerBIStoryteller",
+}
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class WorkflowError(Exception):
+    """Raised when a workflow file cannot be loaded or one of its skills cannot be resolved."""
+
+
+class WorkflowStep:
+    """
+    One step of a workflow: a skill and the steps whose output it needs.
+
+    Attributes:
+        number (int): The step's "Step" number.
+        skill (str): Skill name as written in the workflow file.
+        spec (SkillSpec): The resolved skill, or None if it could not be resolved.
+        depends_on (list): Step numbers this step waits for; defaults to the previous step.
+        description (str): The step's description.
+    """
+
+    def __init__(self, number, skill, spec, depends_on, description=""):
+        self.number = number
+        self.skill = skill
+        self.spec = spec
+        self.depends_on = depends_on
+        self.description = description
+
+    def __repr__(self):
+        return f"WorkflowStep({self.number}, {self.skill!r}, depends_on={self.depends_on})"
+
+
+def resolve_skill(name, registry=None):
+    """Return the SkillSpec for a skill name used in a workflow file, or None if there is none."""
+    registry = registry or get_registry()
+    candidates = [name, SKILL_ALIASES.get(name), name[len("Skill_"):] if name.startswith("Skill_") else None]
+    for candidate in candidates:
+        if candidate and candidate in registry:
+            return registry.spec(candidate)
+    lowered = name.lower().replace("skill_", "")
+    for known in registry.names():
+        if known.lower() == lowered:
+            return registry.spec(known)
+    return None
+
+
+def load_workflow(path, registry=None, skip_missing=False):
+    """Load a workflow file and resolve each step's skill without importing it.
+
+    A step may list "DependsOn" step numbers to form a DAG, otherwise it depends on the step before
+    it. Steps are returned in dependency order (by "Step" number among steps that are ready at the
+    same time), so consumers that walk them in sequence, such as checkpoint restore and the job
+    queue's skill chains, never meet a step before its dependencies.
+
+    Args:
+        path (str): Path of the workflow JSON file.
+        registry (SkillRegistry): Registry used to resolve skill names.
+        skip_missing (bool): Drop steps whose skill does not exist instead of raising; their
+            dependants inherit their dependencies.
+
+    Returns:
+        tuple: The workflow name and the list of WorkflowSteps.
+
+    Raises:
+        WorkflowError: If the file is invalid, the dependencies form a cycle or, unless
+            `skip_missing`, a skill is unknown.
+    """
+    try:
+        with open(path) as f:
+            definition = json.load(f)
+        raw_steps = sorted(definition["Steps"], key=lambda s: s["Step"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise WorkflowError(f"Invalid workflow file {path}: {e}") from e
+
+    steps = []
+    previous = None
+    for raw in raw_steps:
+        depends_on = raw.get("DependsOn", [previous] if previous is not None else [])
+        steps.append(WorkflowStep(raw["Step"], raw["Skill"], resolve_skill(raw["Skill"], registry),
+                                  list(depends_on), raw.get("Description", "")))
+        previous = raw["Step"]
+
+    missing = [step for step in steps if step.spec is None]
+    if missing and not skip_missing:
+        raise WorkflowError(f"Unknown skill(s) in {path}: {', '.join(step.skill for step in missing)}")
+    by_number = {step.number: step for step in steps}
+    for step in missing:
+        logger.warning("Skipping step %s: skill %s not found", step.number, step.skill)
+
+    def resolved_dependencies(numbers):
+        result = []
+        for number in numbers:
+            if number not in by_number:
+                raise WorkflowError(f"Step depends on unknown step {number} in {path}")
+            dependency = by_number[number]
+            result.extend(resolved_dependencies(dependency.depends_on) if dependency.spec is None else [number])
+        return list(dict.fromkeys(result))
+
+    kept = [step for step in steps if step.spec is not None]
+    for step in kept:
+        step.depends_on = resolved_dependencies(step.depends_on)
+    return definition.get("Workflow", path), dependency_order(kept, path)
+
+
+def dependency_order(steps, path="workflow"):
+    """Return `steps` topologically sorted by their dependencies, lowest step number first among ready steps.
+
+    Raises:
+        WorkflowError: If the dependencies form a cycle.
+    """
+    ordered = []
+    done = set()
+    remaining = list(steps)
+    while remaining:
+        ready = next((step for step in remaining if all(d in done for d in step.depends_on)), None)
+        if ready is None:
+            raise WorkflowError(f"Cyclic step dependencies in {path}: {remaining}")
+        ordered.append(ready)
+        done.add(ready.number)
+        remaining.remove(ready)
+    return ordered
+
+
+def run_step(spec, skill, item):
+    """Run one skill on one page item and return the item extended with the skill's output.
+
+    Skills are adapted by kind: the export skill writes the page to disk, adds `image_file` and
+    compares it with the export of its last full analysis; after an ImageQualityReview the vision
+    skill is asked only about the criteria the page failed. Baselines are kept per question (the
+    set of quality questions, when the review chose them), so the vision skill reuses the analysis
+    of an unchanged page and is asked only about the changed regions of a slightly changed one;
+    skills with an input schema get the matching item fields and their output merged in; plain
+    functions get their parameters from the item and their result stored under the skill name.
+    """
+    item = dict(item)
+    if spec.name == "ExportPowerBIReportAsImage":
+        from powerbi_export_engine import ExportTarget
+        target = ExportTarget(item["report_id"], item["page_name"], item.get("export_format", "PNG"),
+                              item.get("workspace_id"), item.get("capacity_id"))
+        question = item.get("question", DEFAULT_QUESTION)
+        result = skill.export_report_pages([target], detect_changes=True, change_question=question)[0]
+        if isinstance(result, Exception):
+            raise result
+        item.update(image_file=result["file_path"], export_cached=result.get("cached", False))
+        if "change_key" in result:
+            item["change_question"] = question
+        item.update({k: v for k, v in result.items() if k in CHANGE_FIELDS})
+        return item
+    if spec.name == "GenerateDesignRecommendations":
+        item.setdefault("insights", " ".join(filter(None, (item.get("answer"), item.get("quality_summary")))))
+    elif spec.name == "AnalyzeImageWithGPT4Vision":
+        from page_changes import CHANGED, UNCHANGED, change_key, get_change_detector
+        if "question" not in item and "quality_questions" in item:
+            # The local quality review decides what is worth asking; a page that passed every
+            # criterion is not sent to the vision model at all.
+            if not item["quality_questions"]:
+                item.update(answer="", analysis_skipped=True)
+                return item
+            item["question"] = " ".join(item["quality_questions"])
+        item.setdefault("question", DEFAULT_QUESTION)
+        if "change_key" in item and item["change_question"] != item["question"]:
+            # The export compared the page with the baseline of the question known then; the
+            # quality review has since picked other questions, whose answers have their own baseline.
+            for field in CHANGE_FIELDS:
+                item.pop(field, None)
+            key = change_key(item["report_id"], item["page_name"], item["question"])
+            item.update(get_change_detector().compare(key, item["image_file"]), change_key=key,
+                        change_question=item["question"])
+        if item.get("page_change") == UNCHANGED:
+            # Nothing on the page moved since its last full analysis, which still describes it.
+            item.update(answer=item["previous_answer"], analysis_skipped=True)
+            return item
+        if item.get("page_change") == CHANGED:
+            item["regions"] = item["changed_regions"]
+            item["question"] = f"These parts of the page changed since it was last reviewed. {item['question']}"
+    elif spec.name == "PowerBIStoryteller":
+        item.setdefault("data", item.get("answer"))
+        item.setdefault("visuals", item.get("image_file"))
+
+    if hasattr(skill, "execute"):
+        properties = getattr(skill, "input_schema", {}).get("properties")
+        input_data = {k: v for k, v in item.items() if properties is None or k in properties}
+        output = skill.execute(input_data)
+        if isinstance(output, dict):
+            item.update(output)
+        else:
+            item[spec.name] = output
+        if spec.name == "AnalyzeImageWithGPT4Vision" and "change_key" in item:
+            _record_analysis(item)
+        return item
+    parameters = inspect.signature(skill).parameters
+    item[spec.name] = skill(**{name: item.get(name) for name in parameters})
+    return item
+
+
+def _record_analysis(item):
+    """Keep a full-page analysis as the new baseline of its page and question, or append an analysis
+    of the changed regions to the baseline's.
+
+    The baseline is keyed by the question it answers, so it is only reused for the same question:
+    the default one, a custom one or the set of quality questions an ImageQualityReview chose.
+    """
+    from page_changes import CHANGED, get_change_detector
+    if item.get("page_change") == CHANGED:
+        item["answer"] = f"{item['previous_answer']}\n\nChanges since the last full review: {item['answer']}"
+    elif item.get("answer"):
+        get_change_detector().record(item["change_key"], item["image_file"], item["answer"])
+
+
+class PipelineExecutor:
+    """
+    Runs workflow steps over many pages as a pipeline.
+
+    Every step is a stage with its own worker threads and a bounded input queue. A page moves to a
+    step as soon as all the steps it depends on have finished for that page, so page N+1 is being
+    exported while page N is analysed, and a multi-page run takes roughly the slowest stage's time
+    per page rather than the sum of all stages. When a stage falls behind its queue fills up and
+    upstream workers block on it, which in turn stops new pages being admitted (backpressure),
+    keeping memory and in-flight API work bounded.
+
+    A page whose step fails is reported with the error and skips its remaining steps; other pages
+    carry on. With a RunCheckpoint, every completed step is persisted as it finishes and steps
+    already completed in an earlier attempt of the run are not executed again.
+
+    Attributes:
+        steps (list): The WorkflowSteps to run.
+        concurrency (dict): Worker threads per step, keyed by step number or skill name; default 1.
+        queue_size (int): Capacity of each stage's input queue.
+        registry (SkillRegistry): Registry used to import and construct the skills.
+        checkpoint (RunCheckpoint): Where step results are persisted and resumed from, or None.
+    """
+
+    def __init__(self, steps, concurrency=None, queue_size=2, registry=None, checkpoint=None):
+        if not steps:
+            raise WorkflowError("Workflow has no runnable steps")
+        self.steps = steps
+        self.concurrency = concurrency or {}
+        self.queue_size = queue_size
+        self.registry = registry or get_registry()
+        self.checkpoint = checkpoint
+        self._dependants = {step.number: [s for s in steps if step.number in s.depends_on] for step in steps}
+
+    @classmethod
+    def from_file(cls, path, skip_missing=False, **options):
+        """Build an executor for a workflow file."""
+        _, steps = load_workflow(path, options.get("registry"), skip_missing)
+        return cls(steps, **options)
+
+    def run(self, pages):
+        """Run every step over every page.
+
+        Args:
+            pages (iterable): Page items, e.g. {"report_id": ..., "page_name": ...}. Consumed lazily.
+
+        Returns:
+            list: One result per page, in input order, with the final item, the error (None on
+                success), the failed step, per-step timings in seconds and the steps resumed
+                from the checkpoint.
+        """
+        skills = {step.number: self.registry.create(step.spec.name) for step in self.steps}
+        queues = {step.number: queue.Queue(maxsize=self.queue_size) for step in self.steps}
+        results = {}
+        state = {}
+        lock = threading.Lock()
+        all_done = threading.Condition(lock)
+        pending = [0]
+        started = time.perf_counter()
+
+        def finish(index, item, error=None, failed_step=None):
+            with lock:
+                if index in results:
+                    return
+                results[index] = {"index": index, "item": item, "error": error, "failed_step": failed_step,
+                                  "timings": state[index]["timings"], "resumed_steps": state[index]["resumed"]}
+                pending[0] -= 1
+                all_done.notify_all()
+
+        def advance(index, step, item):
+            ready = []
+            with lock:
+                page = state[index]
+                page["done"].add(step.number)
+                page["item"].update(item)
+                for dependant in self._dependants[step.number]:
+                    if all(d in page["done"] for d in dependant.depends_on) and dependant.number not in page["queued"]:
+                        page["queued"].add(dependant.number)
+                        ready.append(dependant)
+                complete = len(page["done"]) == len(self.steps)
+                merged = dict(page["item"])
+            for dependant in ready:
+                queues[dependant.number].put((index, merged))  # blocks while the stage is saturated
+            if complete:
+                finish(index, merged)
+
+        def worker(step):
+            while True:
+                entry = queues[step.number].get()
+                if entry is _DONE:
+                    return
+                index, item = entry
+                with lock:
+                    failed = index in results
+                if failed:
+                    continue
+                step_started = time.perf_counter()
+                try:
+                    with span("workflow.step", step=step.number, skill=step.spec.name):
+                        output = run_step(step.spec, skills[step.number], item)
+                    if self.checkpoint is not None:
+                        output = self.checkpoint.record_done(state[index]["key"], _step_id(step), output)
+                except Exception as e:
+                    logger.error("Step %s (%s) failed for page %s: %s", step.number, step.skill, index, e)
+                    state[index]["timings"][step.number] = time.perf_counter() - step_started
+                    error = f"{type(e).__name__}: {e}"
+                    if self.checkpoint is not None:
+                        self.checkpoint.record_failed(state[index]["key"], _step_id(step), error)
+                    finish(index, item, error, step.number)
+                    continue
+                state[index]["timings"][step.number] = time.perf_counter() - step_started
+                advance(index, step, output)
+
+        threads = []
+        for step in self.steps:
+            workers = self.concurrency.get(step.number, self.concurrency.get(step.skill, 1))
+            for n in range(max(1, workers)):
+                thread = threading.Thread(target=worker, args=(step,), name=f"step-{step.number}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        count = 0
+        for index, page in enumerate(pages):
+            key = page_key(page)
+            item, done = self._restore(key, page)
+            ready = [step for step in self.steps
+                     if step.number not in done and all(d in done for d in step.depends_on)]
+            with lock:
+                state[index] = {"key": key, "item": item, "done": done, "queued": {step.number for step in ready},
+                                "timings": {}, "resumed": sorted(done)}
+                pending[0] += 1
+            count += 1
+            if len(done) == len(self.steps):
+                finish(index, item)
+                continue
+            for step in ready:
+                queues[step.number].put((index, dict(item)))  # blocks while the stage is saturated
+
+        with lock:
+            while pending[0]:
+                all_done.wait()
+        for step in self.steps:
+            workers = self.concurrency.get(step.number, self.concurrency.get(step.skill, 1))
+            for _ in range(max(1, workers)):
+                queues[step.number].put(_DONE)
+        for thread in threads:
+            thread.join()
+
+        failures = sum(1 for r in results.values() if r["error"])
+        resumed = sum(len(r["resumed_steps"]) for r in results.values())
+        logger.info("Workflow ran %d pages through %d steps in %.1fs (%d failed, %d steps resumed)",
+                    count, len(self.steps), time.perf_counter() - started, failures, resumed)
+        return [results[index] for index in range(count)]
+
+    def _restore(self, key, page):
+        # Only steps whose dependencies were also restored count as done, so a step that has to
+        # run again also re-runs everything downstream of it.
+        item = dict(page)
+        done = set()
+        if self.checkpoint is None:
+            return item, done
+        completed = self.checkpoint.completed_steps(key)
+        for step in self.steps:
+            output = completed.get(_step_id(step))
+            if output is not None and all(d in done for d in step.depends_on):
+                item.update(output)
+                done.add(step.number)
+        return item, done
+
+
+def _step_id(step):
+    return f"{step.number}:{step.skill}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a workflow over report pages.")
+    parser.add_argument("workflow", nargs="?", help="Path of the workflow JSON file.")
+    parser.add_argument("pages", nargs="?", help="JSON file listing the pages to process.")
+    parser.add_argument("--run-id", help="Id for a new run (default: generated).")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume a run, skipping the steps it already completed.")
+    parser.add_argument("--runs-dir", default="./sandbox/runs", help="Directory holding run checkpoints.")
+    parser.add_argument("--queue-size", type=int, default=2, help="Capacity of each stage's input queue.")
+    parser.add_argument("--workers", action="append", default=[], metavar="STEP=N",
+                        help="Worker threads for a step number or skill name, e.g. 2=4.")
+    parser.add_argument("--skip-missing", action="store_true", help="Skip steps whose skill does not exist.")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running.")
+    parser.add_argument("--otlp-endpoint", help="Push spans and metrics to this OTLP/HTTP collector.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    concurrency = {}
+    for option in args.workers:
+        key, _, value = option.partition("=")
+        concurrency[int(key) if key.isdigit() else key] = int(value)
+    if args.resume:
+        checkpoint = RunCheckpoint.resume(args.resume, args.runs_dir)
+        manifest = checkpoint.load_manifest()
+        workflow, pages = manifest["workflow"], manifest["pages"]
+    else:
+        if not args.workflow or not args.pages:
+            parser.error("workflow and pages are required unless --resume is given")
+        with open(args.pages) as f:
+            pages = json.load(f)
+        workflow = args.workflow
+        checkpoint = RunCheckpoint(args.run_id, args.runs_dir)
+        checkpoint.save_manifest(workflow, pages)
+    logger.info("Run id: %s", checkpoint.run_id)
+
+    metrics_server = start_metrics_server(args.metrics_port) if args.metrics_port else None
+    exporter = OTLPExporter(args.otlp_endpoint).start() if args.otlp_endpoint else None
+
+    executor = PipelineExecutor.from_file(workflow, skip_missing=args.skip_missing, concurrency=concurrency,
+                                          queue_size=args.queue_size, checkpoint=checkpoint)
+    try:
+        results = executor.run(pages)
+    finally:
+        checkpoint.close()
+        if exporter:
+            exporter.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+    text = json.dumps({"run_id": checkpoint.run_id, "results": results}, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text)
+    else:
+        print(text)
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
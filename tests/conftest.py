@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Skills import each other as top-level modules, as they do when run from the skills directory;
+# the benchmark tools are imported the same way from benchmarks/.
+for directory in ("benchmarks", "skills"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
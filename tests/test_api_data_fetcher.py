@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from Skill_APIDataFetcher import APIAuthenticationError, APIDataFetcher, APIRequestError, APIResponseError
+
+
+@patch("Skill_APIDataFetcher.load_encrypted_config", return_value="test-key")
+@patch("Skill_APIDataFetcher.get_session")
+class TestAPIDataFetcher(unittest.TestCase):
+    def _respond(self, mock_session, status_code, body=None):
+        response = MagicMock(status_code=status_code, text="error")
+        response.json.return_value = body
+        mock_session.return_value.get.return_value = response
+        return response
+
+    def test_successful_response(self, mock_session, _):
+        self._respond(mock_session, 200, {"data": "valid"})
+
+        fetcher = APIDataFetcher("https://api.example.com")
+        result = fetcher.get_data("validinput")
+        self.assertEqual(result, {"data": "valid"})
+        headers = mock_session.return_value.get.call_args.kwargs["headers"]
+        self.assertEqual(headers, {"Authorization": "Bearer test-key"})
+
+    def test_authentication_error(self, mock_session, _):
+        self._respond(mock_session, 401)
+
+        fetcher = APIDataFetcher("https://api.example.com")
+        with self.assertRaises(APIAuthenticationError):
+            fetcher.get_data("validinput")
+
+    def test_request_error(self, mock_session, _):
+        self._respond(mock_session, 400)
+
+        fetcher = APIDataFetcher("https://api.example.com")
+        with self.assertRaises(APIRequestError):
+            fetcher.get_data("invalidinput")
+
+    def test_response_error(self, mock_session, _):
+        self._respond(mock_session, 500)
+
+        fetcher = APIDataFetcher("https://api.example.com")
+        with self.assertRaises(APIResponseError):
+            fetcher.get_data("validinput")
+
+    def test_invalid_input_is_rejected_before_the_request(self, mock_session, _):
+        fetcher = APIDataFetcher("https://api.example.com")
+        with self.assertRaises(ValueError):
+            fetcher.get_data("drop table;")
+        mock_session.return_value.get.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
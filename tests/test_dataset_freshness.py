@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from dataset_freshness import DatasetFreshnessChecker
+from freshness_watermarks import WatermarkStore, refresh_id
+
+HISTORY = [
+    {"requestId": "r3", "status": "Unknown", "startTime": "2024-05-03T06:00:00Z"},
+    {"requestId": "r2", "status": "Failed", "startTime": "2024-05-02T18:00:00Z", "endTime": "2024-05-02T18:01:00Z"},
+    {"requestId": "r1", "status": "Completed", "startTime": "2024-05-02T06:00:00Z", "endTime": "2024-05-02T06:03:00Z"}
+]
+
+
+@patch("dataset_freshness.get_session")
+class LastRefreshTest(unittest.TestCase):
+    def _checker(self, mock_session, history):
+        mock_session.return_value.get.return_value = MagicMock(**{"json.return_value": {"value": history}})
+        return DatasetFreshnessChecker(lambda: "token", base_url="https://api.example.com")
+
+    def test_running_and_failed_refreshes_are_skipped(self, mock_session):
+        refresh = self._checker(mock_session, HISTORY).last_refresh("ds")
+        self.assertEqual(refresh["requestId"], "r1")
+
+    def test_no_completed_refresh(self, mock_session):
+        self.assertIsNone(self._checker(mock_session, HISTORY[:2]).last_refresh("ds"))
+        self.assertIsNone(self._checker(mock_session, []).last_refresh("ds"))
+
+
+class RefreshIdTest(unittest.TestCase):
+    def test_only_completed_refreshes_have_an_id(self):
+        self.assertEqual(refresh_id(HISTORY[2]), "r1")
+        self.assertIsNone(refresh_id(HISTORY[0]))
+        self.assertIsNone(refresh_id(HISTORY[1]))
+        self.assertIsNone(refresh_id(None))
+
+
+class WatermarkStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = WatermarkStore(os.path.join(self.dir, "watermarks.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def test_removed_tables_and_columns_are_reported_and_forgotten(self):
+        self.store.record("ds", "r1", {"Sales": {"OrderDate": "2024-05-01", "ShipDate": "2024-05-02"},
+                                       "Returns": {"ReturnDate": "2024-04-30"}})
+        diff = self.store.record("ds", "r2", {"Sales": {"OrderDate": "2024-05-01"}})
+
+        self.assertEqual(diff, {
+            "Sales": {"ShipDate": {"previous": "2024-05-02", "current": None, "removed": True}},
+            "Returns": {"ReturnDate": {"previous": "2024-04-30", "current": None, "removed": True}}
+        })
+        self.assertEqual(self.store.watermarks("ds"), {"Sales": {"OrderDate": "2024-05-01"}})
+        self.assertEqual(self.store.record("ds", "r3", {"Sales": {"OrderDate": "2024-05-01"}}), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from dax_analyzer import DaxAnalyzer, DaxModel, DaxSyntaxError, parse, split_measures
+
+MODEL = DaxModel(
+    table_rows={"Sales": 25_000_000, "Product": 1_000},
+    bidirectional=[("Sales", "Customer")],
+    measures={"Total Sales", "Total", "Cost"}
+)
+
+
+def rules(expression, model=MODEL):
+    return {finding["rule"] for finding in DaxAnalyzer(model).analyze(expression, "Test")}
+
+
+class ParserTest(unittest.TestCase):
+    def test_var_return(self):
+        node = parse("VAR Base = SUM(Sales[Amount]) VAR Double = Base * 2 RETURN Double + Base")
+        self.assertEqual(node.kind, "var")
+        self.assertEqual(node.value, ("Base", "Double"))
+        body = node.args[-1]
+        self.assertEqual((body.kind, body.value), ("binary", "+"))
+        self.assertEqual([arg.kind for arg in body.args], ["var_ref", "var_ref"])
+
+    def test_variables_are_scoped_to_their_block(self):
+        node = parse("IF(VAR x = 1 RETURN x, x)")
+        self.assertEqual(node.args[0].args[-1].kind, "var_ref")
+        self.assertEqual(node.args[1].kind, "table")
+
+    def test_skipped_arguments(self):
+        node = parse("RANKX(ALL(Product), [Total Sales], , DESC)")
+        self.assertEqual([arg.kind for arg in node.args], ["call", "column", "empty", "table"])
+
+    def test_quoted_table_column(self):
+        node = parse("'Sales Order'[Net Amount] + 'Customer''s Region'[Name]")
+        self.assertEqual(node.args[0].value, ("Sales Order", "Net Amount"))
+        self.assertEqual(node.args[1].value, ("Customer's Region", "Name"))
+
+    def test_in_table_constructor(self):
+        node = parse('Sales[Region] IN {"West", "East"}')
+        self.assertEqual((node.kind, node.value), ("binary", "IN"))
+        constructor = node.args[1]
+        self.assertEqual((constructor.kind, constructor.value), ("list", "{}"))
+        self.assertEqual(len(constructor.args), 2)
+
+    def test_comments_and_operator_precedence(self):
+        node = parse("1 + 2 * 3 ^ 2 // trailing comment")
+        self.assertEqual(node.value, "+")
+        self.assertEqual(node.args[1].value, "*")
+        self.assertEqual(node.args[1].args[1].value, "^")
+
+    def test_syntax_errors(self):
+        for expression in ("SUM(Sales[Amount]", "1 +", "CALCULATE(SUM(Sales[Amount]) Sales[Region])", "VAR x = 1",
+                           "SUM(Sales[Amount]) ;"):
+            with self.subTest(expression=expression), self.assertRaises(DaxSyntaxError):
+                parse(expression)
+
+    def test_syntax_error_is_reported_as_dax000(self):
+        findings = DaxAnalyzer().analyze("SUM(Sales[Amount]", "Broken")
+        self.assertEqual([f["rule"] for f in findings], ["DAX000"])
+        self.assertEqual(findings[0]["severity"], "error")
+
+    def test_parenthesised_expression_keeps_its_parentheses(self):
+        node = parse("([Total]-[Cost])/[Total]")
+        self.assertEqual((node.args[0].start, node.args[0].end), (0, 16))
+        finding = next(f for f in DaxAnalyzer().analyze("([Total]-[Cost])/[Total]") if f["rule"] == "DAX007")
+        self.assertEqual(finding["snippet"], "([Total]-[Cost])/[Total]")
+
+
+class RuleTest(unittest.TestCase):
+    def assertRule(self, rule, positive, negative, model=MODEL):
+        self.assertIn(rule, rules(positive, model), positive)
+        self.assertNotIn(rule, rules(negative, model), negative)
+
+    def test_dax001_whole_table_filter_in_calculate(self):
+        self.assertRule("DAX001",
+                        'CALCULATE(SUM(Sales[Amount]), FILTER(Sales, Sales[Region] = "West"))',
+                        'CALCULATE(SUM(Sales[Amount]), KEEPFILTERS(Sales[Region] = "West"))')
+
+    def test_dax002_repeated_sub_expression(self):
+        self.assertRule("DAX002",
+                        "IF(SUM(Sales[Amount]) * 1.1 > 100, SUM(Sales[Amount]) * 1.1, 0)",
+                        "VAR Grown = SUM(Sales[Amount]) * 1.1 RETURN IF(Grown > 100, Grown, 0)")
+
+    def test_dax003_iterator_over_large_table(self):
+        self.assertRule("DAX003",
+                        "SUMX(Sales, Sales[Quantity] * Sales[Price])",
+                        "SUMX(Product, Product[Weight] * Product[Price])")
+
+    def test_dax004_measure_inside_iterator(self):
+        self.assertRule("DAX004",
+                        "SUMX(Sales, [Total Sales])",
+                        "SUMX(VALUES(Product[Category]), [Total Sales])")
+
+    def test_dax005_bidirectional_relationship(self):
+        self.assertRule("DAX005",
+                        'CALCULATE(SUM(Sales[Amount]), Customer[Country] = "NL")',
+                        'CALCULATE(SUM(Sales[Amount]), Customer[Country] = "NL", '
+                        'CROSSFILTER(Sales[CustomerId], Customer[Id], ONEWAY))')
+
+    def test_dax005_through_referenced_measures(self):
+        report = DaxAnalyzer(MODEL).analyze_measures(
+            'Total Sales = SUM(Sales[Amount])\nDutch Sales = CALCULATE([Total Sales], Customer[Country] = "NL")')
+        self.assertEqual([f["measure"] for f in report["findings"] if f["rule"] == "DAX005"], ["Dutch Sales"])
+
+    def test_dax006_error_functions(self):
+        self.assertRule("DAX006",
+                        "IFERROR(SUM(Sales[Margin]) / SUM(Sales[Amount]), 0)",
+                        "DIVIDE(SUM(Sales[Margin]), SUM(Sales[Amount]))")
+
+    def test_dax007_division_operator(self):
+        self.assertRule("DAX007",
+                        "SUM(Sales[Margin]) / SUM(Sales[Amount])",
+                        "SUM(Sales[Margin]) / 2")
+
+    def test_dax008_summarize_with_added_columns(self):
+        self.assertRule("DAX008",
+                        'SUMMARIZE(Sales, Sales[Region], "Total", SUM(Sales[Amount]))',
+                        'ADDCOLUMNS(SUMMARIZE(Sales, Sales[Region]), "Total", [Total Sales])')
+
+    def test_disabled_rules_are_not_reported(self):
+        findings = DaxAnalyzer(MODEL, disabled={"DAX007"}).analyze("SUM(Sales[Margin]) / SUM(Sales[Amount])")
+        self.assertEqual(findings, [])
+
+
+class SplitMeasuresTest(unittest.TestCase):
+    def test_definitions_and_define_block(self):
+        text = "DEFINE\nMEASURE Sales[Total] = SUM(Sales[Amount])\nMEASURE Sales[Avg] =\n  AVERAGE(Sales[Amount])\n"
+        self.assertEqual(split_measures(text), [("Sales[Total]", "SUM(Sales[Amount])"),
+                                                ("Sales[Avg]", "AVERAGE(Sales[Amount])")])
+
+
+if __name__ == "__main__":
+    unittest.main()
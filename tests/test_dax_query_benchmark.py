@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+import dax_query_benchmark
+from dax_query_benchmark import _verdict
+
+CASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks", "dax_cases.json")
+EQUIVALENT = {"equivalent": True}
+
+
+def p50s(original, rewritten):
+    return {"original": {"cold": original, "warm": original}, "rewritten": {"cold": rewritten, "warm": rewritten}}
+
+
+class VerdictTest(unittest.TestCase):
+    def test_speedup_uses_unrounded_durations(self):
+        # Both round to 5 ms, which would report no speedup at all.
+        result = _verdict(p50s(0.0054, 0.0046), EQUIVALENT)
+        self.assertEqual(result["speedup"]["warm"], 1.17)
+        self.assertEqual(result["verdict"], "improved")
+
+    def test_sub_millisecond_queries_get_a_speedup(self):
+        result = _verdict(p50s(0.0002, 0.0004), EQUIVALENT)
+        self.assertEqual(result["speedup"], {"cold": 0.5, "warm": 0.5})
+        self.assertEqual(result["verdict"], "regressed")
+
+    def test_different_results_are_not_equivalent(self):
+        self.assertEqual(_verdict(p50s(0.2, 0.1), {"equivalent": False})["verdict"], "not_equivalent")
+
+
+class StubRunTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main_against_the_stub_server(self):
+        output = os.path.join(self.dir, "report.json")
+        with redirect_stdout(io.StringIO()) as stdout:
+            status = dax_query_benchmark.main([CASES, "--stub", "--latency-scale", "0.05", "--cold-runs", "1",
+                                               "--warm-runs", "2", "--output", output])
+
+        # Sampled latencies of the closer cases may go either way; the exit status must match the report.
+        self.assertEqual(status, 1 if "REGRESSION" in stdout.getvalue() else 0, stdout.getvalue())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(report["timing_source"], ["server"])
+        self.assertEqual([case["name"] for case in report["cases"]], ["west_sales", "margin_ratio", "sales_growth"])
+        for case in report["cases"]:
+            self.assertTrue(case["equivalence"]["equivalent"], case["name"])
+            self.assertEqual(case["timings"]["rewritten"]["warm"]["count"], 2)
+            self.assertIsNotNone(case["speedup"]["warm"], case["name"])
+        self.assertEqual(report["cases"][0]["verdict"], "improved")
+
+
+if __name__ == "__main__":
+    unittest.main()
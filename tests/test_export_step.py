@@ -0,0 +1,56 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from PIL import Image
+import page_changes
+from page_changes import NEW, PageChangeDetector
+from powerbi_export_engine import ExportJobError, PowerBIExportEngine
+from workflow_executor import run_step
+
+EXPORT = SimpleNamespace(name="ExportPowerBIReportAsImage")
+
+
+@unittest.skipUnless(importlib.util.find_spec("autogen"), "the export skill needs the AutoGen runtime")
+class ExportStepTest(unittest.TestCase):
+    """Runs the real export skill and engine constructor; only the engine's run() is stubbed."""
+
+    def setUp(self):
+        from Skill_ExportToImage import ExportPowerBIReportAsImage
+        self.dir = tempfile.mkdtemp()
+        self.image_file = os.path.join(self.dir, "p1.png")
+        Image.new("RGB", (64, 48), "white").save(self.image_file)
+        page_changes._detector = PageChangeDetector(store_dir=os.path.join(self.dir, "baselines"))
+        self.skill = ExportPowerBIReportAsImage()
+        self.skill.output_dir = os.path.join(self.dir, "exports")
+        cache = patch.object(ExportPowerBIReportAsImage, "get_export_cache", return_value=None)
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    def tearDown(self):
+        page_changes._detector = None
+        shutil.rmtree(self.dir)
+
+    def _run_step(self, results):
+        with patch.object(PowerBIExportEngine, "run", autospec=True, return_value=results) as run:
+            item = run_step(EXPORT, self.skill, {"report_id": "r1", "page_name": "p1"})
+        targets = run.call_args.args[1]
+        self.assertEqual([(t.report_id, t.page_name) for t in targets], [("r1", "p1")])
+        return item
+
+    def test_export_step_adds_the_image_and_its_change(self):
+        item = self._run_step([{"report_id": "r1", "page_name": "p1", "file_path": self.image_file,
+                                "bytes": 1, "elapsed": 0.1, "cached": False}])
+        self.assertEqual(item["image_file"], self.image_file)
+        self.assertEqual(item["page_change"], NEW)
+
+    def test_failed_export_raises(self):
+        with self.assertRaises(ExportJobError):
+            self._run_step([ExportJobError("Export job e1 failed")])
+
+
+if __name__ == "__main__":
+    unittest.main()
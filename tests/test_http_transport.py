@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import patch
+import requests
+from http_transport import CircuitBreaker, CircuitOpenError, PooledSession, TransportRetry
+
+URL = "https://service.test/api"
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.session = PooledSession(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        with patch("requests.Session.request", side_effect=requests.exceptions.ConnectionError("down")):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.session.request("GET", URL)
+
+    def test_trial_failing_with_another_error_does_not_keep_the_circuit_open(self):
+        with patch("requests.Session.request", side_effect=requests.exceptions.SSLError("handshake")):
+            with self.assertRaises(requests.exceptions.SSLError):
+                self.session.request("GET", URL)
+        with patch("requests.Session.request", side_effect=ValueError("bad hook")):
+            with self.assertRaises(ValueError):
+                self.session.request("GET", URL)
+
+        response = requests.Response()
+        response.status_code = 200
+        with patch("requests.Session.request", return_value=response):
+            self.assertIs(self.session.request("GET", URL), response)
+        self.assertNotIn("service.test", self.session.breaker._opened_at)
+
+    def test_concurrent_request_during_trial_is_short_circuited(self):
+        self.session.breaker.before_request("service.test")
+        with self.assertRaises(CircuitOpenError):
+            self.session.request("GET", URL)
+
+
+class TransportRetryTest(unittest.TestCase):
+    def test_post_is_retried_only_on_429_with_retry_after(self):
+        retry = TransportRetry(total=3, status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True)
+        self.assertTrue(retry.is_retry("POST", 429, has_retry_after=True))
+        self.assertFalse(retry.is_retry("POST", 429, has_retry_after=False))
+        self.assertFalse(retry.is_retry("POST", 503, has_retry_after=True))
+        self.assertTrue(retry.is_retry("GET", 503))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+from image_preprocess import tile_boxes
+
+
+class TileBoxesTest(unittest.TestCase):
+    def test_page_within_max_aspect_is_not_split(self):
+        self.assertEqual(tile_boxes(2000, 1000), [(0, 0, 2000, 1000)])
+
+    def test_page_just_over_the_threshold_is_not_split(self):
+        # Two 2000 px tiles of a 2010 px page would overlap by more than 99%.
+        self.assertEqual(tile_boxes(2010, 1000), [(0, 0, 2010, 1000)])
+        self.assertEqual(tile_boxes(1000, 2490), [(0, 0, 1000, 2490)])
+
+    def test_each_extra_tile_adds_the_minimum_new_area(self):
+        boxes = tile_boxes(2500, 1000)
+        self.assertEqual(boxes, [(0, 0, 2000, 1000), (500, 0, 2500, 1000)])
+        for width in (2500, 3000, 4100, 9000):
+            with self.subTest(width=width):
+                boxes = tile_boxes(width, 1000)
+                self.assertEqual((boxes[0][0], boxes[-1][2]), (0, width))
+                steps = [b[0] - a[0] for a, b in zip(boxes, boxes[1:])]
+                self.assertTrue(all(step >= 2000 * 0.25 for step in steps), steps)
+                self.assertTrue(all(box[2] - box[0] == 2000 for box in boxes))
+
+
+if __name__ == "__main__":
+    unittest.main()
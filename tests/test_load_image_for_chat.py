@@ -0,0 +1,51 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+from Skill_LoadImageForChat import LoadImageForChat
+
+
+class LoadImageForChatTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _image(self, name):
+        path = os.path.join(self.dir, name)
+        Image.new("RGB", (40, 30), "teal").save(path)
+        return path
+
+    def test_png_bytes_are_sent_as_is(self):
+        path = self._image("page.png")
+        loader = LoadImageForChat(path)
+        loader.load_image()
+        with open(path, "rb") as f:
+            expected = f.read()
+        self.assertIsInstance(loader.image_data, bytes)
+        self.assertEqual(loader.image_data, expected)
+        self.assertEqual(base64.b64decode(loader.get_base64_image()), expected)
+
+    def test_formats_without_a_known_signature_go_through_pil(self):
+        for name in ("page.bmp", "page.webp", "page.tiff"):
+            with self.subTest(name=name):
+                loader = LoadImageForChat(self._image(name))
+                loader.load_image()
+                self.assertIsInstance(loader.image_data, bytes)
+                with Image.open(os.path.join(self.dir, name)) as original:
+                    self.assertEqual(Image.open(io.BytesIO(loader.image_data)).format, original.format)
+
+    def test_non_image_file_is_rejected(self):
+        path = os.path.join(self.dir, "notes.txt")
+        with open(path, "w") as f:
+            f.write("not an image")
+        with self.assertRaises(OSError):
+            LoadImageForChat(path).load_image()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from PIL import Image
+import page_changes
+from page_changes import NEW, UNCHANGED, PageChangeDetector, change_key
+from workflow_executor import DEFAULT_QUESTION, PipelineExecutor, load_workflow, run_step
+
+EXPORT = SimpleNamespace(name="ExportPowerBIReportAsImage")
+VISION = SimpleNamespace(name="AnalyzeImageWithGPT4Vision")
+WORKFLOW = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "workflows",
+                        "Workflow_PowerBIReportVisionAnalyzer.json")
+QUALITY_QUESTIONS = ["Is the text readable?", "Is the layout balanced?"]
+
+
+class FakeExportSkill:
+    """Stands in for the export skill: returns a fixed image and compares it like export_report_pages does."""
+
+    def __init__(self, image_file):
+        self.image_file = image_file
+
+    def export_report_pages(self, targets, detect_changes=False, change_question="", **engine_options):
+        results = []
+        for target in targets:
+            key = change_key(target.report_id, target.page_name, change_question)
+            result = {"report_id": target.report_id, "page_name": target.page_name, "file_path": self.image_file,
+                      "change_key": key}
+            result.update(page_changes.get_change_detector().compare(key, self.image_file))
+            results.append(result)
+        return results
+
+
+class FakeVisionSkill:
+    input_schema = {"type": "object", "properties": {"image_file": {}, "question": {}, "regions": {}}}
+
+    def __init__(self):
+        self.questions = []
+
+    def execute(self, input_data):
+        self.questions.append(input_data["question"])
+        return {"answer": f"answer to: {input_data['question']}"}
+
+
+class FakeQualitySkill:
+    input_schema = {"type": "object", "properties": {"image_file": {}}}
+
+    def execute(self, input_data):
+        return {"quality_score": 50, "quality_questions": QUALITY_QUESTIONS, "quality_summary": "Low contrast."}
+
+
+class FakeRecommendationsSkill:
+    input_schema = {"type": "object", "properties": {"insights": {}}}
+
+    def execute(self, input_data):
+        return {"recommendations": [input_data["insights"]]}
+
+
+class FakeRegistry:
+    def __init__(self, skills):
+        self.skills = skills
+
+    def create(self, name):
+        return self.skills[name]
+
+
+class PageChangeBaselineTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image_file = os.path.join(self.dir, "page.png")
+        Image.new("RGB", (64, 48), "white").save(self.image_file)
+        page_changes._detector = PageChangeDetector(store_dir=os.path.join(self.dir, "baselines"))
+        self.vision = FakeVisionSkill()
+
+    def tearDown(self):
+        page_changes._detector = None
+        shutil.rmtree(self.dir)
+
+    def _run(self, page):
+        item = run_step(EXPORT, FakeExportSkill(self.image_file), page)
+        return run_step(VISION, self.vision, item)
+
+    def test_unchanged_page_reuses_the_default_question_analysis(self):
+        first = self._run({"report_id": "r1", "page_name": "p1"})
+        self.assertEqual(first["page_change"], NEW)
+        second = self._run({"report_id": "r1", "page_name": "p1"})
+
+        self.assertEqual(second["page_change"], UNCHANGED)
+        self.assertTrue(second["analysis_skipped"])
+        self.assertEqual(second["answer"], first["answer"])
+        self.assertEqual(self.vision.questions, [DEFAULT_QUESTION])
+
+    def test_custom_question_is_not_answered_from_the_default_baseline(self):
+        self._run({"report_id": "r1", "page_name": "p1"})
+        custom = self._run({"report_id": "r1", "page_name": "p1", "question": "Which colours are used?"})
+
+        self.assertNotIn("analysis_skipped", custom)
+        self.assertEqual(custom["answer"], "answer to: Which colours are used?")
+        # The custom answer did not replace the full-page baseline.
+        again = self._run({"report_id": "r1", "page_name": "p1"})
+        self.assertEqual(again["answer"], f"answer to: {DEFAULT_QUESTION}")
+
+    def test_quality_questions_have_their_own_baseline(self):
+        self._run({"report_id": "r1", "page_name": "p1"})
+        page = {"report_id": "r1", "page_name": "p1"}
+        item = run_step(EXPORT, FakeExportSkill(self.image_file), page)
+        item["quality_questions"] = ["Is the text readable?"]
+        quality = run_step(VISION, self.vision, item)
+
+        self.assertEqual(quality["answer"], "answer to: Is the text readable?")
+        self.assertEqual(quality["page_change"], NEW)
+        again = self._run(page)
+        self.assertEqual(again["answer"], f"answer to: {DEFAULT_QUESTION}")
+
+    def test_quality_answer_is_not_the_default_baseline_of_a_new_page(self):
+        page = {"report_id": "r2", "page_name": "p1"}
+        item = run_step(EXPORT, FakeExportSkill(self.image_file), page)
+        item["quality_questions"] = ["Is the text readable?"]
+        run_step(VISION, self.vision, item)
+
+        self.assertEqual(self._run(page)["page_change"], NEW)
+
+    def test_shipped_workflow_reuses_the_analysis_of_an_unchanged_page(self):
+        registry = FakeRegistry({"ExportPowerBIReportAsImage": FakeExportSkill(self.image_file),
+                                 "ImageQualityReview": FakeQualitySkill(),
+                                 "AnalyzeImageWithGPT4Vision": self.vision,
+                                 "GenerateDesignRecommendations": FakeRecommendationsSkill()})
+        _, steps = load_workflow(WORKFLOW)
+        executor = PipelineExecutor(steps, registry=registry)
+        page = {"report_id": "r1", "page_name": "p1"}
+
+        first, second = (executor.run([page])[0]["item"] for _ in range(2))
+
+        self.assertEqual(first["page_change"], NEW)
+        self.assertEqual(second["page_change"], UNCHANGED)
+        self.assertTrue(second["analysis_skipped"])
+        self.assertEqual(second["answer"], first["answer"])
+        self.assertEqual(self.vision.questions, [" ".join(QUALITY_QUESTIONS)])
+        self.assertIn(first["answer"], second["recommendations"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+from Skill_PowerBradTCriticalEye import power_bradt_critical_eye
+
+
+class PowerBradTCriticalEyeTest(unittest.TestCase):
+    def test_feedback_includes_dax_findings(self):
+        feedback = power_bradt_critical_eye("let Source = Sql.Database(\"db\") in Source",
+                                            "Margin % = SUM(Sales[Margin]) / SUM(Sales[Amount])",
+                                            "Sales overview report")
+        self.assertIn("DAX007 [Margin %]", feedback)
+        self.assertIn("SUM(Sales[Margin]) / SUM(Sales[Amount])", feedback)
+
+    def test_feedback_without_dax_formulas(self):
+        self.assertIn("No DAX formulas to review.", power_bradt_critical_eye("", "", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from export_cache import ExportCache
+from powerbi_export_engine import ExportTarget, PowerBIExportEngine
+
+BASE_URL = "https://powerbi.test/v1.0/myorg"
+REPORT_URL = f"{BASE_URL}/reports/r1"
+REFRESHES_URL = f"{BASE_URL}/datasets/d1/refreshes"
+
+
+def make_response(status, payload=None, content=b""):
+    response = requests.Response()
+    response.status_code = status
+    response._content = content if payload is None else requests.compat.json.dumps(payload).encode()
+    response._content_consumed = True
+    return response
+
+
+class FakeSession:
+    """Answers the report, refresh history and export job endpoints; `routes` overrides any of them."""
+
+    def __init__(self, routes=None):
+        self.routes = {
+            ("GET", REPORT_URL): make_response(200, {"id": "r1", "datasetId": "d1"}),
+            ("GET", REFRESHES_URL): make_response(200, {"value": [{"endTime": "2026-10-01T00:00:00Z"}]}),
+            ("POST", f"{REPORT_URL}/ExportTo"): make_response(202, {"id": "e1"}),
+            ("GET", f"{REPORT_URL}/exports/e1"): make_response(200, {"status": "Succeeded"}),
+            ("GET", f"{REPORT_URL}/exports/e1/file"): make_response(200, content=b"png-bytes")
+        }
+        self.routes.update(routes or {})
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return self.routes[(method, url)]
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url)
+
+    def submissions(self):
+        return sum(1 for call in self.calls if call == ("POST", f"{REPORT_URL}/ExportTo"))
+
+
+async def token_getter():
+    return "token"
+
+
+class ExportCacheVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ExportCache(cache_dir=os.path.join(self.dir, "cache"))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def _export_twice(self, session):
+        engine = PowerBIExportEngine(token_getter, output_dir=os.path.join(self.dir, "out"), base_url=BASE_URL,
+                                     poll_interval=0, cache=self.cache)
+        engine._session = session
+        return [engine.run([ExportTarget("r1", "p1")], return_exceptions=False)[0] for _ in range(2)]
+
+    def test_unchanged_report_is_served_from_the_cache(self):
+        session = FakeSession()
+        first, second = self._export_twice(session)
+        self.assertEqual((first["cached"], second["cached"]), (False, True))
+        self.assertEqual(session.submissions(), 1)
+
+    def test_failed_refresh_lookup_exports_without_the_cache(self):
+        session = FakeSession({("GET", REFRESHES_URL): make_response(403, {"error": "forbidden"})})
+        results = self._export_twice(session)
+        self.assertEqual([result["cached"] for result in results], [False, False])
+        self.assertEqual(session.submissions(), 2)
+
+    def test_missing_refresh_history_exports_without_the_cache(self):
+        session = FakeSession({("GET", REFRESHES_URL): make_response(200, {"value": []})})
+        results = self._export_twice(session)
+        self.assertEqual([result["cached"] for result in results], [False, False])
+        self.assertEqual(session.submissions(), 2)
+
+
+class DuplicateTargetTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_identical_targets_are_exported_once(self):
+        session = FakeSession()
+        engine = PowerBIExportEngine(token_getter, output_dir=self.dir, base_url=BASE_URL, poll_interval=0)
+        engine._session = session
+        first, second = engine.run([ExportTarget("r1", "p1"), ("r1", "p1")], return_exceptions=False)
+
+        self.assertEqual(session.submissions(), 1)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        with open(first["file_path"], "rb") as f:
+            self.assertEqual(f.read(), b"png-bytes")
+        self.assertEqual(os.listdir(os.path.dirname(first["file_path"])), ["p1.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
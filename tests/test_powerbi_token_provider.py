@@ -0,0 +1,70 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from powerbi_token_provider import POWERBI_SCOPE, PowerBITokenProvider
+
+KEY = ("tenant", "client", POWERBI_SCOPE)
+
+
+class FakeSession:
+    def __init__(self, expires_in):
+        self.expires_in = expires_in
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        data = {"access_token": f"token-{self.posts}", "expires_in": self.expires_in}
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: data)
+
+
+class TokenProviderTest(unittest.TestCase):
+    def _provider(self, expires_in, **options):
+        self.session = FakeSession(expires_in)
+        patcher = patch("powerbi_token_provider.get_session", return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        provider = PowerBITokenProvider(**options)
+        self.addCleanup(provider.close)
+        return provider
+
+    def test_short_lived_token_is_reused_and_refreshed_at_half_its_lifetime(self):
+        provider = self._provider(expires_in=120)
+        with patch.object(provider, "_schedule_refresh") as schedule:
+            self.assertEqual(provider.get_token(*KEY[:2], "secret"), "token-1")
+            self.assertEqual(provider.get_token(*KEY[:2], "secret"), "token-1")
+        self.assertEqual(self.session.posts, 1)
+        schedule.assert_called_once_with(KEY, 60)
+
+    def test_unread_token_is_not_refreshed_in_the_background(self):
+        provider = self._provider(expires_in=3600, background_refresh=False)
+        provider.get_token(*KEY[:2], "secret")
+        provider._background_refresh(KEY)
+        self.assertEqual(self.session.posts, 1)
+
+        provider.get_token(*KEY[:2], "secret")
+        provider._background_refresh(KEY)
+        self.assertEqual(self.session.posts, 2)
+        provider._background_refresh(KEY)
+        self.assertEqual(self.session.posts, 2)
+
+    def test_malformed_background_refresh_is_logged_and_keeps_the_token(self):
+        provider = self._provider(expires_in=3600, background_refresh=False)
+        provider.get_token(*KEY[:2], "secret")
+        provider.get_token(*KEY[:2], "secret")
+        for malformed in ({"expires_in": 3600}, ValueError("Expecting value")):
+            with self.subTest(malformed=malformed):
+                self.session.post = lambda url, malformed=malformed, **kwargs: SimpleNamespace(
+                    raise_for_status=lambda: None, json=lambda: _answer(malformed))
+                with self.assertLogs("powerbi_token_provider", "WARNING"):
+                    provider._background_refresh(KEY)
+                self.assertEqual(provider.get_token(*KEY[:2], "secret"), "token-1")
+
+
+def _answer(malformed):
+    if isinstance(malformed, Exception):
+        raise malformed
+    return malformed
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from response_cache import ResponseCache
+
+VECTORS = {"What is the title?": [1.0, 0.0], "What's the title?": [0.99, 0.01], "Which colours?": [0.0, 1.0]}
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return VECTORS[text]
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.embedder = CountingEmbedder()
+        self.cache = ResponseCache(os.path.join(self.dir, "cache.sqlite"), embedder=self.embedder)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def _ask(self, question, scope="image-1"):
+        return self.cache.get_or_compute("Vision", (scope, question), lambda: f"answer to {question}",
+                                         prompt_text=question, scope=scope)
+
+    def test_database_runs_in_wal_mode(self):
+        self.assertEqual(self.cache._db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_near_duplicate_of_the_first_entry_in_a_scope(self):
+        self.assertEqual(self._ask("What is the title?"), "answer to What is the title?")
+        self.assertEqual(self._ask("What's the title?"), "answer to What is the title?")
+        self.assertEqual(self.embedder.texts, ["What is the title?", "What's the title?"])
+
+    def test_near_duplicates_do_not_cross_scopes(self):
+        self._ask("What is the title?")
+        self.assertEqual(self._ask("What's the title?", scope="image-2"), "answer to What's the title?")
+
+    def test_search_waits_for_min_scope_entries(self):
+        self.cache.min_scope_entries = 2
+        self._ask("What is the title?")
+        self.assertEqual(self._ask("What's the title?"), "answer to What's the title?")
+        self.assertEqual(self._ask("Which colours?"), "answer to Which colours?")
+        # Exact hits never embed.
+        self._ask("Which colours?")
+        self.assertEqual(len(self.embedder.texts), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
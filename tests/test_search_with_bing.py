@@ -0,0 +1,47 @@
+import json
+import unittest
+from unittest.mock import patch
+import requests
+from Skill_SearchWithBing import BingSearchError, search_bing_function
+
+
+def _response(status_code, body=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode() if body is not None else b""
+    return response
+
+
+@patch("Skill_SearchWithBing.load_encrypted_config", return_value="test-key")
+@patch("Skill_SearchWithBing.get_session")
+class TestBingSearchSkill(unittest.TestCase):
+    def test_successful_response(self, mock_session, _):
+        mock_session.return_value.get.return_value = _response(200, [{"name": "Test Result"}])
+
+        result = search_bing_function("test query", api_url="https://search.example.com")
+        self.assertEqual(result, [{"name": "Test Result"}])
+        kwargs = mock_session.return_value.get.call_args.kwargs
+        self.assertEqual(kwargs["params"], {"q": "test query"})
+        self.assertEqual(kwargs["headers"], {"x-functions-key": "test-key"})
+
+    def test_authentication_error(self, mock_session, _):
+        mock_session.return_value.get.return_value = _response(401)
+
+        with self.assertRaises(BingSearchError):
+            search_bing_function("test query", api_url="https://search.example.com")
+
+    def test_request_error(self, mock_session, _):
+        mock_session.return_value.get.return_value = _response(400)
+
+        with self.assertRaises(BingSearchError):
+            search_bing_function("test query", api_url="https://search.example.com")
+
+    def test_response_error(self, mock_session, _):
+        mock_session.return_value.get.return_value = _response(500)
+
+        with self.assertRaises(BingSearchError):
+            search_bing_function("test query", api_url="https://search.example.com")
+
+
+if __name__ == "__main__":
+    unittest.main()
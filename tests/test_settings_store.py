@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from settings_store import SettingsStore
+
+NAME = "SETTINGS_STORE_TEST_VALUE"
+
+
+class SettingsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.env_file = os.path.join(self.dir, ".env")
+        with open(self.env_file, "w") as f:
+            f.write(f"{NAME}=from-dotenv\n")
+
+    def tearDown(self):
+        os.environ.pop(NAME, None)
+        shutil.rmtree(self.dir)
+
+    def test_concurrent_reader_waits_for_the_first_load(self):
+        store = SettingsStore(env_file=self.env_file, ini_file=os.path.join(self.dir, "settings.ini"),
+                              check_interval=60)
+        loading, release = threading.Event(), threading.Event()
+        load_env = store._load_env
+
+        def slow_load_env():
+            loading.set()
+            release.wait(5)
+            load_env()
+
+        store._load_env = slow_load_env
+        first = threading.Thread(target=store.get_str, args=(NAME,))
+        first.start()
+        self.assertTrue(loading.wait(5))
+        results = []
+        second = threading.Thread(target=lambda: results.append(store.require(NAME)))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(results, ["from-dotenv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
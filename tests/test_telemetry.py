@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+import requests
+from telemetry import Telemetry
+
+
+class FailingCollector:
+    """Accepts metrics; finishes more spans while the trace export is in flight, then fails it."""
+
+    def __init__(self, telemetry, late_spans):
+        self.telemetry = telemetry
+        self.late_spans = late_spans
+
+    def post(self, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/v1/traces"):
+            for name in self.late_spans:
+                with self.telemetry.span(name):
+                    pass
+            response.status_code = 503
+        return response
+
+
+class ExportOtlpTest(unittest.TestCase):
+    def test_failed_trace_export_keeps_the_most_recent_spans(self):
+        telemetry = Telemetry(max_spans=3)
+        for name in ("a", "b"):
+            with telemetry.span(name):
+                pass
+
+        with patch("http_transport.get_session", return_value=FailingCollector(telemetry, ["c", "d"])):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                telemetry.export_otlp()
+
+        self.assertEqual([s.name for s in telemetry.drain_spans()], ["b", "c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
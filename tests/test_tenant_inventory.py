@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from tenant_inventory import InventoryCatalog, TenantCrawler
+
+BASE_URL = "https://powerbi.test/v1.0/myorg"
+MODIFIED_URL = f"{BASE_URL}/admin/workspaces/modified"
+
+
+def make_response(status, payload):
+    response = requests.Response()
+    response.status_code = status
+    response._content = requests.compat.json.dumps(payload).encode()
+    return response
+
+
+class FakeSession:
+    """A tenant of two workspaces with one report each; `modified` is the admin API's answer."""
+
+    def __init__(self):
+        self.modified = make_response(200, [])
+        self.urls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.urls.append(url)
+        path = url[len(BASE_URL):]
+        if url == MODIFIED_URL:
+            return self.modified
+        if path == "/groups":
+            return make_response(200, {"value": [{"id": "w1", "name": "One"}, {"id": "w2", "name": "Two"}]})
+        workspace = path.split("/")[2]
+        if path.endswith("/datasets"):
+            return make_response(200, {"value": [{"id": f"d-{workspace}"}]})
+        if path.endswith("/reports"):
+            return make_response(200, {"value": [{"id": f"r-{workspace}", "datasetId": f"d-{workspace}",
+                                                  "modifiedDateTime": "2026-10-01T00:00:00Z"}]})
+        return make_response(200, {"value": [{"name": "ReportSection1", "displayName": "Page 1", "order": 0}]})
+
+    def listed_workspaces(self):
+        return sorted(url.split("/")[-2] for url in self.urls if url.endswith("/datasets"))
+
+
+class IncrementalCrawlTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.catalog = InventoryCatalog(os.path.join(self.dir, "inventory.sqlite"))
+        self.session = FakeSession()
+        self.crawler = TenantCrawler(lambda: "token", self.catalog, base_url=BASE_URL, max_concurrency=2)
+        self.crawler._session = self.session
+        self.crawler.crawl()
+        self.session.urls.clear()
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.dir)
+
+    def test_first_crawl_lists_every_workspace(self):
+        self.assertEqual(self.catalog.counts(), {"workspaces": 2, "datasets": 2, "reports": 2, "pages": 2})
+        self.assertEqual(set(self.catalog.crawled_at()), {"w1", "w2"})
+
+    def test_unchanged_workspaces_are_skipped(self):
+        self.session.modified = make_response(200, [{"id": "w2"}])
+        stats = self.crawler.crawl()
+        self.assertEqual(self.session.listed_workspaces(), ["w2"])
+        self.assertEqual(stats["skipped_workspaces"], 1)
+        self.assertEqual(self.catalog.counts()["reports"], 2)
+
+    def test_every_workspace_is_listed_without_admin_rights(self):
+        self.session.modified = make_response(403, {"error": {"code": "Unauthorized"}})
+        stats = self.crawler.crawl()
+        self.assertEqual(self.session.listed_workspaces(), ["w1", "w2"])
+        self.assertEqual(stats["skipped_workspaces"], 0)
+
+    def test_full_crawl_does_not_ask_for_modified_workspaces(self):
+        self.crawler.crawl(full=True)
+        self.assertNotIn(MODIFIED_URL, self.session.urls)
+        self.assertEqual(self.session.listed_workspaces(), ["w1", "w2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
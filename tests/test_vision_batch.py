@@ -0,0 +1,88 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import numpy as np
+from PIL import Image
+import image_preprocess
+from vision_batch import TokenBucketLimiter, VisionBatchAnalyzer
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.urls = []
+
+    async def create(self, model, messages, max_tokens, temperature):
+        self.urls.append(messages[0]["content"][1]["image_url"]["url"])
+        message = SimpleNamespace(content=f"answer {len(self.urls)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class VisionBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.prepared_dir = os.path.join(self.dir, "prepared")
+        # Noise compresses far better as JPEG than as PNG.
+        self.photo = os.path.join(self.dir, "photo.png")
+        Image.fromarray(np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8)).save(self.photo)
+        self.flat = os.path.join(self.dir, "flat.png")
+        Image.new("RGB", (400, 300), "white").save(self.flat)
+        self.prepare_threads = []
+        self.completions = FakeCompletions()
+        client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        self.analyzer = VisionBatchAnalyzer(client=client, deployment="test", rpm=6000, tpm=10 ** 7,
+                                            questions_per_request=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _prepare(self, image_path, **options):
+        self.prepare_threads.append((image_path, threading.current_thread()))
+        return image_preprocess.prepare_for_vision(image_path, output_dir=self.prepared_dir, **options)
+
+    def test_images_are_prepared_once_off_the_event_loop(self):
+        pairs = [(self.photo, "q1"), (self.photo, "q2"), (self.flat, "q1"), (self.flat, "q2"), (self.photo, "q3")]
+        with patch("vision_batch.prepare_for_vision", side_effect=self._prepare):
+            results = self.analyzer.run(pairs)
+
+        self.assertTrue(all("answer" in result for result in results))
+        self.assertEqual(sorted(path for path, _ in self.prepare_threads), [self.flat, self.photo])
+        self.assertTrue(all(thread is not threading.main_thread() for _, thread in self.prepare_threads))
+
+    def test_data_url_carries_the_prepared_format(self):
+        with patch("vision_batch.prepare_for_vision", side_effect=self._prepare):
+            self.analyzer.run([(self.photo, "q"), (self.flat, "q")])
+
+        prefixes = sorted(url.split(";")[0] for url in self.completions.urls)
+        formats = sorted(f"data:image/{name.rsplit('.', 1)[1]}" for name in os.listdir(self.prepared_dir))
+        self.assertEqual(prefixes, formats)
+        self.assertIn("data:image/jpeg", prefixes)
+
+    def test_unreadable_image_is_reported_per_pair(self):
+        missing = os.path.join(self.dir, "missing.png")
+        with patch("vision_batch.prepare_for_vision", side_effect=self._prepare):
+            results = self.analyzer.run([(missing, "q"), (self.flat, "q")])
+
+        self.assertIn("error", results[0])
+        self.assertIn("answer", results[1])
+
+
+class TokenBucketLimiterTest(unittest.TestCase):
+    def test_limiter_is_reusable_across_event_loops(self):
+        limiter = TokenBucketLimiter(rpm=6000, tpm=10 ** 7)
+
+        async def contended_burst():
+            # The pause makes the first caller sleep while holding the lock, so the others wait on it.
+            limiter.throttled(0.01)
+            await asyncio.gather(*(limiter.acquire(1) for _ in range(3)))
+
+        for _ in range(2):
+            asyncio.run(contended_burst())
+
+
+if __name__ == "__main__":
+    unittest.main()
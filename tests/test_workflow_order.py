@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from job_queue import JobQueue
+from run_checkpoint import RunCheckpoint, page_key
+from workflow_executor import PipelineExecutor, WorkflowError, load_workflow
+import worker_pool
+
+WORKFLOW = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "workflows",
+                        "Workflow_PowerBIReportVisionAnalyzer.json")
+ORDER = ["ExportToImage", "ImageQualityReview", "AnalyzeImageWithGPT4Vision", "DesignRecommendations"]
+
+
+class WorkflowOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write_workflow(self, steps):
+        path = os.path.join(self.dir, "workflow.json")
+        with open(path, "w") as f:
+            json.dump({"Workflow": "Test", "Steps": steps}, f)
+        return path
+
+    def test_shipped_workflow_reviews_quality_before_vision(self):
+        _, steps = load_workflow(WORKFLOW)
+        self.assertEqual([step.skill for step in steps], ORDER)
+
+    def test_steps_are_returned_in_dependency_order(self):
+        path = self._write_workflow([
+            {"Step": 1, "Skill": "ExportToImage"},
+            {"Step": 2, "Skill": "AnalyzeImageWithGPT4Vision", "DependsOn": [1, 3]},
+            {"Step": 3, "Skill": "ImageQualityReview", "DependsOn": [1]},
+            {"Step": 4, "Skill": "DesignRecommendations", "DependsOn": [2, 3]}
+        ])
+        _, steps = load_workflow(path)
+        self.assertEqual([step.number for step in steps], [1, 3, 2, 4])
+
+    def test_cyclic_dependencies_are_rejected(self):
+        path = self._write_workflow([
+            {"Step": 1, "Skill": "ExportToImage", "DependsOn": [2]},
+            {"Step": 2, "Skill": "ImageQualityReview", "DependsOn": [1]}
+        ])
+        with self.assertRaises(WorkflowError):
+            load_workflow(path)
+
+    def test_resume_restores_steps_depending_on_later_numbered_steps(self):
+        path = self._write_workflow([
+            {"Step": 1, "Skill": "ExportToImage"},
+            {"Step": 2, "Skill": "AnalyzeImageWithGPT4Vision", "DependsOn": [1, 3]},
+            {"Step": 3, "Skill": "ImageQualityReview", "DependsOn": [1]},
+            {"Step": 4, "Skill": "DesignRecommendations", "DependsOn": [2, 3]}
+        ])
+        checkpoint = RunCheckpoint("resume-test", runs_dir=self.dir)
+        try:
+            executor = PipelineExecutor.from_file(path, checkpoint=checkpoint)
+            page = {"report_id": "r1", "page_name": "p1"}
+            key = page_key(page)
+            outputs = {1: {"exported": True}, 2: {"answer": "vision"}, 3: {"quality_score": 90}, 4: {"recs": []}}
+            for step in executor.steps:
+                checkpoint.record_done(key, f"{step.number}:{step.skill}", outputs[step.number])
+
+            item, done = executor._restore(key, page)
+        finally:
+            checkpoint.close()
+        self.assertEqual(done, {1, 2, 3, 4})
+        self.assertEqual(item["answer"], "vision")
+
+    def test_enqueued_chain_follows_dependency_order(self):
+        db_path = os.path.join(self.dir, "jobs.sqlite")
+        pages_path = os.path.join(self.dir, "pages.json")
+        with open(pages_path, "w") as f:
+            json.dump([{"report_id": "r1", "page_name": "p1"}], f)
+
+        self.assertEqual(worker_pool.main(["--db", db_path, "enqueue", WORKFLOW, pages_path]), 0)
+        queue = JobQueue(db_path)
+        try:
+            job = queue.lease("test-worker")
+        finally:
+            queue.close()
+        self.assertEqual(job.chain, ORDER)
+
+
+if __name__ == "__main__":
+    unittest.main()